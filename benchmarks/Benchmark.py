@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hui import GroupCreator, Solver
+from Scenarios import SCENARIOS, SCALES
+
+# BENCHMARKS
+# Runs each scenario (see Scenarios.py) at each scale with each engine and writes what it cost as JSON, so runs can be compared.
+# Every run is done in a fresh worker process (see GroupCreator.createGroupsAsync), so the peak memory of a run isn't that of the runs before it.
+# Times come from the run statistics (see Stats.py): build is everything before the solver (indexing, model, goals, presolve),
+# solve is the solver itself. Of repeated runs, the median times are kept.
+#
+#   python benchmarks/Benchmark.py --scales small medium --output before.json
+#   python benchmarks/Benchmark.py --scales small medium --output after.json --compare before.json
+
+# Changes when the report changes
+FORMAT = 1
+
+# Phases that aren't part of building the model
+NOT_BUILD = ('solve', 'decode', 'total', 'resultCache')
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+def _measure(output):
+    """Build time, solve time, model size and peak memory of a run, from its statistics"""
+    stats = output['stats']
+    phases = dict((phase, seconds) for (phase, seconds) in stats['time'].items() if phase != 'total')
+    variables = None
+    constraints = None
+    solverPeak = None
+    for goalGroup in stats['goalGroups']:
+        for (phase, seconds) in goalGroup.get('time', {}).items():
+            phases[phase] = phases.get(phase, 0) + seconds
+        if goalGroup.get('variables') != None:
+            variables = (variables or 0) + goalGroup['variables']
+        if goalGroup.get('constraints') != None:
+            constraints = (constraints or 0) + goalGroup['constraints']
+        solverPeak = max(solverPeak, goalGroup.get('solverPeakMemoryMB'))
+    return {
+        'buildSeconds': sum(seconds for (phase, seconds) in phases.items() if not phase in NOT_BUILD),
+        'solveSeconds': phases.get('solve', 0),
+        'totalSeconds': stats['time']['total'],
+        'phases': phases,
+        'variables': variables,
+        'constraints': constraints,
+        'peakMemoryMB': stats['peakMemoryMB'].get('total'),
+        'solverPeakMemoryMB': solverPeak,
+        'goalGroupsTried': len(stats['goalGroups']),
+        'goalGroup': output['goalGroup'],
+        'reward': output['reward']
+    }
+
+def runScenario(name, scale, engine, seed=0, repeat=1, timeLimit=None, timeout=None):
+    """Runs a scenario repeat times
+    :return: the result as a dict (see _measure), with 'error' set if a run failed
+    """
+    (students, groups, goalGroups) = SCENARIOS[name](SCALES[scale], seed)
+    result = {'scenario': name, 'scale': scale, 'engine': engine, 'seed': seed, 'students': len(students), 'groups': len(groups), 'repeat': repeat, 'error': None}
+    runs = []
+    for k in range(repeat):
+        creator = GroupCreator(students=students, groups=groups, goalGroups=goalGroups, determinateSolution=True, engine=engine, solver=Solver(timeLimit=timeLimit))
+        try:
+            runs.append(_measure(creator.createGroupsAsync(timeout).result()))
+        except Exception as err:
+            result['error'] = type(err).__name__ + ': ' + str(err)
+            return result
+    result.update(runs[0])
+    for key in ('buildSeconds', 'solveSeconds', 'totalSeconds'):
+        result[key] = _median([run[key] for run in runs])
+    result['peakMemoryMB'] = max(run['peakMemoryMB'] for run in runs)
+    return result
+
+def _key(result):
+    return (result['scenario'], result['scale'], result['engine'])
+
+def compare(before, after):
+    """Lines telling how the results of after changed from those of before (reports as written by main)"""
+    old = dict((_key(result), result) for result in before['results'])
+    lines = []
+    for result in after['results']:
+        previous = old.get(_key(result))
+        if previous == None or previous['error'] != None or result['error'] != None:
+            continue
+        changes = []
+        for key in ('buildSeconds', 'solveSeconds', 'variables', 'constraints', 'peakMemoryMB'):
+            if previous.get(key) and result.get(key) != None:
+                changes.append(key + ' %+.0f%%' % (100.0 * (result[key] - previous[key]) / previous[key]))
+        lines.append('/'.join(_key(result)) + ': ' + ', '.join(changes))
+    return lines
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the group creator')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('--scales', nargs='+', choices=sorted(SCALES, key=SCALES.get), default=['small', 'medium'])
+    parser.add_argument('--engines', nargs='+', choices=['pulp', 'matrix', 'search'], default=['pulp'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each benchmark (median times are kept)')
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds the solver may take on a goal group')
+    parser.add_argument('--timeout', type=float, default=None, help='seconds after which a run is stopped')
+    parser.add_argument('--output', default=None, help='JSON file to write the report to (default: standard output)')
+    parser.add_argument('--compare', default=None, help='JSON report of an earlier run to compare with')
+    args = parser.parse_args(argv)
+
+    report = {'format': FORMAT, 'python': platform.python_version(), 'platform': platform.platform(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': []}
+    for scale in args.scales:
+        for name in args.scenarios:
+            for engine in args.engines:
+                result = runScenario(name, scale, engine, args.seed, args.repeat, args.time_limit, args.timeout)
+                sys.stderr.write('/'.join(_key(result)) + ': ' + (result['error'] or '%.2fs build, %.2fs solve' % (result['buildSeconds'], result['solveSeconds'])) + '\n')
+                report['results'].append(result)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output == None:
+        print text
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    if args.compare != None:
+        with open(args.compare) as f:
+            for line in compare(json.load(f), report):
+                sys.stderr.write(line + '\n')
+
+if __name__ == '__main__':
+    main()
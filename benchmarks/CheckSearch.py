@@ -0,0 +1,92 @@
+import argparse
+import copy
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from hui import DataBox, Student
+from hui import Greedy
+from hui.Group import Group
+from hui.LocalSearch import SearchModel, _Search
+from Scenarios import SCENARIOS, SCALES
+
+# LOCAL SEARCH CHECK
+# The search engine (see LocalSearch.py) keeps its reward and violation up to date move by move, each term only looking at the students that moved.
+# This makes random moves on each scenario (see Scenarios.py) and after each one compares those totals with a count from scratch (every term reset
+# on the current groups) and, for groups that break nothing required, with the reward Greedy.evaluate gives them. Each goal group is checked as it is
+# and with a partial and net reward on every goal, so the rewards are counted too. Run it after changing a search term:
+#
+#   python benchmarks/CheckSearch.py --scales small medium --moves 2000
+
+# Largest difference between two counts of the same groups that isn't a mismatch
+TOLERANCE = 1e-6
+
+def _rewarded(goals):
+    """Copies of goals that also give a partial and a net reward"""
+    copies = []
+    for goal in goals:
+        goal = copy.copy(goal)
+        goal.partialReward = 1
+        goal.netReward = 2
+        copies.append(goal)
+    return copies
+
+def checkGoals(students, groups, goals, moves, seed=0):
+    """Makes random moves on the search model of one goal group, checking the totals after each one
+    :return: a list of mismatches, as text (empty if every count agreed)
+    """
+    groups = [Group(k + 1, dict(info)) for (k, info) in enumerate(groups)]
+    students = [Student(k + 1, dict(info), groups, createVariables=False) for (k, info) in enumerate(students)]
+    dataBox = DataBox(students, groups)
+    model = SearchModel(students, groups)
+    for goal in goals:
+        if goal.genSearchTerms(dataBox, model) == None:
+            return [type(goal).__name__ + " couldn't be interpreted"]
+    (studentUnits, unitAllowed) = Greedy.units(dataBox, goals)
+    unitGids = Greedy.placeUnits(groups, studentUnits, unitAllowed)
+    if unitGids == None:
+        return ["the units couldn't be placed"]
+    search = _Search(model, studentUnits, unitAllowed, unitGids, random.Random(seed))
+
+    mismatches = []
+    for k in range(moves):
+        move = search._randomMove()
+        if move == None:
+            continue
+        search._apply(move)
+        kept = (search.reward, search.violation)
+        counted = search.recount()
+        if abs(kept[0] - counted[0]) > TOLERANCE or abs(kept[1] - counted[1]) > TOLERANCE:
+            mismatches.append('move %d: kept (reward, violation) %s, counted %s' % (k, kept, counted))
+        elif counted[1] == 0:
+            groupOf = dict((model.students[i].id, model.groups[search.groupOf[i]].id) for i in range(len(model.students)))
+            reward = Greedy.evaluate(dataBox, goals, groupOf)
+            if reward == None or abs(reward - counted[0]) > TOLERANCE:
+                mismatches.append('move %d: reward %s, Greedy.evaluate gives %s' % (k, counted[0], reward))
+        # Stop at the first mismatch, since the totals after it are off too
+        if len(mismatches) > 0:
+            break
+    return mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Checks the move by move counts of the search engine against counts from scratch')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('--scales', nargs='+', choices=sorted(SCALES, key=SCALES.get), default=['small'])
+    parser.add_argument('--moves', type=int, default=1000, help='random moves on each goal group')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for scale in args.scales:
+        for name in args.scenarios:
+            (students, groups, goalGroups) = SCENARIOS[name](SCALES[scale], args.seed)
+            for i in range(len(goalGroups)):
+                for (variant, goals) in [('as given', goalGroups[i]), ('rewarded', _rewarded(goalGroups[i]))]:
+                    mismatches = checkGoals(students, groups, goals, args.moves, args.seed)
+                    failed = failed or len(mismatches) > 0
+                    sys.stderr.write('%s/%s goal group %d (%s): %s\n' % (name, scale, i, variant, '; '.join(mismatches) or 'OK'))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+import random
+from hui import WILDCARD
+
+# SYNTHETIC ROSTERS
+# Students and groups for benchmarks, made up from a seed so every run of a benchmark solves the same problem.
+# Each property has a cardinality (its values are 0, 1, ..., cardinality - 1), and its values are spread evenly over the students
+# (or groups), so how many students have a value doesn't depend on luck. Some student values can be replaced by wildcards.
+# There's enough room in the groups for every student, with some to spare (see slack).
+
+def _evenValues(rng, count, cardinality):
+    """count values of a property with cardinality values, each one (almost) equally common, in random order"""
+    values = [k % cardinality for k in range(count)]
+    rng.shuffle(values)
+    return values
+
+def _wildcardRate(wildcardRate, name):
+    """The wildcard rate of property name (wildcardRate is a number for every property, or a dict property ==> rate)"""
+    if isinstance(wildcardRate, dict):
+        return wildcardRate.get(name, 0)
+    return wildcardRate
+
+def generateRoster(numStudents, properties=None, groupProperties=None, groupSizes=(3, 5), minGroupSize=0, slack=1.25, wildcardRate=0, seed=0):
+    """Made up students and groups
+    :param numStudents: number of students
+    :param properties: {property name: cardinality} of the students. Default: none
+    :param groupProperties: {property name: cardinality} of the groups. Default: none
+    :param groupSizes: (smallest, largest) size of a group (group['size']), picked at random for each group. Default: (3, 5)
+    :param minGroupSize: group['minsize'] of every group. Default: 0
+    :param slack: groups are added until they have room for slack times the number of students. Default: 1.25
+    :param wildcardRate: chance that a student's value is a wildcard, for every property or as a dict {property name: rate}. Default: 0
+    :param seed: seed of the random numbers. Default: 0
+    :return: (students, groups), lists of dicts
+    """
+    if numStudents < 1:
+        raise ValueError('numStudents must be at least 1')
+    if groupSizes[0] < 1 or groupSizes[0] > groupSizes[1]:
+        raise ValueError('groupSizes must be (smallest, largest) with 1 <= smallest <= largest')
+    if minGroupSize > groupSizes[0]:
+        raise ValueError('minGroupSize must be at most the smallest group size')
+    if slack < 1:
+        raise ValueError('slack must be at least 1')
+    properties = properties or {}
+    groupProperties = groupProperties or {}
+    rng = random.Random(seed)
+
+    students = [{'name': 'student' + str(k)} for k in range(numStudents)]
+    for name in sorted(properties):
+        rate = _wildcardRate(wildcardRate, name)
+        for (student, value) in zip(students, _evenValues(rng, numStudents, properties[name])):
+            student[name] = WILDCARD if rng.random() < rate else value
+
+    groups = []
+    room = 0
+    while room < slack * numStudents:
+        size = rng.randint(groupSizes[0], groupSizes[1])
+        groups.append({'name': 'group' + str(len(groups)), 'size': size, 'minsize': minGroupSize})
+        room += size
+    for name in sorted(groupProperties):
+        for (group, value) in zip(groups, _evenValues(rng, len(groups), groupProperties[name])):
+            group[name] = value
+
+    if minGroupSize * len(groups) > numStudents:
+        raise ValueError('the groups need more students than there are (lower minGroupSize or slack)')
+    return (students, groups)
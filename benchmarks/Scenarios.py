@@ -0,0 +1,56 @@
+from hui import Filter, GroupFilterGoal, MinSimilarGoal, MaxSimilarGoal, MustMatchGoal, PodGoal
+from Roster import generateRoster
+
+# BENCHMARK SCENARIOS
+# Each scenario makes up a problem that exercises one goal type (or the fallback to a later goal group) for a number of students.
+# Problems are solvable at every scale, except for the first goal group of the fallback scenario, which never is.
+
+# Number of students at each scale
+SCALES = {'small': 40, 'medium': 200, 'large': 1000}
+
+def groupFilter(numStudents, seed):
+    """The first level of students must be in groups of the first room"""
+    (students, groups) = generateRoster(numStudents, properties={'level': 4}, groupProperties={'room': 3}, seed=seed)
+    goal = GroupFilterGoal(studentFilter=Filter({'level': 0}), groupFilter=Filter({'room': 0}))
+    return (students, groups, [[goal]])
+
+def minSimilar(numStudents, seed):
+    """Each group has at least two students with the same topic (a few students like every topic)"""
+    (students, groups) = generateRoster(numStudents, properties={'topic': 8}, wildcardRate=0.05, seed=seed)
+    return (students, groups, [[MinSimilarGoal(propertyName='topic', minSimilar=2)]])
+
+def maxSimilar(numStudents, seed):
+    """Each group has at most two students of the same major"""
+    (students, groups) = generateRoster(numStudents, properties={'major': 6}, seed=seed)
+    return (students, groups, [[MaxSimilarGoal(propertyName='major', maxSimilar=2)]])
+
+def mustMatch(numStudents, seed):
+    """Students are placed in groups of their own section (a few students fit any section)"""
+    (students, groups) = generateRoster(numStudents, properties={'section': 4}, groupProperties={'section': 4}, groupSizes=(4, 4), slack=1.5, wildcardRate=0.05, seed=seed)
+    return (students, groups, [[MustMatchGoal(groupProperty='section', studentProperty='section')]])
+
+def pod(numStudents, seed):
+    """The students of each of the first ten teams (of three) stay together"""
+    teams = max(1, numStudents // 3)
+    (students, groups) = generateRoster(numStudents, properties={'team': teams}, seed=seed)
+    filters = [Filter({'team': team}) for team in range(min(10, teams))]
+    return (students, groups, [[PodGoal(studentFilters=filters)]])
+
+def fallback(numStudents, seed):
+    """The first goal group can't be met (one student per section in each group, but groups are of one section), so the second one is solved"""
+    (students, groups) = generateRoster(numStudents, properties={'section': 4}, groupProperties={'section': 4}, groupSizes=(4, 4), slack=1.5, seed=seed)
+    goalGroups = [
+        [MustMatchGoal(groupProperty='section', studentProperty='section'), MaxSimilarGoal(propertyName='section', maxSimilar=1)],
+        [MustMatchGoal(groupProperty='section', studentProperty='section')]
+    ]
+    return (students, groups, goalGroups)
+
+# Name ==> function(numStudents, seed) that returns (students, groups, goalGroups)
+SCENARIOS = {
+    'groupFilter': groupFilter,
+    'minSimilar': minSimilar,
+    'maxSimilar': maxSimilar,
+    'mustMatch': mustMatch,
+    'pod': pod,
+    'fallback': fallback
+}
@@ -0,0 +1,99 @@
+import multiprocessing
+import pickle
+import threading
+from GroupCreator import _killWorker
+from Batch import _solve
+
+# ASYNCHRONOUS RUNS
+# createGroups blocks until every goal group is built and solved. An asynchronous run does the whole thing in a worker process instead
+# and returns right away, so the caller (e.g. a web server's event loop) can go on and collect the output later.
+# Stopping a run (by cancelling it or when its time is up) kills the worker together with its solver, so no solver is left running.
+# The run's fileno() becomes readable when its output is ready, so event loops can wait for it without blocking (e.g. loop.add_reader).
+
+def _asyncWorker(creator, connection):
+    """Runs in a worker process: sends the pickled (output, error) of creator.createGroups() through connection"""
+    connection.send_bytes(_solve(creator))
+
+class AsyncRun(object):
+    """createGroups of a group creator, running in a worker process (see GroupCreator.createGroupsAsync)
+    :param creator: the GroupCreator
+    :param timeout: seconds after which the run is stopped. Default: no limit
+    """
+    def __init__(self, creator, timeout=None):
+        if timeout != None and timeout <= 0:
+            raise ValueError('timeout must be positive')
+        (self.connection, sender) = multiprocessing.Pipe(duplex=False)
+        self.worker = multiprocessing.Process(target=_asyncWorker, args=(creator, sender))
+        self.worker.daemon = True
+        self.worker.start()
+        # Only the worker sends, so the connection reports the end of the file if the worker dies
+        sender.close()
+
+        # (output, error) once the run is over
+        self.ret = None
+        self.lock = threading.Lock()
+        self.timer = None
+        if timeout != None:
+            self.timer = threading.Timer(timeout, self._stop, [multiprocessing.TimeoutError('the run took more than ' + str(timeout) + ' seconds')])
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _receive(self):
+        """Takes the output from the worker if it has been sent. Call with the lock held"""
+        if self.ret != None or not self.connection.poll(0):
+            return
+        try:
+            self.ret = pickle.loads(self.connection.recv_bytes())
+        except EOFError:
+            self.worker.join()
+            self.ret = (None, RuntimeError('the worker died (exit code ' + str(self.worker.exitcode) + ')'))
+        self.worker.join()
+        if self.timer != None:
+            self.timer.cancel()
+
+    def _stop(self, error):
+        """Kills the worker and its solver, and ends the run with error, unless the run is already over
+        :return: True if the run was stopped
+        """
+        with self.lock:
+            self._receive()
+            if self.ret != None:
+                return False
+            _killWorker(self.worker)
+            self.ret = (None, error)
+            if self.timer != None:
+                self.timer.cancel()
+            return True
+
+    def cancel(self):
+        """Stops the run right away, killing its worker and solver. result() then raises RuntimeError
+        :return: False if the run was already over
+        """
+        return self._stop(RuntimeError('the run was cancelled'))
+
+    def done(self):
+        """True if the run is over (its output is ready, or it failed or was stopped)"""
+        with self.lock:
+            self._receive()
+            return self.ret != None
+
+    def fileno(self):
+        """A file descriptor that becomes readable when the run is over (or its worker died)"""
+        return self.connection.fileno()
+
+    def result(self, timeout=None):
+        """Waits for the run to be over and returns the output of createGroups. Raises the error of the run instead if it failed,
+        multiprocessing.TimeoutError if its time was up, or RuntimeError if it was cancelled or its worker died
+        :param timeout: seconds to wait. If the run isn't over by then, multiprocessing.TimeoutError is raised and the run goes on. Default: wait until it's over
+        """
+        if self.ret == None:
+            # Waits without the lock, so the run can still be stopped meanwhile (that ends the file, which ends the wait)
+            self.connection.poll(timeout)
+        with self.lock:
+            self._receive()
+            if self.ret == None:
+                raise multiprocessing.TimeoutError("the run isn't over yet")
+            (output, error) = self.ret
+        if error != None:
+            raise error
+        return output
@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import pickle
+import time
+import Queue
+from GroupCreator import GroupCreator, _killWorker, POLL
+
+# BATCHES
+# Many independent problems (e.g. every section of a course) are solved at once, each one in its own worker process, like calling createGroups on each.
+# Results are given back as soon as each problem is solved, so they come in the order problems finish.
+# A problem that raises an error, runs out of time or kills its worker doesn't stop the others: its error is given back instead of its output.
+
+def _creator(problem):
+    """The group creator of a problem given to createGroupsBatch"""
+    if isinstance(problem, GroupCreator):
+        return problem
+    if isinstance(problem, dict):
+        return GroupCreator(**problem)
+    raise TypeError('problems must be GroupCreators or dicts of GroupCreator arguments')
+
+def _solve(problem):
+    """Runs in a worker process: solves problem (see _creator)
+    :return: (output, error) pickled, so an output that can't be sent back is an error of this problem instead of a worker that never answers
+    """
+    # Own process group, so killing the worker also kills its solver subprocess
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    try:
+        creator = _creator(problem)
+        # Worker processes can't start processes of their own (so decomposed parts are solved one after another too)
+        creator.setParallelGoalGroups(None)
+        ret = (creator.createGroups(), None)
+    except Exception as err:
+        ret = (None, err)
+    try:
+        return pickle.dumps(ret, pickle.HIGHEST_PROTOCOL)
+    except Exception as err:
+        return pickle.dumps((None, TypeError("the result couldn't be sent back from the worker: " + str(err))), pickle.HIGHEST_PROTOCOL)
+
+def _batchWorker(problem, i, queue):
+    """Runs in a worker process: solves problem and puts (i, pickled (output, error)) on the queue"""
+    queue.put((i, _solve(problem)))
+
+def createGroupsBatch(problems, numWorkers=None, timeout=None):
+    """Solves independent problems at once in worker processes
+    :param problems: a list of GroupCreators, or of dicts of GroupCreator arguments (e.g. {'students': [...], 'groups': [...], 'goalGroups': [...]})
+    :param numWorkers: number of problems solved at once. Default: number of CPUs
+    :param timeout: seconds allowed per problem, counted from when its worker starts. Default: no limit
+    :return: a generator of (index of the problem, output of createGroups, None) in the order problems finish,
+    or (index, None, error) for a problem that raised an error, ran out of time (multiprocessing.TimeoutError) or whose worker died (RuntimeError).
+    Closing the generator kills the workers that are still running, along with their solvers
+    """
+    if numWorkers == None:
+        numWorkers = multiprocessing.cpu_count()
+    if numWorkers < 1:
+        raise ValueError('numWorkers must be at least 1')
+    if timeout != None and timeout <= 0:
+        raise ValueError('timeout must be positive')
+    return _runBatch(list(problems), numWorkers, timeout)
+
+def _runBatch(problems, numWorkers, timeout):
+    """The generator returned by createGroupsBatch"""
+    queue = multiprocessing.Queue()
+    workers = {}    # index ==> (worker, deadline)
+    nextToStart = 0
+    try:
+        while nextToStart < len(problems) or len(workers) > 0:
+            while nextToStart < len(problems) and len(workers) < numWorkers:
+                worker = multiprocessing.Process(target=_batchWorker, args=(problems[nextToStart], nextToStart, queue))
+                worker.daemon = True
+                worker.start()
+                workers[nextToStart] = (worker, None if timeout == None else time.time() + timeout)
+                nextToStart += 1
+
+            wait = POLL
+            deadlines = [deadline for (worker, deadline) in workers.values() if deadline != None]
+            if len(deadlines) > 0:
+                wait = max(0, min(wait, min(deadlines) - time.time()))
+            try:
+                (i, data) = queue.get(timeout=wait)
+            except Queue.Empty:
+                for (i, error) in _stopWorkers(workers, timeout):
+                    yield (i, None, error)
+                continue
+            if not i in workers:
+                # Finished just as it ran out of time, and was already given back as timed out
+                continue
+            workers.pop(i)[0].join()
+            (output, error) = pickle.loads(data)
+            yield (i, output, error)
+    finally:
+        for (worker, deadline) in workers.values():
+            _killWorker(worker)
+
+def _stopWorkers(workers, timeout):
+    """Kills the workers that ran out of time and forgets the ones that died, taking them out of workers
+    :return: [(index, error), ...] of those workers
+    """
+    stopped = []
+    now = time.time()
+    for i in sorted(workers):
+        (worker, deadline) = workers[i]
+        if deadline != None and now >= deadline:
+            _killWorker(worker)
+            stopped.append((i, multiprocessing.TimeoutError('problem ' + str(i) + ' took more than ' + str(timeout) + ' seconds')))
+        elif not worker.is_alive() and worker.exitcode != 0:
+            # A worker that exits normally has put its result on the queue
+            worker.join()
+            stopped.append((i, RuntimeError('the worker solving problem ' + str(i) + ' died (exit code ' + str(worker.exitcode) + ')')))
+    for (i, error) in stopped:
+        del workers[i]
+    return stopped
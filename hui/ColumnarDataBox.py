@@ -0,0 +1,184 @@
+import numpy
+import Utils
+from DataBox import DataBox
+from Filter import _inRange
+
+# COLUMNAR DATA
+# Instead of a list of entries per property value, each property of the students (and of the groups) is stored as one array:
+# - codes: the number of the entry's value in the property's list of distinct values, -1 if the entry doesn't have the property
+# - numbers: the entry's value as a float, for properties whose values are all numbers (NaN if the entry doesn't have the property)
+# Filters are evaluated as boolean masks over these arrays (see Filter.mask): a predicate is checked once per distinct value,
+# and the result is spread to every entry by indexing with the codes. Results are always in the order entries were given.
+
+NUMBERS = (int, long, float)
+
+class Columns(object):
+    """The properties of a list of students or groups as arrays. Also counts matches of predicates, so it can be used wherever DataBox.Statistics is
+    :param entries: a list of students or groups
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        self.total = len(entries)
+
+        self.codes = {}         # prop ==> int array, one code per entry
+        self.categories = {}    # prop ==> list of distinct values, categories[prop][code] is the value with that code
+        self.codeOfValue = {}   # prop ==> {value: code}
+        self.numbers = {}       # prop ==> float array, only for properties whose values are all numbers
+        for k in range(len(entries)):
+            info = entries[k].info
+            for prop in info:
+                if not prop in self.codes:
+                    self.codes[prop] = numpy.full(self.total, -1, dtype=numpy.int32)
+                self.codes[prop][k] = self._code(prop, info[prop])
+
+        for prop in self.categories:
+            self._setNumbers(prop)
+
+    def _code(self, prop, val):
+        """Code of val in the distinct values of prop, adding it if it's new"""
+        if not prop in self.categories:
+            self.categories[prop] = []
+            self.codeOfValue[prop] = {}
+        if not val in self.codeOfValue[prop]:
+            self.codeOfValue[prop][val] = len(self.categories[prop])
+            self.categories[prop].append(val)
+        return self.codeOfValue[prop][val]
+
+    def _setNumbers(self, prop):
+        """Keeps the values of prop as floats if they're all numbers"""
+        self.numbers.pop(prop, None)
+        if all(isinstance(val, NUMBERS) for val in self.categories[prop]):
+            # The extra NaN is picked up by the code -1 of entries without the property
+            table = numpy.array(self.categories[prop] + [float('nan')], dtype=numpy.float64)
+            self.numbers[prop] = table[self.codes[prop]]
+
+    def add(self, entry):
+        """Adds a row for entry, which was just appended to entries"""
+        self.total += 1
+        for prop in self.codes:
+            self.codes[prop] = numpy.append(self.codes[prop], -1)
+            if prop in self.numbers:
+                self.numbers[prop] = numpy.append(self.numbers[prop], float('nan'))
+        for prop in entry.info:
+            if not prop in self.codes:
+                self.codes[prop] = numpy.full(self.total, -1, dtype=numpy.int32)
+            self.codes[prop][-1] = self._code(prop, entry.info[prop])
+            self._setNumbers(prop)
+
+    def remove(self, k):
+        """Removes the row of the entry that was at position k of entries"""
+        self.total -= 1
+        for prop in list(self.codes):
+            self.codes[prop] = numpy.delete(self.codes[prop], k)
+            if prop in self.numbers:
+                self.numbers[prop] = numpy.delete(self.numbers[prop], k)
+            if not numpy.any(self.codes[prop] >= 0):
+                # No entry has prop anymore
+                for props in (self.codes, self.categories, self.codeOfValue, self.numbers):
+                    props.pop(prop, None)
+
+    def all(self):
+        """Mask of every entry"""
+        return numpy.ones(self.total, dtype=bool)
+
+    def whereValue(self, prop, passes):
+        """Mask of the entries that have prop and whose value of it passes
+        :param passes: function of a value, called once per distinct value of prop
+        """
+        if not prop in self.codes:
+            return numpy.zeros(self.total, dtype=bool)
+        # The extra False is picked up by the code -1 of entries without the property
+        table = numpy.array([bool(passes(val)) for val in self.categories[prop]] + [False], dtype=bool)
+        return table[self.codes[prop]]
+
+    def whereNumber(self, prop, lower, upper):
+        """Mask of the entries whose value of prop is within the bounds, or None if prop or the bounds aren't all numbers (use whereValue instead)
+        :param lower: (value, inclusive), or None if unbounded
+        :param upper: (value, inclusive), or None if unbounded
+        """
+        if not prop in self.numbers:
+            return None
+        if any(bound != None and not isinstance(bound[0], NUMBERS) for bound in (lower, upper)):
+            return None
+        numbers = self.numbers[prop]
+        mask = self.codes[prop] >= 0
+        # Comparisons with NaN are False, so entries without prop never match
+        with numpy.errstate(invalid='ignore'):
+            if lower != None:
+                mask &= (numbers >= lower[0]) if lower[1] else (numbers > lower[0])
+            if upper != None:
+                mask &= (numbers <= upper[0]) if upper[1] else (numbers < upper[0])
+        return mask
+
+    def select(self, filter):
+        """Entries that pass the filter, in the order entries were given"""
+        if filter == None:
+            return self.entries
+        return [self.entries[k] for k in numpy.flatnonzero(filter.mask(self))]
+
+    def groupBy(self, prop):
+        """Lists of the entries that have the same value of prop (raises KeyError if no entry has prop), in the order the values first appear"""
+        codes = self.codes[prop]
+        # A stable sort keeps the entries of each value in order
+        order = numpy.argsort(codes, kind='mergesort')
+        order = order[codes[order] >= 0]
+        sortedCodes = codes[order]
+        starts = numpy.flatnonzero(numpy.diff(sortedCodes)) + 1
+        return [[self.entries[k] for k in part] for part in numpy.split(order, starts) if len(part) > 0]
+
+    def countValues(self, prop, vals):
+        """Number of entries whose value of prop is one of vals (or the wildcard)"""
+        return int(numpy.count_nonzero(self.whereValue(prop, lambda val: val in vals or val == Utils.WILDCARD)))
+
+    def countRange(self, prop, lower, upper):
+        """Number of entries whose value of prop is within the bounds"""
+        mask = self.whereNumber(prop, lower, upper)
+        if mask is None:
+            mask = self.whereValue(prop, lambda val: _inRange(val, lower, upper))
+        return int(numpy.count_nonzero(mask))
+
+class ColumnarDataBox(DataBox):
+    """A DataBox that keeps students and groups as columns (see Columns) and evaluates filters as vectorized masks, for large rosters.
+    Gives the same entries as DataBox, but always in the order students and groups were given
+    """
+    isColumnar = True
+
+    def __init__(self, students, groups):
+        # Copied, so adding and removing doesn't change the caller's lists
+        self.allStudents = list(students)
+        self.allGroups = list(groups)
+
+        self.studentColumns = Columns(self.allStudents)
+        self.groupColumns = Columns(self.allGroups)
+
+        # Filter results, keyed by Filter.key()
+        self.studentCache = {}
+        self.groupCache = {}
+
+        # Columns count matches exactly (see Filter.explain)
+        self.studentStats = self.studentColumns
+        self.groupStats = self.groupColumns
+
+    def filterStudents(self, filter):
+        """Apply a filter to all students (the returned list is shared, don't change it)"""
+        return self._cached(self.studentCache, filter, self.studentColumns.select)
+
+    def filterGroups(self, filter):
+        """Apply a filter to all groups (the returned list is shared, don't change it)"""
+        return self._cached(self.groupCache, filter, self.groupColumns.select)
+
+    def getStudentsWhoShareProperty(self, propertyname):
+        """Returns a list of arrays where each array contains students that have the same value for that property"""
+        return self.studentColumns.groupBy(propertyname)
+
+    def _index(self, entry, k, columns):
+        columns.add(entry)
+
+    def _unindex(self, entry, k, columns):
+        columns.remove(k)
+
+    def _studentIndexes(self):
+        return self.studentColumns
+
+    def _groupIndexes(self):
+        return self.groupColumns
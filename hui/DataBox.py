@@ -1,33 +1,167 @@
+from bisect import bisect_left, bisect_right
+import Utils
+
+class RangeIndex(object):
+    """Entries sorted by the value of each property, so range filters (GT, GTE, LT, LTE, Between) are answered by binary search.
+    A property is only sorted the first time it is queried
+    :param entries: a list of students or groups
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        # prop ==> (sorted values, position in entries of each value), or None if the values can't be sorted
+        self.sortedByProp = {}
+
+    def _sorted(self, prop):
+        if not prop in self.sortedByProp:
+            pairs = [(self.entries[k].info[prop], k) for k in range(len(self.entries)) if prop in self.entries[k].info]
+            try:
+                pairs.sort(key=lambda pair: pair[0])
+                self.sortedByProp[prop] = ([value for (value, k) in pairs], [k for (value, k) in pairs])
+            except TypeError:
+                self.sortedByProp[prop] = None
+        return self.sortedByProp[prop]
+
+    def add(self, k):
+        """Adds entries[k] (just appended to entries) to the properties sorted so far"""
+        info = self.entries[k].info
+        for prop in info:
+            ret = self.sortedByProp.get(prop)
+            if ret == None:
+                continue
+            (values, positions) = ret
+            try:
+                at = bisect_right(values, info[prop])
+            except TypeError:
+                # Sorted again (or found unsortable) the next time prop is queried
+                del self.sortedByProp[prop]
+                continue
+            values.insert(at, info[prop])
+            positions.insert(at, k)
+
+    def reset(self):
+        """Forgets every sorted property (positions in entries changed)"""
+        self.sortedByProp = {}
+
+    def _slice(self, values, lower, upper):
+        """(start, end) of the sorted values within the bounds"""
+        start = 0
+        if lower != None:
+            start = bisect_left(values, lower[0]) if lower[1] else bisect_right(values, lower[0])
+        end = len(values)
+        if upper != None:
+            end = bisect_right(values, upper[0]) if upper[1] else bisect_left(values, upper[0])
+        return (start, max(start, end))
+
+    def select(self, prop, lower, upper):
+        """Entries whose value of prop is within the bounds, in the order entries were given
+        :param lower: (value, inclusive), or None if unbounded
+        :param upper: (value, inclusive), or None if unbounded
+        :return: a list of entries, or None if the values of prop can't be sorted
+        """
+        ret = self._sorted(prop)
+        if ret == None:
+            return None
+        (values, positions) = ret
+        (start, end) = self._slice(values, lower, upper)
+        return [self.entries[k] for k in sorted(positions[start:end])]
+
+    def count(self, prop, lower, upper):
+        """Number of entries whose value of prop is within the bounds, or None if prop hasn't been sorted yet (counting doesn't sort it)"""
+        ret = self.sortedByProp.get(prop)
+        if ret == None:
+            return None
+        (start, end) = self._slice(ret[0], lower, upper)
+        return end - start
+
+class Statistics(object):
+    """Value counts of students or groups, used by filters to evaluate their most selective predicates first (see Filter.explain)
+    :param propToValToObjects: the exact-value index of the entries (see DataBox)
+    :param entries: a list of students or groups
+    :param rangeIndex: the RangeIndex of the entries, which counts comparisons exactly once a property is sorted
+    """
+    def __init__(self, propToValToObjects, entries, rangeIndex):
+        self.propToValToObjects = propToValToObjects
+        self.total = len(entries)
+        self.rangeIndex = rangeIndex
+        self.withProp = dict((prop, sum(len(objects) for objects in valToObjects.values())) for (prop, valToObjects) in propToValToObjects.items())
+
+    def add(self, info):
+        """Counts an added entry"""
+        self.total += 1
+        for prop in info:
+            self.withProp[prop] = self.withProp.get(prop, 0) + 1
+
+    def remove(self, info):
+        """Stops counting a removed entry"""
+        self.total -= 1
+        for prop in info:
+            self.withProp[prop] -= 1
+            if self.withProp[prop] == 0:
+                del self.withProp[prop]
+
+    def countValues(self, prop, vals):
+        """Number of entries whose value of prop is one of vals (or the wildcard)"""
+        valToObjects = self.propToValToObjects.get(prop, {})
+        return sum(len(valToObjects[v]) for v in set(list(vals) + [Utils.WILDCARD]) if v in valToObjects)
+
+    def countRange(self, prop, lower, upper):
+        """Number of entries whose value of prop is within the bounds. Until prop is sorted, a third of the entries that have prop is assumed"""
+        count = self.rangeIndex.count(prop, lower, upper)
+        if count == None:
+            withProp = self.withProp.get(prop, 0)
+            count = 0 if withProp == 0 else max(1, withProp // 3)
+        return count
+
+def _addToIndex(propToValToObjects, entry):
+    """Lists entry under each of its property values"""
+    for prop in entry.info:
+        val = entry.info[prop]
+
+        if not prop in propToValToObjects:
+            propToValToObjects[prop] = {}
+        if not val in propToValToObjects[prop]:
+            propToValToObjects[prop][val] = []
+        propToValToObjects[prop][val].append(entry)
+
+def _removeFromIndex(propToValToObjects, entry):
+    """Takes entry out of the lists of its property values, dropping lists that become empty"""
+    for prop in entry.info:
+        val = entry.info[prop]
+
+        objects = propToValToObjects[prop][val]
+        objects.remove(entry)
+        if len(objects) == 0:
+            del propToValToObjects[prop][val]
+            if len(propToValToObjects[prop]) == 0:
+                del propToValToObjects[prop]
+
 class DataBox:
-    """An object that intelligently holds all students and groups is a queryable fashion"""
+    """An object that intelligently holds all students and groups is a queryable fashion.
+    Students and groups can be added, removed and updated afterwards, which only reindexes them
+    """
+    isColumnar = False
+
     def __init__(self, students, groups):
-        self.allStudents = students
-        self.allGroups = groups
+        # Copied, so adding and removing doesn't change the caller's lists
+        self.allStudents = list(students)
+        self.allGroups = list(groups)
         
         self.groupsByProp = {}
-        for group in groups:
-            for prop in group.info:
-                val = group.info[prop]
-                
-                if not prop in self.groupsByProp:
-                    self.groupsByProp[prop] = {}
-                if not val in self.groupsByProp[prop]:
-                    self.groupsByProp[prop][val] = []
-                self.groupsByProp[prop][val].append(group)
+        for group in self.allGroups:
+            _addToIndex(self.groupsByProp, group)
         
         self.studentsByProp = {}
-        for student in students:
-            info = student.info
-
-            for prop in info:
-                val = info[prop]
-                
-                if not prop in self.studentsByProp:
-                    self.studentsByProp[prop] = {}
-                if not val in self.studentsByProp[prop]:
-                    self.studentsByProp[prop][val] = []
-                self.studentsByProp[prop][val].append(student)
-        
+        for student in self.allStudents:
+            _addToIndex(self.studentsByProp, student)
+
+        # Filter results, keyed by Filter.key()
+        self.studentCache = {}
+        self.groupCache = {}
+
+        self.studentRanges = RangeIndex(self.allStudents)
+        self.groupRanges = RangeIndex(self.allGroups)
+        self.studentStats = Statistics(self.studentsByProp, self.allStudents, self.studentRanges)
+        self.groupStats = Statistics(self.groupsByProp, self.allGroups, self.groupRanges)
         
     def getStudents(self):
         """Get all students"""
@@ -37,19 +171,99 @@ class DataBox:
         """Get all groups"""
         return self.allGroups
     
-    def _filter(self, filter, mapping, allEntries):
+    def _filter(self, filter, mapping, allEntries, rangeIndex, stats):
         if (filter == None):
             return allEntries
 
-        return filter.apply(mapping, allEntries)
+        return filter.apply(mapping, allEntries, rangeIndex, stats)
+
+    def _cached(self, cache, filter, applyFilter):
+        """Returns applyFilter(filter), remembering results of filters with the same structure (see Filter.key)"""
+        if filter == None:
+            return applyFilter(filter)
+        try:
+            key = filter.key()
+        except TypeError:
+            # A stencil value that can't be hashed, so the result isn't kept
+            return applyFilter(filter)
+        if not key in cache:
+            cache[key] = (filter, applyFilter(filter))
+        return cache[key][1]
+
+    def _uncache(self, cache, entry):
+        """Forgets the cached results that entry is (or would be) part of. The others don't change when entry is added or removed"""
+        for key in list(cache):
+            if cache[key][0].matches(entry):
+                del cache[key]
+
+    def _insert(self, entry, entries, cache, indexes):
+        """Appends entry to entries, keeping the indexes and cache up to date"""
+        self._uncache(cache, entry)
+        entries.append(entry)
+        self._index(entry, len(entries) - 1, indexes)
+
+    def _delete(self, entry, entries, cache, indexes):
+        """Takes entry out of entries, keeping the indexes and cache up to date"""
+        k = entries.index(entry)
+        self._uncache(cache, entry)
+        del entries[k]
+        self._unindex(entry, k, indexes)
+
+    def _index(self, entry, k, indexes):
+        """Adds entries[k] to the indexes of its kind (see _studentIndexes)"""
+        (propToValToObjects, rangeIndex, stats) = indexes
+        _addToIndex(propToValToObjects, entry)
+        rangeIndex.add(k)
+        stats.add(entry.info)
+
+    def _unindex(self, entry, k, indexes):
+        """Takes entry, which was at position k, out of the indexes of its kind"""
+        (propToValToObjects, rangeIndex, stats) = indexes
+        _removeFromIndex(propToValToObjects, entry)
+        rangeIndex.reset()
+        stats.remove(entry.info)
+
+    def _studentIndexes(self):
+        return (self.studentsByProp, self.studentRanges, self.studentStats)
+
+    def _groupIndexes(self):
+        return (self.groupsByProp, self.groupRanges, self.groupStats)
+
+    def addStudent(self, student):
+        """Adds a student (with an id no other student in the box has)"""
+        self._insert(student, self.allStudents, self.studentCache, self._studentIndexes())
+
+    def removeStudent(self, student):
+        """Removes a student that is in the box"""
+        self._delete(student, self.allStudents, self.studentCache, self._studentIndexes())
+
+    def updateStudent(self, student, info):
+        """Replaces the info of a student that is in the box. The student is then listed after the others, as if it was removed and added again"""
+        self.removeStudent(student)
+        student.info = info
+        self.addStudent(student)
+
+    def addGroup(self, group):
+        """Adds a group (with an id no other group in the box has)"""
+        self._insert(group, self.allGroups, self.groupCache, self._groupIndexes())
+
+    def removeGroup(self, group):
+        """Removes a group that is in the box"""
+        self._delete(group, self.allGroups, self.groupCache, self._groupIndexes())
+
+    def updateGroup(self, group, info):
+        """Replaces the info of a group that is in the box. The group is then listed after the others, as if it was removed and added again"""
+        self.removeGroup(group)
+        group.setInfo(info)
+        self.addGroup(group)
 
     def filterStudents(self, filter):
-        """Apply a filter to all students"""
-        return self._filter(filter, self.studentsByProp, self.allStudents)
+        """Apply a filter to all students (the returned list is shared, don't change it)"""
+        return self._cached(self.studentCache, filter, lambda filter: self._filter(filter, self.studentsByProp, self.allStudents, self.studentRanges, self.studentStats))
 
     def filterGroups(self, filter):
-        """Apply a filter to all groups"""
-        return self._filter(filter, self.groupsByProp, self.allGroups)
+        """Apply a filter to all groups (the returned list is shared, don't change it)"""
+        return self._cached(self.groupCache, filter, lambda filter: self._filter(filter, self.groupsByProp, self.allGroups, self.groupRanges, self.groupStats))
     
     def getStudentsWhoShareProperty(self, propertyname):
         """Returns a list of arrays where each array contains students that have the same value for that property"""
@@ -59,4 +273,43 @@ class DataBox:
         for val in self.studentsByProp[propertyname]:    
             out.append(self.studentsByProp[propertyname][val])
             
-        return out
\ No newline at end of file
+        return out
+
+class DataBoxSubset(DataBox):
+    """A DataBox holding part of the problem held by another DataBox. Filters give the same results as in the full DataBox, limited to this part
+    :param dataBox: the DataBox holding the whole problem
+    :param students: students of this part (matched to the full problem by id)
+    :param groups: groups of this part (matched to the full problem by id)
+    """
+    def __init__(self, dataBox, students, groups):
+        self.dataBox = dataBox
+        self.allStudents = students
+        self.allGroups = groups
+
+        self.studentsByID = dict((student.id, student) for student in students)
+        self.groupsByID = dict((group.id, group) for group in groups)
+
+        self.studentCache = {}
+        self.groupCache = {}
+
+        # Filters are planned with the statistics of the whole problem
+        self.isColumnar = dataBox.isColumnar
+        self.studentStats = dataBox.studentStats
+        self.groupStats = dataBox.groupStats
+
+    def filterStudents(self, filter):
+        """Apply a filter to all students (the returned list is shared, don't change it)"""
+        return self._cached(self.studentCache, filter, lambda filter: [self.studentsByID[student.id] for student in self.dataBox.filterStudents(filter) if student.id in self.studentsByID])
+
+    def filterGroups(self, filter):
+        """Apply a filter to all groups (the returned list is shared, don't change it)"""
+        return self._cached(self.groupCache, filter, lambda filter: [self.groupsByID[group.id] for group in self.dataBox.filterGroups(filter) if group.id in self.groupsByID])
+
+    def getStudentsWhoShareProperty(self, propertyname):
+        """Returns a list of arrays where each array contains students that have the same value for that property"""
+        out = []
+        for students in self.dataBox.getStudentsWhoShareProperty(propertyname):
+            students = [self.studentsByID[student.id] for student in students if student.id in self.studentsByID]
+            if len(students) > 0:
+                out.append(students)
+        return out
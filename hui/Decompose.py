@@ -0,0 +1,86 @@
+from Group import Group
+from Student import Student
+from DataBox import DataBoxSubset
+
+# DECOMPOSITION
+# When required goals keep students in disjoint sets of groups (e.g. each section only goes into its own groups), a goal group is really several independent problems.
+# Students are linked to the groups they may be placed in (and to students that must be solved together, e.g. pods), and each connected part is solved on its own.
+
+def split(dataBox, goals):
+    """Splits a goal group's problem into independent parts
+    :param dataBox: the DataBox holding the whole problem
+    :param goals: the goals of one goal group
+    :return: a list of (students, groups) parts, or None if the problem can't be split
+    """
+    students = dataBox.getStudents()
+    groups = dataBox.getGroups()
+
+    # sid ==> gids the student may be placed in (None means any group)
+    allowed = dict((student.id, None) for student in students)
+    together = []
+    for goal in goals:
+        info = goal.splitInfo(dataBox)
+        if info == None:
+            return None
+        (goalAllowed, goalTogether) = info
+        for sid in goalAllowed:
+            if allowed[sid] == None:
+                allowed[sid] = set(goalAllowed[sid])
+            else:
+                allowed[sid] = allowed[sid] & goalAllowed[sid]
+        together += goalTogether
+
+    # A student that may go anywhere ties everything together. A student that can't go anywhere makes the problem infeasible, which the full problem reports
+    for sid in allowed:
+        if allowed[sid] == None or len(allowed[sid]) == 0:
+            return None
+
+    # Union-find over students (keyed ('s', sid)) and groups (keyed ('g', gid))
+    parent = {}
+    def find(key):
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+    def union(keyA, keyB):
+        parent[find(keyA)] = find(keyB)
+
+    for sid in allowed:
+        for gid in allowed[sid]:
+            union(('s', sid), ('g', gid))
+    for sids in together:
+        for k in range(1, len(sids)):
+            union(('s', sids[0]), ('s', sids[k]))
+
+    parts = {}
+    order = []
+    for student in students:
+        root = find(('s', student.id))
+        if not root in parts:
+            parts[root] = ([], [])
+            order.append(root)
+        parts[root][0].append(student)
+    if len(order) < 2:
+        return None
+
+    # Groups no student may use stay empty, they go with the first part so their rewards and minsize still count
+    for group in groups:
+        root = find(('g', group.id))
+        if not root in parts:
+            root = order[0]
+        parts[root][1].append(group)
+    return [parts[root] for root in order]
+
+def buildPart(dataBox, students, groups, createVariables, allowed=None):
+    """Creates fresh students and groups (same ids) for one part, so that its model only holds its own variables.
+    They are put in their order of this run (see Student.order), so a randomized run shuffles the part's columns too
+    :param allowed: {sid: gids} the groups each student may be placed in (see Sparse.py), or None for every group of the part
+    :return: (students, groups, dataBox) of the part
+    """
+    partGroups = [Group(group.id, group.info, group.order) for group in sorted(groups, key=lambda group: group.order)]
+    partStudents = []
+    for student in sorted(students, key=lambda student: student.order):
+        studentGroups = partGroups if allowed == None else [group for group in partGroups if group.id in allowed[student.id]]
+        partStudents.append(Student(student.id, student.info, studentGroups, createVariables=createVariables, order=student.order))
+    return (partStudents, partGroups, DataBoxSubset(dataBox, partStudents, partGroups))
@@ -0,0 +1,155 @@
+import Symmetry
+import Sparse
+
+# MODEL SIZE ESTIMATES
+# Some problems make models too large to build (e.g. a MinSimilarGoal on a property with many values makes an indicator for each value and group).
+# Their size can be told before anything is built: each goal adds its rows to a model that only counts the columns, rows and nonzeros they would make
+# (goals add them through the same calls as to a MatrixModel), so no PuLP variables or coefficient arrays are made.
+# Counts are of the model before presolve, so the model handed to the solver is usually smaller (with PuLP and sparse membership,
+# symmetry breaking rows on pairs that have no variable aren't made at all, so constraints are counted a bit high). Memory is a rough guess from the counts,
+# for the process building the model (the solver takes about as much again).
+
+# Rough bytes of memory per variable, constraint and nonzero coefficient of each engine's model (the search engine builds none)
+BYTES = {
+    'pulp': {'variable': 1500, 'constraint': 2500, 'nonzero': 400},
+    'matrix': {'variable': 300, 'constraint': 300, 'nonzero': 200}
+}
+
+# What a budget can limit (see GroupCreator.setModelBudget)
+LIMITS = ['variables', 'constraints', 'memoryMB']
+
+class CountingModel(object):
+    """Stands in for a MatrixModel and only counts what is added to it
+    :param students: a list of students (see Student.py)
+    :param groups: a list of groups (see Group.py)
+    :param allowed: {sid: gids} the groups each student may be placed in (see Sparse.py), or None if every pair is allowed
+    :param pulp: if True, counts the model as the PuLP engine builds it: required indicators and rewards are constraints there, not bounds and objective coefficients
+    """
+    def __init__(self, students, groups, allowed=None, pulp=False):
+        self.pulp = pulp
+        self.numVars = 0
+        self.numRows = 0
+        self.numNonzeros = 0
+
+        # Symmetry breaking fixes columns at 0 through this
+        self.colUpper = {}
+
+        # Membership variables of each group
+        membersOf = dict((group.id, len(students)) for group in groups)
+        if allowed != None:
+            membersOf = dict((group.id, 0) for group in groups)
+            for student in students:
+                for gid in allowed[student.id]:
+                    if gid in membersOf:
+                        membersOf[gid] += 1
+            if not pulp:
+                # The column fixed at 0 (see MatrixModel)
+                self.numVars += 1
+        numMembers = sum(membersOf.values())
+        self.numVars += numMembers
+
+        # Each student must be in exactly one group
+        self._addRows(len(students), numMembers)
+        for group in groups:
+            members = membersOf[group.id]
+            sized = [group.size != None, group.minsize != None and group.minsize != 0]
+            # PuLP has a constraint for each bound, the matrix engine a ranged row
+            sizeRows = sum(sized) if pulp else int(any(sized))
+            self._addRows(sizeRows, sizeRows * members)
+            # "not in use" variable
+            self.numVars += 1
+            self._addRows(2, 2 * (members + 1))
+
+    def _addRows(self, count, nonzeros):
+        self.numRows += count
+        self.numNonzeros += nonzeros
+
+    def getVar(self, sid, gid):
+        return 0
+
+    def getNotInUseVar(self, gid):
+        return 0
+
+    def addRow(self, cols, coefs, lower, upper, defines=-1):
+        self._addRows(1, len(cols))
+
+    def addBoolVar(self):
+        self.numVars += 1
+        return 0
+
+    def boolFromLowerBound(self, cols, lowBound, upBound=None):
+        self._addRows(2, 2 * (len(cols) + 1))
+        return self.addBoolVar()
+
+    def boolFromUpperBound(self, cols, upperBound, upBound=None):
+        self._addRows(2, 2 * (len(cols) + 1))
+        return self.addBoolVar()
+
+    def boolOr(self, varA, varB):
+        self._addRows(2, 6)
+        return self.addBoolVar()
+
+    def requireTrue(self, col):
+        if self.pulp:
+            self._addRows(1, 1)
+
+    def addReward(self, col, reward):
+        if self.pulp:
+            # A reward variable set by a constraint (see LPHelpers._createRewardVar)
+            self.addBoolVar()
+            self._addRows(1, 2)
+
+    def addSymmetryRows(self, numStudents, classSize):
+        """Counts the symmetry breaking rows of one class of interchangeable groups (see Symmetry.py)"""
+        m = min(numStudents, classSize)
+        if self.pulp:
+            # Pairs that can't be used are constraints in PuLP, bounds in the matrix engine
+            forbidden = sum(classSize - 1 - i for i in range(m))
+            self._addRows(forbidden, forbidden)
+        for i in range(1, m):
+            self._addRows(i, i * (i + 1))
+
+def estimateGoalGroup(goals, dataBox, engine, allowed=None, breakSymmetry=True):
+    """Predicts the size of the model of one goal group, without building it
+    :param goals: the goals of the goal group
+    :param dataBox: the DataBox holding the problem
+    :param engine: 'pulp', 'matrix' or 'search' (counted like 'matrix', with no memory since it builds no model)
+    :param allowed: {sid: gids} the groups each student may be placed in (see Sparse.py), or None if every pair is allowed
+    :param breakSymmetry: True if symmetry breaking rows are added (see GroupCreator.setBreakSymmetry)
+    :return: {'variables': n, 'constraints': n, 'nonzeros': n, 'memoryMB': x, 'goals': [{'goal', 'variables', 'constraints', 'nonzeros'}, ...]},
+    or None if a goal couldn't be interpreted
+    """
+    students = dataBox.getStudents()
+    groups = dataBox.getGroups()
+    model = CountingModel(students, groups, allowed, engine == 'pulp')
+    goalCounts = []
+    for goal in (Sparse.modelGoals(goals) if allowed != None else goals):
+        (numVars, numRows, numNonzeros) = (model.numVars, model.numRows, model.numNonzeros)
+        if goal.genMatrixConstraintsAndRewards(dataBox, model) == None:
+            return None
+        goalCounts.append({'goal': type(goal).__name__, 'variables': model.numVars - numVars, 'constraints': model.numRows - numRows, 'nonzeros': model.numNonzeros - numNonzeros})
+    if breakSymmetry:
+        for groupClass in Symmetry.interchangeableGroups(groups, goals):
+            model.addSymmetryRows(len(students), len(groupClass))
+
+    memoryMB = None
+    if engine in BYTES:
+        perUnit = BYTES[engine]
+        memoryMB = (model.numVars * perUnit['variable'] + model.numRows * perUnit['constraint'] + model.numNonzeros * perUnit['nonzero']) / (1024.0 * 1024.0)
+    return {'variables': model.numVars, 'constraints': model.numRows, 'nonzeros': model.numNonzeros, 'memoryMB': memoryMB, 'goals': goalCounts}
+
+def checkBudget(budget):
+    """Raises an error unless budget is None or a dict of limits (see LIMITS)"""
+    if budget == None:
+        return
+    if not isinstance(budget, dict):
+        raise TypeError('budget must be a dict, e.g. {"variables": 1000000}')
+    for limit in budget:
+        if not limit in LIMITS:
+            raise ValueError('budget limits must be among: ' + ', '.join(LIMITS))
+        if budget[limit] <= 0:
+            raise ValueError('budget limits must be positive')
+
+def overBudget(estimate, budget):
+    """The limits of budget an estimate (see estimateGoalGroup) goes over, as a list of names (empty if it fits)"""
+    return [limit for limit in LIMITS if limit in budget and estimate[limit] != None and estimate[limit] > budget[limit]]
@@ -0,0 +1,63 @@
+import os
+import pickle
+
+# EVENTS
+# Listeners are told how a run is going while it runs, e.g. to show progress or export metrics. Each listener is called as listener(event, details):
+# - 'goalGroupStarted': a goal group is about to be solved. details: goalGroup (index), goals (number of goals)
+# - 'goalGroupFinished': a goal group was solved or failed. details: goalGroup, status (None if its constraints couldn't be interpreted), reward, timedOut
+# - 'goalConstraintsGenerated': a goal's constraints were added to the model. details: goal
+# - 'solveStarted': the model is handed to the solver. details: engine
+# - 'incumbentFound': the solver found groups with more reward than any before (matrix engine with CBC, and the search engine). details: engine, reward
+# Listeners are only called in the process they were added in. Worker processes that solve goal groups or their parts put their events on the queue
+# they send their result back on, and the process that started them reports the events as they arrive.
+# With no listener for an event, the code that reports it is skipped.
+
+EVENTS = ['goalGroupStarted', 'goalGroupFinished', 'goalConstraintsGenerated', 'solveStarted', 'incumbentFound']
+
+class Events(object):
+    """The listeners of a group creator, by event"""
+    def __init__(self):
+        self.listeners = {}     # event ==> [listener, ...]
+        self.pid = None         # process the listeners were added in
+        self.queue = None       # in a worker process, the queue events are sent back on (see forward)
+
+    def add(self, listener, events=None):
+        """Calls listener(event, details) on each of events (default: all of them)"""
+        if events == None:
+            events = EVENTS
+        for event in events:
+            if not event in EVENTS:
+                raise ValueError('event must be one of: ' + ', '.join(EVENTS))
+        for event in events:
+            self.listeners.setdefault(event, []).append(listener)
+        self.pid = os.getpid()
+
+    def remove(self, listener):
+        """Stops calling listener"""
+        for event in list(self.listeners):
+            self.listeners[event] = [other for other in self.listeners[event] if other != listener]
+            if len(self.listeners[event]) == 0:
+                del self.listeners[event]
+
+    def forward(self, queue):
+        """Called in a worker process: events are put on queue as (None, (event, details)) from now on, for the process the listeners were added in to report"""
+        self.queue = queue
+
+    def listening(self, event):
+        """True if event has listeners in this process or is sent back to them (check before building its details)"""
+        return event in self.listeners and (os.getpid() == self.pid or self.queue != None)
+
+    def emit(self, event, details):
+        """Calls the listeners of event, or sends it back from a worker process"""
+        if os.getpid() == self.pid:
+            for listener in self.listeners.get(event, []):
+                listener(event, details)
+            return
+        if self.queue == None:
+            return
+        # Events that can't be pickled are dropped rather than failing the solve
+        try:
+            pickle.dumps(details, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        self.queue.put((None, (event, details)))
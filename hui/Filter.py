@@ -1,20 +1,35 @@
 import Utils
 
 ### Helper Functions
+# Results are (entries, ids) pairs: a list of entries without repeats, and the set of their ids
+
+def _withIDs(entries):
+    """Returns the (entries, ids) pair of a list of distinct entries"""
+    return (entries, set(entry.id for entry in entries))
 
 def _intersect(groupA, groupB):
-    """Returns the intersection of groupA and groupB"""
-    return [item for item in groupA if item in groupB]
+    """Returns the intersection of groupA and groupB, in the order of groupA"""
+    ids = groupA[1] & groupB[1]
+    return ([item for item in groupA[0] if item.id in ids], ids)
 
 def _subtract(groupA, groupB):
-    """Returns groupA without elements that are also in groupB"""
-    return [item for item in groupA if not item in groupB]
+    """Returns groupA without elements that are also in groupB, in the order of groupA"""
+    ids = groupA[1] - groupB[1]
+    return ([item for item in groupA[0] if item.id in ids], ids)
 
 def _union(groupA, groupB):
-    """Returns the union of groupA and groupB"""
-    elems = set(groupA)
-    elems.update(groupB)
-    return list(elems)
+    """Returns the union of groupA and groupB: groupA, then the elements of groupB that aren't in groupA"""
+    return (groupA[0] + [item for item in groupB[0] if not item.id in groupA[1]], groupA[1] | groupB[1])
+
+def _stencilKey(stencilVal):
+    """Hashable description of one stencil value"""
+    if isinstance(stencilVal, Between):
+        return ('Between', stencilVal.bounds())
+    if isinstance(stencilVal, ListHolder):
+        return (type(stencilVal).__name__, tuple(stencilVal.items()))
+    if isinstance(stencilVal, ItemHolder):
+        return (type(stencilVal).__name__, stencilVal.item())
+    return ('value', stencilVal)
 
 ### Advanced Operations
 
@@ -39,17 +54,104 @@ class NotIn(ListHolder):
 class IsNot(ItemHolder):
     pass
 
+# Comparisons describe the values they keep as (lower, upper) bounds: (value, inclusive) pairs, or None if unbounded
+
 class LT(ItemHolder): # Less than
-    pass
+    def bounds(self):
+        return (None, (self.it, False))
 
 class GT(ItemHolder): # Greater than
-    pass
+    def bounds(self):
+        return ((self.it, False), None)
 
 class LTE(ItemHolder): # Less than or equal to
-    pass
+    def bounds(self):
+        return (None, (self.it, True))
 
 class GTE(ItemHolder): # Greater than or equal to
-    pass
+    def bounds(self):
+        return ((self.it, True), None)
+
+class Between(object): # low <= value <= high (ends can be left out with includeLow/includeHigh)
+    def __init__(self, low, high, includeLow=True, includeHigh=True):
+        self.low = low
+        self.high = high
+        self.includeLow = includeLow
+        self.includeHigh = includeHigh
+    def bounds(self):
+        return ((self.low, self.includeLow), (self.high, self.includeHigh))
+
+COMPARISONS = (LT, GT, LTE, GTE, Between)
+
+def _inRange(value, lower, upper):
+    """True if value is within the (lower, upper) bounds"""
+    if lower != None and not (value >= lower[0] if lower[1] else value > lower[0]):
+        return False
+    if upper != None and not (value <= upper[0] if upper[1] else value < upper[0]):
+        return False
+    return True
+
+class _Bounds(object):
+    """Comparison of both bounds, used to describe merged ranges"""
+    def __init__(self, lower, upper):
+        self.lower = lower
+        self.upper = upper
+    def bounds(self):
+        return (self.lower, self.upper)
+
+def _values(stencilVal):
+    """(values, inverted) of an exact-value stencil value: entries match if their value is one of values (or the wildcard), or isn't if inverted"""
+    if type(stencilVal) is IsIn:
+        return (stencilVal.items(), False)
+    if type(stencilVal) is NotIn:
+        return (stencilVal.items(), True)
+    if type(stencilVal) is IsNot:
+        return ([stencilVal.item()], True)
+    return ([stencilVal], False)
+
+def _passes(entry, stencilProp, stencilVal):
+    """True if a single entry passes one property of a stencil (same rules as looking it up)"""
+    if type(stencilVal) in COMPARISONS:
+        return stencilProp in entry.info and _inRange(entry.info[stencilProp], *stencilVal.bounds())
+    (vals, invertSelection) = _values(stencilVal)
+    found = stencilProp in entry.info and (entry.info[stencilProp] in vals or entry.info[stencilProp] == Utils.WILDCARD)
+    return found != invertSelection
+
+def _estimate(stats, stencilProp, stencilVal):
+    """Estimated number of entries that pass one property of a stencil (see DataBox.Statistics)"""
+    if type(stencilVal) in COMPARISONS:
+        (lower, upper) = stencilVal.bounds()
+        return stats.countRange(stencilProp, lower, upper)
+    (vals, invertSelection) = _values(stencilVal)
+    count = stats.countValues(stencilProp, vals)
+    return stats.total - count if invertSelection else count
+
+def _describe(stencilProp, stencilVal):
+    """Readable description of one property of a stencil"""
+    if type(stencilVal) in COMPARISONS or type(stencilVal) is _Bounds:
+        (lower, upper) = stencilVal.bounds()
+        if upper == None:
+            return stencilProp + (' >= ' if lower[1] else ' > ') + repr(lower[0])
+        text = stencilProp + (' <= ' if upper[1] else ' < ') + repr(upper[0])
+        if lower != None:
+            text = repr(lower[0]) + (' <= ' if lower[1] else ' < ') + text
+        return text
+    (vals, invertSelection) = _values(stencilVal)
+    if type(stencilVal) in (IsIn, NotIn):
+        return stencilProp + (' not in ' if invertSelection else ' in ') + repr(list(vals))
+    return stencilProp + (' != ' if invertSelection else ' = ') + repr(vals[0])
+
+def _tighter(boundA, boundB, isLower):
+    """The tighter of two lower (or upper) bounds"""
+    if boundA == None:
+        return boundB
+    if boundB == None:
+        return boundA
+    if boundA[0] == boundB[0]:
+        return (boundA[0], boundA[1] and boundB[1])
+    if (boundA[0] > boundB[0]) == isLower:
+        return boundA
+    return boundB
 
 ### Filter Class
 
@@ -78,19 +180,39 @@ class Filter(object):
         self.operation = operation
         self.isLeaf = False
 
-    def apply(self, propToValToObjects, allEntries):
+    def apply(self, propToValToObjects, allEntries, rangeIndex=None, stats=None):
         """Applies this filter to the entries provided
         :param propToValToObjects: dictionary propToValToObjects[propertyname][value] = [object1, object2, ...] where objects in the list satisfy object1[propertyname] = value
-        :param allEntries: a list of all entries, unsorted and uncategorized
+        :param allEntries: a list of all entries (each with a unique id), unsorted and uncategorized
+        :param rangeIndex: sorted indexes of allEntries (see DataBox.RangeIndex) that comparisons are looked up in. None compares every entry
+        :param stats: value counts of allEntries (see DataBox.Statistics) used to plan the order predicates are evaluated in. None keeps the stencil's order
+        :return: the matching entries, without repeats
         """
+        if self.isLeaf and self.stencil == None:
+            return allEntries
+        return self._apply(propToValToObjects, allEntries, rangeIndex, stats)[0]
+
+    def _apply(self, propToValToObjects, allEntries, rangeIndex, stats):
+        """Same as apply, but returns an (entries, ids) pair"""
         if self.isLeaf:
             # Leaf!
-            return self._applyLeaf(propToValToObjects, allEntries)
+            return self._applyLeaf(propToValToObjects, allEntries, rangeIndex, stats)
         else:
             # Node
             (left, right) = self.filters
-            leftMatches = left.apply(propToValToObjects, allEntries)
-            rightMatches = right.apply(propToValToObjects, allEntries)
+            merged = self._mergedRange()
+            if merged != None:
+                return self._applyRange(merged[0], merged[1], merged[2], allEntries, rangeIndex)
+            leftMatches = left._apply(propToValToObjects, allEntries, rangeIndex, stats)
+            if self.operation != 'or':
+                if len(leftMatches[0]) == 0:
+                    # Nothing to keep or take away from
+                    return leftMatches
+                if self._checksRight(len(leftMatches[0]), stats):
+                    # Checking the few left matches one by one is cheaper than finding every right match
+                    keep = self.operation == 'and'
+                    return _withIDs([entry for entry in leftMatches[0] if right.matches(entry) == keep])
+            rightMatches = right._apply(propToValToObjects, allEntries, rangeIndex, stats)
             matches = None
             if self.operation == 'and':
                 matches = _intersect(leftMatches, rightMatches)
@@ -99,101 +221,202 @@ class Filter(object):
             elif self.operation == 'sub':
                 matches = _subtract(leftMatches, rightMatches)
             return matches
-            
-    
-    def _applyLeaf(self, propToValToObjects, allEntries):
-        """Apply this leaf using the stencil"""
-        if self.stencil == None:
-            return allEntries
 
-        matches = None
-        for stencilProp in self.stencil:
+    def _checksRight(self, numLeft, stats):
+        """True if an 'and'/'sub' node checks each of its numLeft left matches against the right filter instead of finding the right filter's matches"""
+        return stats != None and numLeft < self.filters[1].estimate(stats)
+
+    def _mergedRange(self):
+        """(property, lower, upper) if this is an 'and' of two comparisons of the same property (e.g. GTE(2) * LTE(3)), which are looked up as one range. Otherwise None"""
+        if self.isLeaf or self.operation != 'and':
+            return None
+        (left, right) = self.filters
+        (leftRange, rightRange) = (left._range(), right._range())
+        if leftRange == None or rightRange == None or leftRange[0] != rightRange[0]:
+            return None
+        return (leftRange[0], _tighter(leftRange[1], rightRange[1], True), _tighter(leftRange[2], rightRange[2], False))
+
+    def _range(self):
+        """(property, lower, upper) if this filter is a single comparison (see bounds), otherwise None"""
+        if not self.isLeaf or self.stencil == None or len(self.stencil) != 1:
+            return None
+        (stencilProp, stencilVal) = list(self.stencil.items())[0]
+        if not type(stencilVal) in COMPARISONS:
+            return None
+        return (stencilProp,) + stencilVal.bounds()
+
+    def _applyRange(self, stencilProp, lower, upper, allEntries, rangeIndex):
+        """Entries whose stencilProp is within the bounds (entries without stencilProp can't be compared), in the order of allEntries
+        :return: an (entries, ids) pair
+        """
+        found = None
+        if rangeIndex != None:
+            found = rangeIndex.select(stencilProp, lower, upper)
+        if found == None:
+            found = [e for e in allEntries if stencilProp in e.info and _inRange(e.info[stencilProp], lower, upper)]
+        return _withIDs(found)
+
+    def _plan(self, stats):
+        """Order the stencil's properties are evaluated in: exact-value predicates before comparisons, each kind from the fewest estimated matches to the most"""
+        def cost(stencilProp):
             stencilVal = self.stencil[stencilProp]
+            return (type(stencilVal) in COMPARISONS, 0 if stats == None else _estimate(stats, stencilProp, stencilVal))
+        return sorted(self.stencil, key=cost)
 
-            # Determine the type of filtering
-            vals = []
-            filterByComparison = False
-            invertSelection = False
-            if type(stencilVal) is IsIn:
-                vals = stencilVal.items()
-            elif type(stencilVal) is NotIn:
-                vals = stencilVal.items()
-                invertSelection = True
-            elif type(stencilVal) is IsNot:
-                item = stencilVal.item()
-                vals = [item]
-                invertSelection = True
-            elif type(stencilVal) is GT or type(stencilVal) is LT or type(stencilVal) is GTE or type(stencilVal) is LTE:
-                filterByComparison = True
-            else:
-                vals = [stencilVal]
-
-            newCandidates = []
-
-            # FILTER BY COMPARISON
-            if filterByComparison:
-                # Get all people that match
-                newCandidates = []
-                for e in allEntries:
-                    if not stencilProp in e.info:
-                        # Cannot compare if no property defined
-                        continue
-
-                    # Now compare
-                    val = stencilVal.item()
-                    realVal = e.info[stencilProp]
-
-                    success = False
-                    if type(stencilVal) is GT:
-                        success = (realVal > val)
-                    elif type(stencilVal) is GTE:
-                        success = (realVal >= val)
-                    elif type(stencilVal) is LT:
-                        success = (realVal < val)
-                    elif type(stencilVal) is LTE:
-                        success = (realVal <= val)
-
-                    if success:
-                        newCandidates.append(e)
-
-            # FILTER BY VALUE(S)
-            else:
-                # Gather candidates
-                candidates = []
-                # > Add candidates that match filter
-                for v in vals:
-                    if not v in propToValToObjects[stencilProp]:
-                        # No objects have this value
-                        continue
-                    candidates += propToValToObjects[stencilProp][v]
-                # > Add candidates that have a wildcard
-                if Utils.WILDCARD in propToValToObjects[stencilProp]:
-                    candidates += propToValToObjects[stencilProp][Utils.WILDCARD]
-
-                # Invert selection if necessary
-                newCandidates = candidates
-                if invertSelection:
-                    newCandidates = []
-                    for entry in allEntries:
-                        if entry in candidates:
-                            continue
-                        # Was not a candidate, make it one
-                        newCandidates.append(entry)
-
-            # Merge new candidates with others
-            if matches == None:
-                # This is the first property
-                matches = newCandidates
-                continue
-            # Use intersection so we can keep only those that maintain all filters
-            matches = self._intersect(matches, newCandidates)
-
-            # Stop going if we no longer have any matches
-            if len(matches) == 0:
-                return []
+    def _applyLeaf(self, propToValToObjects, allEntries, rangeIndex, stats):
+        """Apply this leaf using the stencil: the first property of the plan is looked up, matches are then checked against the other properties"""
+        if self.stencil == None:
+            return _withIDs(allEntries)
 
+        plan = self._plan(stats)
+        if len(plan) == 0:
+            # An empty stencil matches everything
+            return _withIDs(allEntries)
+
+        stencilProp = plan[0]
+        stencilVal = self.stencil[stencilProp]
+
+        # FILTER BY COMPARISON
+        if type(stencilVal) in COMPARISONS:
+            (lower, upper) = stencilVal.bounds()
+            matches = self._applyRange(stencilProp, lower, upper, allEntries, rangeIndex)
+
+        # FILTER BY VALUE(S)
+        else:
+            (vals, invertSelection) = _values(stencilVal)
+            valToObjects = propToValToObjects.get(stencilProp, {})
+            # > Add candidates that match filter, then candidates that have a wildcard
+            candidates = []
+            ids = set()
+            for v in list(vals) + [Utils.WILDCARD]:
+                if not v in valToObjects:
+                    # No objects have this value
+                    continue
+                for entry in valToObjects[v]:
+                    if not entry.id in ids:
+                        ids.add(entry.id)
+                        candidates.append(entry)
+
+            # Invert selection if necessary
+            matches = (candidates, ids)
+            if invertSelection:
+                matches = _withIDs([entry for entry in allEntries if not entry.id in ids])
+
+        # Keep only those that maintain all the other properties
+        if len(plan) > 1 and len(matches[0]) > 0:
+            matches = _withIDs([entry for entry in matches[0] if all(_passes(entry, otherProp, self.stencil[otherProp]) for otherProp in plan[1:])])
         return matches
 
+    def matches(self, entry):
+        """True if a single entry passes this filter"""
+        if self.isLeaf:
+            if self.stencil == None:
+                return True
+            return all(_passes(entry, stencilProp, self.stencil[stencilProp]) for stencilProp in self.stencil)
+        (left, right) = self.filters
+        if self.operation == 'and':
+            return left.matches(entry) and right.matches(entry)
+        if self.operation == 'or':
+            return left.matches(entry) or right.matches(entry)
+        return left.matches(entry) and not right.matches(entry)
+
+    def mask(self, columns):
+        """Boolean array of the entries of columns (see ColumnarDataBox.Columns) that pass this filter, built with vectorized operations"""
+        if self.isLeaf:
+            mask = columns.all()
+            if self.stencil == None:
+                return mask
+            for stencilProp in self.stencil:
+                stencilVal = self.stencil[stencilProp]
+                if type(stencilVal) in COMPARISONS:
+                    (lower, upper) = stencilVal.bounds()
+                    propMask = columns.whereNumber(stencilProp, lower, upper)
+                    if propMask is None:
+                        propMask = columns.whereValue(stencilProp, lambda value: _inRange(value, lower, upper))
+                else:
+                    (vals, invertSelection) = _values(stencilVal)
+                    propMask = columns.whereValue(stencilProp, lambda value: value in vals or value == Utils.WILDCARD)
+                    if invertSelection:
+                        propMask = ~propMask
+                mask &= propMask
+            return mask
+        (left, right) = self.filters
+        if self.operation == 'and':
+            return left.mask(columns) & right.mask(columns)
+        if self.operation == 'or':
+            return left.mask(columns) | right.mask(columns)
+        return left.mask(columns) & ~right.mask(columns)
+
+    def estimate(self, stats):
+        """Estimated number of matches, from the value counts in stats (see DataBox.Statistics)"""
+        if self.isLeaf:
+            if self.stencil == None or len(self.stencil) == 0:
+                return stats.total
+            return min(_estimate(stats, stencilProp, self.stencil[stencilProp]) for stencilProp in self.stencil)
+        merged = self._mergedRange()
+        if merged != None:
+            return stats.countRange(merged[0], merged[1], merged[2])
+        (left, right) = self.filters
+        if self.operation == 'and':
+            return min(left.estimate(stats), right.estimate(stats))
+        if self.operation == 'or':
+            return min(stats.total, left.estimate(stats) + right.estimate(stats))
+        return left.estimate(stats)
+
+    def explain(self, dataBox, groups=False):
+        """Describes how this filter is evaluated on the students (or groups) of dataBox, with the estimated number of matches of each step
+        :return: a string, one step per line
+        """
+        stats = dataBox.groupStats if groups else dataBox.studentStats
+        lines = self._explain(stats, '')
+        if dataBox.isColumnar:
+            lines.insert(0, '(columnar data box: every step is evaluated as a mask over all entries, row counts are exact)')
+        return '\n'.join(lines)
+
+    def _explain(self, stats, indent):
+        """Lines of explain for this filter"""
+        rows = ' (est. ' + str(self.estimate(stats)) + ' rows)'
+        if self.isLeaf:
+            if self.stencil == None or len(self.stencil) == 0:
+                return [indent + 'all entries' + rows]
+            plan = self._plan(stats)
+            lines = [indent + 'filter ' + ', '.join(_describe(stencilProp, self.stencil[stencilProp]) for stencilProp in self.stencil) + rows]
+            for k in range(len(plan)):
+                step = 'look up ' if k == 0 else 'check matches for '
+                lines.append(indent + '  ' + str(k + 1) + '. ' + step + _describe(plan[k], self.stencil[plan[k]]) + ' (est. ' + str(_estimate(stats, plan[k], self.stencil[plan[k]])) + ' rows)')
+            return lines
+
+        merged = self._mergedRange()
+        if merged != None:
+            return [indent + 'look up ' + _describe(merged[0], _Bounds(merged[1], merged[2])) + rows]
+        (left, right) = self.filters
+        lines = [indent + self.operation + rows]
+        lines += left._explain(stats, indent + '  ')
+        if self.operation != 'or':
+            lines.append(indent + '  (right side skipped if the left side is empty, left matches checked one by one if there are fewer than ' + str(right.estimate(stats)) + ')')
+        lines += right._explain(stats, indent + '  ')
+        return lines
+
+    def key(self):
+        """Returns a hashable description of this filter: filters with the same key give the same results (raises TypeError if a stencil value can't be hashed)"""
+        if self.isLeaf:
+            if self.stencil == None:
+                return None
+            key = ('leaf',) + tuple((stencilProp, _stencilKey(self.stencil[stencilProp])) for stencilProp in self.stencil)
+            hash(key)
+            return key
+        (left, right) = self.filters
+        return (self.operation, left.key(), right.key())
+
+    def properties(self):
+        """Returns the set of property names this filter looks at"""
+        if self.isLeaf:
+            if self.stencil == None:
+                return set()
+            return set(self.stencil)
+        (left, right) = self.filters
+        return left.properties() | right.properties()
+
     def __mul__(self, other):
         """Multiplies this filter with the other, returning a new filter that's recursively defined"""
         ret = Filter(None)
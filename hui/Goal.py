@@ -12,6 +12,62 @@ class Goal(object):
     def genConstraintsAndRewards(self, dataBox):
         return ([], []) # (constraints, rewards)
 
+    def genMatrixConstraintsAndRewards(self, dataBox, model):
+        """Same as genConstraintsAndRewards, but adds rows and rewards directly to a MatrixModel
+        :return: True, or None if the goal couldn't be interpreted
+        """
+        return True
+
+    def genSearchTerms(self, dataBox, model):
+        """Adds terms that score this goal to a SearchModel (see LocalSearch.py)
+        :return: True, or None if the goal couldn't be interpreted or is unknown
+        """
+        return None
+
+    def groupProperties(self):
+        """Returns the group info properties this goal looks at (besides size and minsize), or None if unknown
+        Groups that agree on all of these are interchangeable as far as this goal is concerned
+        """
+        return None
+
+    def splitInfo(self, dataBox):
+        """Describes how this goal ties students and groups together, so that independent parts of the problem can be solved separately
+        :return: (allowed, together) where allowed[sid] is the set of gids student sid must be placed in and together is a list of lists of sids that must be solved together.
+        None if this goal ties the whole problem together (e.g. it has a netReward) or is unknown
+        """
+        return None
+
+    def requirements(self, dataBox):
+        """Describes what this goal forces on single students, so that a starting assignment can respect it
+        :return: (allowed, together) as in splitInfo, covering only what a required goal forces
+        """
+        return ({}, [])
+
+    def enforcedByAllowedGroups(self):
+        """True if this goal only rules out student/group pairs (see requirements), so a model that has no variables for those pairs needs nothing else from it (see Sparse.py)"""
+        return False
+
+    def evaluate(self, dataBox, groupOf):
+        """Checks an assignment the same way the model would
+        :param groupOf: {sid: gid} for every student
+        :return: (met, reward) where met is False if a required goal isn't satisfied, or None if the goal couldn't be interpreted or is unknown
+        """
+        return None
+
+def _filterProperties(filter):
+    """Property names a filter looks at (a filter of None looks at nothing)"""
+    if filter == None:
+        return set()
+    return filter.properties()
+
+def _countByGroup(students, groupOf):
+    """gid ==> number of the given students placed in that group"""
+    counts = {}
+    for student in students:
+        gid = groupOf[student.id]
+        counts[gid] = counts.get(gid, 0) + 1
+    return counts
+
 ##### Goal Classes #####
 # For a given studentFilter and groupFilter, goal is to put all students into one of the groups (students and groups defined by filter)
 
@@ -31,6 +87,39 @@ class GroupFilterGoal(Goal):
         self.studentFilter = studentFilter
         self.groupFilter = groupFilter
 
+    def groupProperties(self):
+        return _filterProperties(self.groupFilter)
+
+    def splitInfo(self, dataBox):
+        if self.netReward != 0:
+            return None
+        return self.requirements(dataBox)
+
+    def requirements(self, dataBox):
+        allowed = {}
+        if self.required:
+            gids = set(group.id for group in dataBox.filterGroups(self.groupFilter))
+            for student in dataBox.filterStudents(self.studentFilter):
+                allowed[student.id] = gids
+        return (allowed, [])
+
+    def enforcedByAllowedGroups(self):
+        return self.required and self.netReward == 0 and self.partialReward == 0
+
+    def evaluate(self, dataBox, groupOf):
+        students = dataBox.filterStudents(self.studentFilter)
+        if len(students) == 0:
+            return (True, 0)
+        gids = set(group.id for group in dataBox.filterGroups(self.groupFilter))
+        if len(gids) == 0:
+            return None
+
+        numSat = len([student for student in students if groupOf[student.id] in gids])
+        reward = numSat * self.partialReward
+        if numSat == len(students):
+            reward += self.netReward
+        return (not self.required or numSat == len(students), reward)
+
     def genConstraintsAndRewards(self, dataBox):
         constraints = []
         rewards = []
@@ -40,7 +129,7 @@ class GroupFilterGoal(Goal):
 
         if len(students) > 0:
             if len(groups) == 0:
-                print "Could not find groups that match filter: " + str(groupFilter) + ". Impossible to create groups."
+                print "Could not find groups that match filter: " + str(self.groupFilter) + ". Impossible to create groups."
                 return None
 
             allSatVars = []
@@ -49,7 +138,7 @@ class GroupFilterGoal(Goal):
                 for group in groups:
                     variables.append(student.getVar(group.id))
                 # Create variable v which is 1 only if student is in one of the groups
-                (c,v) = lph._boolFromLowerBound(sum(variables), 1)
+                (c,v) = lph._boolFromLowerBound(sum(variables), 1, upBound=1)
                 constraints += c
                 # Save this variable
                 allSatVars.append(v)
@@ -75,6 +164,49 @@ class GroupFilterGoal(Goal):
 
         return (constraints, rewards)
 
+    def genMatrixConstraintsAndRewards(self, dataBox, model):
+        students = dataBox.filterStudents(self.studentFilter)
+        groups = dataBox.filterGroups(self.groupFilter)
+
+        if len(students) > 0:
+            if len(groups) == 0:
+                print "Could not find groups that match filter: " + str(self.groupFilter) + ". Impossible to create groups."
+                return None
+
+            allSatVars = []
+            for student in students:
+                variables = [model.getVar(student.id, group.id) for group in groups]
+                # Create variable v which is 1 only if student is in one of the groups
+                v = model.boolFromLowerBound(variables, 1, upBound=1)
+                allSatVars.append(v)
+
+                # If this is required, add constraint
+                if self.required:
+                    model.requireTrue(v)
+
+                # Add partial reward
+                model.addReward(v, self.partialReward)
+
+            # Create variable satistifed which is 1 only if all required students are in appropriate groups
+            satisfied = model.boolFromLowerBound(allSatVars, len(students))
+            model.addReward(satisfied, self.netReward)
+
+        return True
+
+    def genSearchTerms(self, dataBox, model):
+        students = dataBox.filterStudents(self.studentFilter)
+        groups = dataBox.filterGroups(self.groupFilter)
+
+        if len(students) > 0:
+            if len(groups) == 0:
+                print "Could not find groups that match filter: " + str(self.groupFilter) + ". Impossible to create groups."
+                return None
+
+            gids = [group.id for group in groups]
+            model.addStudentTerm(dict((student.id, gids) for student in students), len(students), self.required, self.partialReward, self.netReward)
+
+        return True
+
 # For a groupFilter, propertyName, and minSimilar, goal is for all groups to have at least minSimilar students that share the same value for propertyName. All groups means those groups matching the groupFilter
 class MinSimilarGoal(Goal):
     """Goal is to get at least minSimilar similar people into each relevant group (exception: empty groups also satisfy this goal)
@@ -95,34 +227,64 @@ class MinSimilarGoal(Goal):
         self.propertyName = propertyName
         self.minSimilar = minSimilar
 
+    def _getCutoff(self, groupSize):
+        """Get self.minSimilar for specific group size (None means no restriction)"""
+        PLACEHOLDER = -1
+        ret = PLACEHOLDER
+
+        if self.minSimilar != PLACEHOLDER:
+            # Look for value for this group size
+
+            # If self.minSimilar is dictionary, look up group size
+            if type(self.minSimilar) is dict:
+                if groupSize in self.minSimilar:
+                    ret = self.minSimilar[groupSize]
+                else:
+                    # group size not in dictionary
+                    return None # caller should interpret this as "no restriction
+            # If self.minSimilar is same for all groups (not dict), just return that
+            else:
+                ret = self.minSimilar
+        if ret == PLACEHOLDER:
+            return groupSize
+        else:
+            return ret
+
+    def groupProperties(self):
+        return _filterProperties(self.groupFilter)
+
+    def splitInfo(self, dataBox):
+        # Groups are checked one at a time
+        if self.netReward != 0:
+            return None
+        return ({}, [])
+
+    def evaluate(self, dataBox, groupOf):
+        clickCounts = [_countByGroup(click, groupOf) for click in dataBox.getStudentsWhoShareProperty(self.propertyName)]
+        groupsOfInterest = dataBox.filterGroups(self.groupFilter)
+        inUse = set(groupOf.values())
+
+        numSat = 0
+        reward = 0
+        for group in groupsOfInterest:
+            groupMin = self._getCutoff(group.size)
+            if groupMin == None or groupMin == 0:
+                continue
+            # Also satisfied if nobody is in the group
+            if not group.id in inUse or any(counts.get(group.id, 0) >= groupMin for counts in clickCounts):
+                numSat += 1
+                reward += self.partialReward
+
+        # Like the model, groups without a restriction count against the net reward
+        satisfied = numSat >= len(groupsOfInterest)
+        if satisfied:
+            reward += self.netReward
+        return (not self.required or satisfied, reward)
+
     def genConstraintsAndRewards(self, dataBox):
         constraints = []
         rewards = []
 
-        PLACEHOLDER = -1
-        
-        # Function to get self.minSimilar for specific group size
-        def _getCutoff(groupSize):
-            ret = PLACEHOLDER
-            
-            if self.minSimilar != PLACEHOLDER:
-                # Look for value for this group size
-                
-                # If self.minSimilar is dictionary, look up group size
-                if type(self.minSimilar) is dict:
-                    if groupSize in self.minSimilar:
-                        ret = self.minSimilar[groupSize]
-                    else:
-                        # group size not in dictionary
-                        return None # caller should interpret this as "no restriction
-                # If self.minSimilar is same for all groups (not dict), just return that
-                else:
-                    ret = self.minSimilar
-            if ret == PLACEHOLDER:
-                return groupSize
-            else:
-                return ret
-        
         # Grab clicks (groups of students that are similar based on propertyname)
         clicks = dataBox.getStudentsWhoShareProperty(self.propertyName)
         
@@ -131,7 +293,7 @@ class MinSimilarGoal(Goal):
 
         satVariables = []
         for group in groupsOfInterest:
-            groupMin = _getCutoff(group.size)
+            groupMin = self._getCutoff(group.size)
             if groupMin == None:
                 # No restriction, don't continue, don't add constraints
                 continue
@@ -149,7 +311,7 @@ class MinSimilarGoal(Goal):
                     var = student.getVar(group.id)
                     variables.append(var)
                 # Create variable v thats 1 only if click satisfies goal
-                (c,v) = lph._boolFromLowerBound(sum(variables), groupMin)
+                (c,v) = lph._boolFromLowerBound(sum(variables), groupMin, upBound=group.size)
                 constraints += c
                 groupVariables.append(v)
 
@@ -183,6 +345,70 @@ class MinSimilarGoal(Goal):
 
         return (constraints, rewards)
 
+    def genMatrixConstraintsAndRewards(self, dataBox, model):
+        # Grab clicks (groups of students that are similar based on propertyname)
+        clicks = dataBox.getStudentsWhoShareProperty(self.propertyName)
+
+        # Filter groups
+        groupsOfInterest = dataBox.filterGroups(self.groupFilter)
+
+        satVariables = []
+        for group in groupsOfInterest:
+            groupMin = self._getCutoff(group.size)
+            if groupMin == None:
+                # No restriction, don't continue, don't add constraints
+                continue
+
+            if groupMin == 0:
+                print "Cannot apply min similarity constraint when minimum similar is " + str(groupMin) + ". Constraint on property " + self.propertyName
+                continue
+
+            groupVariables = []
+            for click in clicks:
+                # Create variable v thats 1 only if click satisfies goal
+                variables = [model.getVar(student.id, group.id) for student in click]
+                groupVariables.append(model.boolFromLowerBound(variables, groupMin, upBound=group.size))
+
+            # Get sat variable
+            v = model.boolFromLowerBound(groupVariables, 1)
+            # Also satisfied if nobody is in the group
+            vsat = model.boolOr(v, model.getNotInUseVar(group.id))
+            satVariables.append(vsat)
+
+            # Add partial reward
+            model.addReward(vsat, self.partialReward)
+
+        # Create variable satisfied thats 1 only if at least one sat var is true
+        satisfied = model.boolFromLowerBound(satVariables, len(groupsOfInterest))
+
+        # Add constraint if required
+        if self.required:
+            model.requireTrue(satisfied)
+
+        # Add reward
+        model.addReward(satisfied, self.netReward)
+
+        return True
+
+    def genSearchTerms(self, dataBox, model):
+        clicks = dataBox.getStudentsWhoShareProperty(self.propertyName)
+        groupsOfInterest = dataBox.filterGroups(self.groupFilter)
+
+        cutoffs = {}
+        for group in groupsOfInterest:
+            groupMin = self._getCutoff(group.size)
+            if groupMin == None:
+                # No restriction
+                continue
+
+            if groupMin == 0:
+                print "Cannot apply min similarity constraint when minimum similar is " + str(groupMin) + ". Constraint on property " + self.propertyName
+                continue
+            cutoffs[group.id] = groupMin
+        model.addMinSimilarTerm(clicks, cutoffs, len(groupsOfInterest), self.required, self.partialReward, self.netReward)
+
+        return True
+
 # For a groupFilter, propertyName, and maxSimilar, goal is for all groups to have at most maxSimilar students that share the same value for propertyName. All groups means those groups matching the groupFilter
 class MaxSimilarGoal(Goal):
     # Partial reward:
@@ -210,36 +436,65 @@ class MaxSimilarGoal(Goal):
         self.propertyName = propertyName
         self.maxSimilar = maxSimilar
 
+    def _getCutoff(self, groupSize):
+        """Get self.maxSimilar for specific group size (None means no restriction)"""
+        PLACEHOLDER = -1
+        ret = PLACEHOLDER
+
+        if self.maxSimilar != PLACEHOLDER:
+            # Look for value for this group size
+
+            # If self.maxSimilar is dictionary, look up group size
+            if type(self.maxSimilar) is dict:
+                if groupSize in self.maxSimilar:
+                    ret = self.maxSimilar[groupSize]
+                else:
+                    # group size not in dictionary
+                    return None # caller should interpret this as "no restriction
+            # If self.maxSimilar is same for all groups (not dict), just return that
+            else:
+                ret = self.maxSimilar
+
+        if ret == PLACEHOLDER:
+            # Replace placeholder with 1 (nobody should be similar)
+            return 1
+        else:
+            return ret
+
+    def groupProperties(self):
+        return _filterProperties(self.groupFilter)
+
+    def splitInfo(self, dataBox):
+        # Groups are checked one at a time
+        if self.netReward != 0:
+            return None
+        return ({}, [])
+
+    def evaluate(self, dataBox, groupOf):
+        clickCounts = [_countByGroup(click, groupOf) for click in dataBox.getStudentsWhoShareProperty(self.propertyName)]
+        groupsOfInterest = dataBox.filterGroups(self.groupFilter)
+
+        satisfied = True
+        reward = 0
+        for group in groupsOfInterest:
+            groupMax = self._getCutoff(group.size)
+            if groupMax == None:
+                continue
+            if group.size != None and (groupMax > group.size or groupMax == 0):
+                continue
+            if any(counts.get(group.id, 0) >= groupMax + 1 for counts in clickCounts):
+                satisfied = False
+            else:
+                reward += self.partialReward
+
+        if satisfied:
+            reward += self.netReward
+        return (not self.required or satisfied, reward)
+
     def genConstraintsAndRewards(self, dataBox):
         constraints = []
         rewards = []
 
-        PLACEHOLDER = -1
-        
-        # Function to get self.maxSimilar for sepecific group size
-        def _getCutoff(groupSize):
-            ret = PLACEHOLDER
-            
-            if self.maxSimilar != PLACEHOLDER:
-                # Look for value for this group size
-                
-                # If self.maxSimilar is dictionary, look up group size
-                if type(self.maxSimilar) is dict:
-                    if groupSize in self.maxSimilar:
-                        ret = self.maxSimilar[groupSize]
-                    else:
-                        # group size not in dictionary
-                        return None # caller should interpret this as "no restriction
-                # If self.maxSimilar is same for all groups (not dict), just return that
-                else:
-                    ret = self.maxSimilar
-                    
-            if ret == PLACEHOLDER:
-                # Replace placeholder with 1 (nobody should be similar)
-                return 1
-            else:
-                return ret
-        
         # Grab clicks (groups of students that are similar based on propertyname)
         clicks = dataBox.getStudentsWhoShareProperty(self.propertyName)
         
@@ -250,7 +505,7 @@ class MaxSimilarGoal(Goal):
         violateVariables = []
         for group in groupsOfInterest:
             
-            groupMax = _getCutoff(group.size)
+            groupMax = self._getCutoff(group.size)
             if groupMax == None:
                 # No restriction, don't continue, don't add constraints
                 continue
@@ -269,7 +524,7 @@ class MaxSimilarGoal(Goal):
                     variables.append(var)
 
                 # Create variable v thats 1 only if click violates goal
-                (c,v) = lph._boolFromLowerBound(sum(variables), groupMax + 1)
+                (c,v) = lph._boolFromLowerBound(sum(variables), groupMax + 1, upBound=group.size)
                 constraints += c
                 violateVariables.append(v)
                 groupViolateVars.append(v)
@@ -298,6 +553,67 @@ class MaxSimilarGoal(Goal):
 
         return (constraints, rewards)
 
+    def genMatrixConstraintsAndRewards(self, dataBox, model):
+        # Grab clicks (groups of students that are similar based on propertyname)
+        clicks = dataBox.getStudentsWhoShareProperty(self.propertyName)
+
+        # Filter groups
+        groupsOfInterest = dataBox.filterGroups(self.groupFilter)
+
+        violateVariables = []
+        for group in groupsOfInterest:
+            groupMax = self._getCutoff(group.size)
+            if groupMax == None:
+                # No restriction, don't continue, don't add constraints
+                continue
+
+            if group.size != None and (groupMax > group.size or groupMax == 0):
+                print "Cannot apply max similarity constraint when maximum similar is " + str(groupMax) + ". Constraint on property " + self.propertyName
+                continue
+
+            groupViolateVars = []
+            for click in clicks:
+                # Create variable v thats 1 only if click violates goal
+                variables = [model.getVar(student.id, group.id) for student in click]
+                v = model.boolFromLowerBound(variables, groupMax + 1, upBound=group.size)
+                violateVariables.append(v)
+                groupViolateVars.append(v)
+
+            # Add partial reward only if none of this group violate
+            v = model.boolFromUpperBound(groupViolateVars, 0)
+            model.addReward(v, self.partialReward)
+
+        # Create variable satisfied thats 1 only if none of the violateVariables is true
+        satisfied = model.boolFromUpperBound(violateVariables, 0)
+
+        # Add constraint if required
+        if self.required:
+            model.requireTrue(satisfied)
+
+        # Add reward
+        model.addReward(satisfied, self.netReward)
+
+        return True
+
+    def genSearchTerms(self, dataBox, model):
+        clicks = dataBox.getStudentsWhoShareProperty(self.propertyName)
+        groupsOfInterest = dataBox.filterGroups(self.groupFilter)
+
+        cutoffs = {}
+        for group in groupsOfInterest:
+            groupMax = self._getCutoff(group.size)
+            if groupMax == None:
+                # No restriction
+                continue
+
+            if group.size != None and (groupMax > group.size or groupMax == 0):
+                print "Cannot apply max similarity constraint when maximum similar is " + str(groupMax) + ". Constraint on property " + self.propertyName
+                continue
+            cutoffs[group.id] = groupMax
+        model.addMaxSimilarTerm(clicks, cutoffs, self.required, self.partialReward, self.netReward)
+
+        return True
+
 # For a groupFilter, groupProperty, studentFilter, and studentProperty, goal is for all students to be assigned to groups where student[studentProperty] = group[groupProperty]
 class MustMatchGoal(Goal):
     """Goal where all relevant students must be placed in a relevant group where student[studentProperty] == group[groupProperty]
@@ -322,25 +638,76 @@ class MustMatchGoal(Goal):
         self.studentFilter = studentFilter
         self.studentProperty = studentProperty
 
+    def _isMatch(self, student, group):
+        """True if student[studentProperty] matches group[groupProperty] (wildcards match anything)"""
+        if not self.groupProperty in group.info:
+            return False
+
+        paramsMatch = (group.info[self.groupProperty] == student.info[self.studentProperty])
+        wildcardIncluded = (group.info[self.groupProperty] == Utils.WILDCARD or student.info[self.studentProperty] == Utils.WILDCARD)
+        return paramsMatch or wildcardIncluded
+
+    def groupProperties(self):
+        return _filterProperties(self.groupFilter) | set([self.groupProperty])
+
+    def splitInfo(self, dataBox):
+        if self.netReward != 0:
+            return None
+        return self.requirements(dataBox)
+
+    def requirements(self, dataBox):
+        allowed = {}
+        if self.required:
+            groups = dataBox.filterGroups(self.groupFilter)
+            for student in dataBox.filterStudents(self.studentFilter):
+                if not self.studentProperty in student.info:
+                    continue
+                gids = set(group.id for group in groups if self._isMatch(student, group))
+                # Students without a matching group aren't affected by this goal
+                if len(gids) > 0:
+                    allowed[student.id] = gids
+        return (allowed, [])
+
+    def enforcedByAllowedGroups(self):
+        return self.required and self.netReward == 0 and self.partialReward == 0
+
+    def evaluate(self, dataBox, groupOf):
+        students = dataBox.filterStudents(self.studentFilter)
+        groups = dataBox.filterGroups(self.groupFilter)
+
+        met = True
+        numSat = 0
+        for student in students:
+            if not self.studentProperty in student.info:
+                continue
+            gids = set(group.id for group in groups if self._isMatch(student, group))
+            if len(gids) == 0:
+                continue
+            if groupOf[student.id] in gids:
+                numSat += 1
+            elif self.required:
+                met = False
+
+        reward = numSat * self.partialReward
+        # Like the model, students without a matching group count against the net reward
+        if numSat >= len(students):
+            reward += self.netReward
+        return (met, reward)
+
     def genConstraintsAndRewards(self, dataBox):
         constraints = []
         rewards = []
 
         allSatVars = []
         students = dataBox.filterStudents(self.studentFilter)
+        groups = dataBox.filterGroups(self.groupFilter)
         for student in students:
             if not self.studentProperty in student.info:
                 continue
             groupVariables = []
-            groups = dataBox.filterGroups(self.groupFilter)
             for group in groups:
-                if not self.groupProperty in group.info:
-                    continue
-
                 # Skip if they don't match
-                paramsMatch = (group.info[self.groupProperty] == student.info[self.studentProperty])
-                wildcardIncluded = (group.info[self.groupProperty] == Utils.WILDCARD or student.info[self.studentProperty] == Utils.WILDCARD)
-                if not paramsMatch and not wildcardIncluded:
+                if not self._isMatch(student, group):
                     continue
 
                 # Yes, this is a match
@@ -350,7 +717,7 @@ class MustMatchGoal(Goal):
                 continue
 
             # Create variable v thats true if this student satisfied match goal
-            (c,v) = lph._boolFromLowerBound(sum(groupVariables), 1)
+            (c,v) = lph._boolFromLowerBound(sum(groupVariables), 1, upBound=1)
             constraints += c
             # Keep track of sat vars
             allSatVars.append(v)
@@ -375,6 +742,50 @@ class MustMatchGoal(Goal):
 
         return (constraints, rewards)
 
+    def genMatrixConstraintsAndRewards(self, dataBox, model):
+        allSatVars = []
+        students = dataBox.filterStudents(self.studentFilter)
+        groups = dataBox.filterGroups(self.groupFilter)
+        for student in students:
+            if not self.studentProperty in student.info:
+                continue
+            groupVariables = [model.getVar(student.id, group.id) for group in groups if self._isMatch(student, group)]
+            if len(groupVariables) == 0:
+                continue
+
+            # Create variable v thats true if this student satisfied match goal
+            v = model.boolFromLowerBound(groupVariables, 1, upBound=1)
+            allSatVars.append(v)
+
+            # Add constraint if required
+            if self.required:
+                model.requireTrue(v)
+
+            # Add partial reward
+            model.addReward(v, self.partialReward)
+
+        # Create variable satisfied which is 1 only if all students satisfy the goal
+        satisfied = model.boolFromLowerBound(allSatVars, len(students))
+        model.addReward(satisfied, self.netReward)
+
+        return True
+
+    def genSearchTerms(self, dataBox, model):
+        students = dataBox.filterStudents(self.studentFilter)
+        groups = dataBox.filterGroups(self.groupFilter)
+
+        # Students without a matching group aren't checked, but still count against the net reward
+        allowed = {}
+        for student in students:
+            if not self.studentProperty in student.info:
+                continue
+            gids = [group.id for group in groups if self._isMatch(student, group)]
+            if len(gids) > 0:
+                allowed[student.id] = gids
+        model.addStudentTerm(allowed, len(students), self.required, self.partialReward, self.netReward)
+
+        return True
+
 class PodGoal(Goal):
     """Goal where each "pod" of students must be in a group together
     :param studentFilter: a filter that gives a list of students to be together in a group
@@ -397,6 +808,38 @@ class PodGoal(Goal):
         else:
             self.studentFilters = [studentFilter]
 
+    def groupProperties(self):
+        # Pods can go in any group
+        return set()
+
+    def splitInfo(self, dataBox):
+        # A part without a pod's students would count that pod as together, so rewards can't be split
+        if self.netReward != 0 or self.partialReward != 0:
+            return None
+        together = [[student.id for student in dataBox.filterStudents(studentFilter)] for studentFilter in self.studentFilters]
+        return ({}, together)
+
+    def requirements(self, dataBox):
+        if not self.required:
+            return ({}, [])
+        together = [[student.id for student in dataBox.filterStudents(studentFilter)] for studentFilter in self.studentFilters]
+        return ({}, together)
+
+    def evaluate(self, dataBox, groupOf):
+        hasGroups = len(dataBox.getGroups()) > 0
+
+        numSat = 0
+        for studentFilter in self.studentFilters:
+            gids = set(groupOf[student.id] for student in dataBox.filterStudents(studentFilter))
+            if hasGroups and len(gids) <= 1:
+                numSat += 1
+
+        satisfied = numSat == len(self.studentFilters)
+        reward = numSat * self.partialReward
+        if satisfied:
+            reward += self.netReward
+        return (not self.required or satisfied, reward)
+
     def genConstraintsAndRewards(self, dataBox):
         constraints = []
         rewards = []
@@ -413,7 +856,7 @@ class PodGoal(Goal):
                 for student in students:
                     groupVariables.append(student.getVar(group.id))
                 # Create variable v that is 1 only if the group of students are in this group
-                (c,v) = lph._boolFromLowerBound(sum(groupVariables), len(students))
+                (c,v) = lph._boolFromLowerBound(sum(groupVariables), len(students), upBound=group.size)
                 constraints += c
                 groupSatVariables.append(v)
             # groupSatVariables is a list of booleans: if one is true, the students are in the same group
@@ -439,4 +882,106 @@ class PodGoal(Goal):
         constraints += c
         rewards.append(vreward)
 
-        return (constraints, rewards)
\ No newline at end of file
+        return (constraints, rewards)
+
+    def genMatrixConstraintsAndRewards(self, dataBox, model):
+        groups = dataBox.getGroups()
+
+        allSatVars = []
+        for studentFilter in self.studentFilters:
+            students = dataBox.filterStudents(studentFilter)
+
+            groupSatVariables = []
+            for group in groups:
+                # Create variable v that is 1 only if the group of students are in this group
+                variables = [model.getVar(student.id, group.id) for student in students]
+                groupSatVariables.append(model.boolFromLowerBound(variables, len(students), upBound=group.size))
+            # groupSatVariables is a list of booleans: if one is true, the students are in the same group
+            v = model.boolFromLowerBound(groupSatVariables, 1)
+            allSatVars.append(v)
+
+            # Partial reward
+            model.addReward(v, self.partialReward)
+
+        # Create variable that's 1 only if all selections of students are grouped together
+        satisfied = model.boolFromLowerBound(allSatVars, len(self.studentFilters))
+
+        # Add constraint if required
+        if self.required:
+            model.requireTrue(satisfied)
+
+        # Add net reward
+        model.addReward(satisfied, self.netReward)
+
+        return True
+
+    def genSearchTerms(self, dataBox, model):
+        pods = [dataBox.filterStudents(studentFilter) for studentFilter in self.studentFilters]
+        model.addPodTerm(pods, self.required, self.partialReward, self.netReward)
+
+        return True
+
+# For a mapping of students to groups, goal is to keep the students in those groups (used to re-solve after the roster changed, see GroupCreator.updateGroups)
+class KeepGroupsGoal(Goal):
+    """Goal is to keep students in the groups they were placed in before.
+    :param groupOf: {sid: gid} of the students that should stay, and their groups
+    :param required: if true, these students can't be moved
+    :param partialReward: amount to be awarded for each student that stays in its group
+    """
+    def __init__(self, groupOf, required=True, partialReward=0):
+        Goal.__init__(self, required, 0, partialReward)
+
+        self.groupOf = groupOf
+
+    def _kept(self, dataBox):
+        """[(student, gid)] of the students of dataBox that should stay in one of its groups"""
+        gids = set(group.id for group in dataBox.getGroups())
+        return [(student, self.groupOf[student.id]) for student in dataBox.getStudents() if self.groupOf.get(student.id) in gids]
+
+    def splitInfo(self, dataBox):
+        return self.requirements(dataBox)
+
+    def requirements(self, dataBox):
+        allowed = {}
+        if self.required:
+            for (student, gid) in self._kept(dataBox):
+                allowed[student.id] = set([gid])
+        return (allowed, [])
+
+    def enforcedByAllowedGroups(self):
+        return self.required and self.partialReward == 0
+
+    def evaluate(self, dataBox, groupOf):
+        kept = self._kept(dataBox)
+        numSat = len([student for (student, gid) in kept if groupOf[student.id] == gid])
+        return (not self.required or numSat == len(kept), numSat * self.partialReward)
+
+    def genConstraintsAndRewards(self, dataBox):
+        constraints = []
+        rewards = []
+
+        for (student, gid) in self._kept(dataBox):
+            variable = pulp.lpSum([student.getVar(gid)])
+            if self.required:
+                constraints.append(lph._requireTrue(variable))
+            if self.partialReward != 0:
+                (c,v) = lph._createRewardVar(variable, self.partialReward)
+                constraints += c
+                rewards.append(v)
+
+        return (constraints, rewards)
+
+    def genMatrixConstraintsAndRewards(self, dataBox, model):
+        for (student, gid) in self._kept(dataBox):
+            col = model.getVar(student.id, gid)
+            if self.required:
+                model.requireTrue(col)
+            model.addReward(col, self.partialReward)
+
+        return True
+
+    def genSearchTerms(self, dataBox, model):
+        kept = self._kept(dataBox)
+        model.addStudentTerm(dict((student.id, [gid]) for (student, gid) in kept), len(kept), self.required, self.partialReward, 0)
+
+        return True
@@ -0,0 +1,158 @@
+# GREEDY START
+# Builds a starting assignment quickly, without a solver, that the MIP solver can start from (and that is used if the solver runs out of time).
+# Students that required pods keep together are placed as one unit. Units with the fewest allowed groups (required GroupFilterGoals and MustMatchGoals) are placed first,
+# each into an allowed group with room, filling groups that are below their minsize first and otherwise the emptiest group.
+# When re-solving (see GroupCreator.updateGroups), units are first put back into the group they were in, where it's still allowed and has room.
+
+def greedyAssignment(dataBox, goals, previous=None):
+    """Places every student in a group, respecting size, minsize and what the required goals force on single students
+    :param dataBox: the DataBox holding the problem
+    :param goals: the goals of one goal group
+    :param previous: {sid: gid} of the groups students were in before, or None
+    :return: {sid: gid}, or None if the heuristic couldn't place everyone
+    """
+    groups = dataBox.getGroups()
+    (studentUnits, unitAllowed) = units(dataBox, goals)
+    preferred = None
+    if previous != None:
+        # A unit goes back to its group if all of its students were in it
+        preferred = []
+        for unit in studentUnits:
+            gids = set(previous.get(sid) for sid in unit)
+            preferred.append(gids.pop() if len(gids) == 1 else None)
+    unitGroup = placeUnits(groups, studentUnits, unitAllowed, preferred)
+    if unitGroup == None:
+        return None
+
+    groupOf = {}
+    for k in range(len(studentUnits)):
+        for sid in studentUnits[k]:
+            groupOf[sid] = unitGroup[k]
+
+    members = dict((group.id, 0) for group in groups)
+    for gid in groupOf.values():
+        members[gid] += 1
+    for group in groups:
+        if members[group.id] < (group.minsize or 0):
+            return None
+    return groupOf
+
+def units(dataBox, goals):
+    """Merges students that required goals keep together into units, and works out the groups each unit may be placed in
+    :return: (units, unitAllowed) where units is a list of lists of sids (in the order students are given) and unitAllowed[k] is the set of gids unit k may be placed in (None means any group)
+    """
+    students = dataBox.getStudents()
+
+    # sid ==> gids the student may be placed in (None means any group)
+    allowed = dict((student.id, None) for student in students)
+    together = []
+    for goal in goals:
+        (goalAllowed, goalTogether) = goal.requirements(dataBox)
+        for sid in goalAllowed:
+            if allowed[sid] == None:
+                allowed[sid] = set(goalAllowed[sid])
+            else:
+                allowed[sid] = allowed[sid] & goalAllowed[sid]
+        together += goalTogether
+
+    studentUnits = _units(students, together)
+    unitAllowed = []
+    for unit in studentUnits:
+        gids = None
+        for sid in unit:
+            if allowed[sid] != None:
+                gids = allowed[sid] if gids == None else gids & allowed[sid]
+        unitAllowed.append(gids)
+    return (studentUnits, unitAllowed)
+
+def placeUnits(groups, studentUnits, unitAllowed, preferred=None):
+    """Places each unit into an allowed group with room, then moves units into groups that are below their minsize where it can
+    :param preferred: the gid each unit is put in first if it fits there (None for units with no such group), or None
+    :return: the gid of each unit, or None if a unit couldn't be placed (groups might still be below their minsize)
+    """
+    if len(groups) == 0:
+        return None
+
+    members = dict((group.id, 0) for group in groups)
+    minsize = dict((group.id, group.minsize or 0) for group in groups)
+    unitGroup = [None] * len(studentUnits)
+
+    def fits(k, group):
+        """True if unit k may be moved into group"""
+        return (unitAllowed[k] == None or group.id in unitAllowed[k]) and (group.size == None or members[group.id] + len(studentUnits[k]) <= group.size)
+
+    # Most constrained units first, larger units first among those
+    order = sorted(range(len(studentUnits)), key=lambda k: (len(groups) if unitAllowed[k] == None else len(unitAllowed[k]), -len(studentUnits[k])))
+    if preferred != None:
+        groupById = dict((group.id, group) for group in groups)
+        for k in order:
+            if preferred[k] in groupById and fits(k, groupById[preferred[k]]):
+                unitGroup[k] = preferred[k]
+                members[preferred[k]] += len(studentUnits[k])
+        order = [k for k in order if unitGroup[k] == None]
+    for k in order:
+        options = [group for group in groups if fits(k, group)]
+        if len(options) == 0:
+            return None
+        group = min(options, key=lambda group: (members[group.id] >= minsize[group.id], members[group.id]))
+        unitGroup[k] = group.id
+        members[group.id] += len(studentUnits[k])
+
+    # Fill groups that are still below their minsize with units from groups that can spare them
+    for group in groups:
+        while members[group.id] < minsize[group.id]:
+            spare = [k for k in range(len(studentUnits)) if unitGroup[k] != group.id and members[unitGroup[k]] - len(studentUnits[k]) >= minsize[unitGroup[k]] and fits(k, group)]
+            if len(spare) == 0:
+                break
+            k = min(spare, key=lambda k: len(studentUnits[k]))
+            members[unitGroup[k]] -= len(studentUnits[k])
+            members[group.id] += len(studentUnits[k])
+            unitGroup[k] = group.id
+    return unitGroup
+
+def evaluate(dataBox, goals, groupOf):
+    """Checks an assignment against the group sizes and every goal
+    :param groupOf: {sid: gid} for every student
+    :return: the total reward, or None if the assignment breaks a constraint or a goal couldn't be checked
+    """
+    members = dict((group.id, 0) for group in dataBox.getGroups())
+    for student in dataBox.getStudents():
+        members[groupOf[student.id]] += 1
+    for group in dataBox.getGroups():
+        if (group.size != None and members[group.id] > group.size) or members[group.id] < (group.minsize or 0):
+            return None
+
+    reward = 0
+    for goal in goals:
+        ret = goal.evaluate(dataBox, groupOf)
+        if ret == None:
+            return None
+        (met, goalReward) = ret
+        if not met:
+            return None
+        reward += goalReward
+    return reward
+
+def _units(students, together):
+    """Merges students that must be together into units
+    :return: a list of lists of sids, in the order students are given
+    """
+    parent = dict((student.id, student.id) for student in students)
+    def find(sid):
+        while parent[sid] != sid:
+            parent[sid] = parent[parent[sid]]
+            sid = parent[sid]
+        return sid
+    for sids in together:
+        for k in range(1, len(sids)):
+            parent[find(sids[0])] = find(sids[k])
+
+    studentUnits = {}
+    order = []
+    for student in students:
+        root = find(student.id)
+        if not root in studentUnits:
+            studentUnits[root] = []
+            order.append(root)
+        studentUnits[root].append(student.id)
+    return [studentUnits[root] for root in order]
@@ -5,9 +5,18 @@ class Group:
     """A representation of a single group
     :param id: a unique identifier to be used in the algorithm
     :param info: a python dictionary/object holding information on the group, including info['size'] and info['minsize']
+    :param order: position of the group in this run, which orders the model's columns (see Utils.encodeVarName)
     """
-    def __init__(self, id, info):
+    def __init__(self, id, info, order=0):
         self.id = id
+        self.order = order
+        self.setInfo(info)
+        
+        self.variables = []
+        self.notInUse = None
+
+    def setInfo(self, info):
+        """Sets the info of this group, including its size and minsize"""
         self.info = info
 
         # Extract size from info
@@ -21,9 +30,10 @@ class Group:
             self.minsize = info['minsize']
         else:
             self.minsize = 0
-        
+    
+    def clearVariables(self):
+        """Forgets the variables of students added by an earlier model"""
         self.variables = []
-        self.notInUse = None
     
     def addVar(self, var):
         """Adds a variable to this group (represents a student that could be in this group)"""
@@ -35,14 +45,14 @@ class Group:
         
         # Constrain size of group
         if self.size != None:
-            constraints.append(sum(self.variables) <= self.size)
+            constraints.append(pulp.lpSum(self.variables) <= self.size)
         
         # Impose minimum size of group
         if self.minsize != None and self.minsize != 0:
-            constraints.append(sum(self.variables) >= self.minsize)
+            constraints.append(pulp.lpSum(self.variables) >= self.minsize)
         
         # Add "not in use" variable
-        (c,v) = _boolFromUpperBound(sum(self.variables), 0, name=str(self.id) + 'notinuse')
+        (c,v) = _boolFromUpperBound(pulp.lpSum(self.variables), 0, name=str(self.id) + 'notinuse', upBound=self.size)
         constraints += c
         self.notInUse = v
 
@@ -1,17 +1,58 @@
+import multiprocessing
+import os
+import pickle
+import signal
+import time
+import Queue
 import pulp
-from random import shuffle
+from random import shuffle, Random
 from Group import Group
 from Student import Student
+from Goal import KeepGroupsGoal
 from DataBox import DataBox
+from Solver import Solver
+from Presolve import presolveProblem
+from ModelCache import ModelCache
+from ResultCache import ResultCache
+from Stats import Stats, NO_STATS, mergeParts, pulpVariables
+from Events import Events
+from LocalSearch import SearchModel
+import Symmetry
+import Decompose
+import Greedy
+import Sparse
+import Estimate
 import Utils
 
+# Ways of building the model
+ENGINES = ['pulp', 'matrix', 'search']
+
+# Seconds between checks for worker processes that died
+POLL = 0.5
 
 class GroupCreator(object):
-    def __init__(self, students=None, groups=None, goalGroups=None, determinateSolution=False):
+    def __init__(self, students=None, groups=None, goalGroups=None, determinateSolution=False, engine='pulp', parallelGoalGroups=None, solver=None, presolveModel=True, breakSymmetry=True, decompose=True, warmStart=True, sparseMembership=True, columnarData=False, modelCache=None, resultCache=None, stats=True, modelBudget=None):
         self.students = students
         self.groups = groups
         self.goalGroups = goalGroups
         self.determinateSolution = determinateSolution
+        self.setEngine(engine)
+        self.setParallelGoalGroups(parallelGoalGroups)
+        self.setSolver(solver)
+        self.setPresolveModel(presolveModel)
+        self.setBreakSymmetry(breakSymmetry)
+        self.setDecompose(decompose)
+        self.setWarmStart(warmStart)
+        self.setSparseMembership(sparseMembership)
+        self.setColumnarData(columnarData)
+        self.setModelCache(modelCache)
+        self.setResultCache(resultCache)
+        self.setStats(stats)
+        self.setModelBudget(modelBudget)
+
+        # Kept between calls to createGroups, so only students and groups that changed are indexed again (see _updateDataBox)
+        self.dataBox = None
+        self.events = Events()
 
     def addStudent(self, student):
         if self.students == None:
@@ -45,21 +86,216 @@ class GroupCreator(object):
     def setDeterminateSolution(self, isDeterminate):
         self.determinateSolution = isDeterminate
 
+    def setEngine(self, engine, iterations=None):
+        """Chooses how the model is built: 'pulp' (one PuLP object per variable and constraint), 'matrix' (sparse coefficient arrays handed to CBC in bulk, requires numpy and scipy)
+        or 'search' (no solver: groups are improved move by move, see LocalSearch.py. For rosters too large for the others, but groups might not be optimal)
+        :param iterations: number of moves the search engine tries per goal group. Default: 100 per student
+        """
+        if not engine in ENGINES:
+            raise ValueError('engine must be one of: ' + ', '.join(ENGINES))
+        if iterations != None and iterations < 0:
+            raise ValueError('iterations must not be negative')
+        self.engine = engine
+        self.searchIterations = iterations
+
+    def setParallelGoalGroups(self, numWorkers):
+        """Solves up to numWorkers goal groups at once in worker processes. The lowest goal group that works is still the one returned. None (default) solves goal groups one after another"""
+        if numWorkers != None and numWorkers < 1:
+            raise ValueError('numWorkers must be at least 1')
+        self.parallelGoalGroups = numWorkers
+
+    def setSolver(self, solver):
+        """Sets the solver settings (see Solver.py) used for every goal group. None uses PuLP's default CBC"""
+        if solver == None:
+            solver = Solver()
+        self.solver = solver
+
+    def setPresolveModel(self, presolveModel):
+        """If True (default), each goal group's model is shrunk before it is solved: constraints that always hold or are repeated, and helper variables that nothing depends on, are removed"""
+        self.presolveModel = presolveModel
+
+    def setBreakSymmetry(self, breakSymmetry):
+        """If True (default), groups that no goal can tell apart (same size, minsize and values for the properties the goals look at) are filled in order, so the solver doesn't try every way of swapping them"""
+        self.breakSymmetry = breakSymmetry
+
+    def setDecompose(self, decompose, numWorkers=None):
+        """If True (default), a goal group whose required goals keep students in disjoint sets of groups is split into independent parts that are solved on their own
+        :param numWorkers: number of parts solved at once in worker processes. Default: number of CPUs
+        """
+        if numWorkers != None and numWorkers < 1:
+            raise ValueError('numWorkers must be at least 1')
+        self.decompose = decompose
+        self.decomposeWorkers = numWorkers
+
+    def setWarmStart(self, warmStart):
+        """If True (default), groups are first built quickly by a greedy heuristic (see Greedy.py). The matrix engine hands them to CBC as a starting solution, and if the solver runs out of time they are used whenever they are better than what the solver found"""
+        self.warmStart = warmStart
+
+    def setSparseMembership(self, sparseMembership):
+        """If True (default), students only get membership variables for the groups required GroupFilterGoals and MustMatchGoals allow them in (see Sparse.py), instead of one for every group"""
+        self.sparseMembership = sparseMembership
+
+    def setColumnarData(self, columnarData):
+        """If True, students and groups are stored as arrays (one per property) and filters are evaluated as vectorized masks (see ColumnarDataBox.py), which is faster for large rosters. Requires numpy. Default: False"""
+        self.columnarData = columnarData
+
+    def setModelCache(self, directory):
+        """Stores each model handed to the solver in directory, keyed by a hash of the students, groups and goals it was built from (see ModelCache.py).
+        Solving the same problem again (with determinateSolution, so students and groups keep their order) then skips building the model.
+        Only used with the pulp and matrix engines and the cbc backend. None (default) turns it off
+        """
+        self.modelCache = None
+        if directory != None:
+            self.modelCache = ModelCache(directory)
+
+    def setResultCache(self, resultCache):
+        """Keeps the outputs of createGroups in resultCache (see ResultCache.py), so calling it again with the same students, groups, goal groups and settings gives the stored output without solving.
+        Only used with determinateSolution, since other runs are randomized. Outputs of runs that timed out aren't stored. None (default) turns it off
+        """
+        if resultCache != None and not isinstance(resultCache, ResultCache):
+            raise TypeError('resultCache must be a ResultCache')
+        self.resultCache = resultCache
+
+    def setStats(self, stats):
+        """If True (default), the output has statistics of the run under output['stats'] (see Stats.py): the time and peak memory of each phase,
+        and for each goal group tried its status, the size of its model and the variables, constraints and time each goal added"""
+        self.collectStats = stats
+
+    def setModelBudget(self, budget, skip=False):
+        """Limits the size of the models createGroups builds: each goal group's model size is estimated first (see Estimate.py), and a goal group over the budget is never built.
+        Not used with the search engine, which builds no model. None (default) turns it off
+        :param budget: a dict of limits, any of {'variables': n, 'constraints': n, 'memoryMB': x}
+        :param skip: if False (default), createGroups raises a ValueError before building anything when any goal group is over the budget. If True, goal groups over the budget are skipped like goal groups that were too strict
+        """
+        Estimate.checkBudget(budget)
+        self.modelBudget = budget
+        self.skipOverBudget = skip
+
+    def estimateModelSize(self):
+        """Predicts the size of each goal group's model without building it (see Estimate.py), e.g. to find goal groups that would take too long to build or too much memory
+        :return: a list with, for each goal group, {'goalGroup': i, 'variables': n, 'constraints': n, 'nonzeros': n, 'memoryMB': x, 'goals': [{'goal', 'variables', 'constraints', 'nonzeros'}, ...]}
+        (counts before presolve, memoryMB is None with the search engine), or None for a goal group whose goals couldn't be interpreted
+        """
+        if self.students == None:
+            raise TypeError('students must be included')
+        if self.groups == None:
+            raise TypeError('groups must be included')
+        goalGroups = self.goalGroups
+        if goalGroups is None:
+            goalGroups = [[]]
+        (students, groups, dataBox, changed) = self._updateDataBox(self.students, self.groups)
+        return self._estimateGoalGroups(goalGroups, dataBox, [self._allowedGroups(goals, dataBox) for goals in goalGroups])
+
+    def _estimateGoalGroups(self, goalGroups, dataBox, allowed):
+        """Model size estimates of goal groups (see estimateModelSize)"""
+        estimates = []
+        for i in range(len(goalGroups)):
+            estimate = Estimate.estimateGoalGroup(goalGroups[i], dataBox, self.engine, allowed[i], self.breakSymmetry)
+            if estimate != None:
+                estimate['goalGroup'] = i
+            estimates.append(estimate)
+        return estimates
+
+    def _overBudget(self, goalGroups, dataBox, allowed, labels=None):
+        """The goal groups whose model would go over the budget (see setModelBudget)
+        :param labels: see _solveGoalGroups
+        :return: {goal group index: the limits it goes over}. Raises a ValueError instead unless they are skipped
+        """
+        overBudget = {}
+        for estimate in self._estimateGoalGroups(goalGroups, dataBox, allowed):
+            if estimate == None:
+                continue
+            limits = Estimate.overBudget(estimate, self.modelBudget)
+            if len(limits) == 0:
+                continue
+            if not self.skipOverBudget:
+                raise ValueError(_goalGroupLabel(labels, estimate['goalGroup'])[1] + ' would need about ' + _estimateText(estimate) + ', which is over the model budget ' + str(self.modelBudget) + '.')
+            overBudget[estimate['goalGroup']] = limits
+        return overBudget
+
+    def addListener(self, listener, events=None):
+        """Calls listener(event, details) while groups are created (see Events.py for the events and their details)
+        :param events: names of the events to listen to. Default: all of them
+        """
+        self.events.add(listener, events)
+
+    def removeListener(self, listener):
+        """Stops calling a listener added with addListener"""
+        self.events.remove(listener)
+
     def createGroups(self):
+        if self.resultCache == None or not self.determinateSolution or self.students == None or self.groups == None:
+            return self._runAlgorithm(self.students, self.groups)
+
+        runStats = Stats(self.collectStats)
+        with runStats.timed('resultCache'):
+            key = self.resultCache.key(self.students, self.groups, self.goalGroups, self._resultSettings())
+            output = self.resultCache.get(key, self.students, self.groups)
+        if output != None:
+            output['logs'].append("Groups were taken from the result cache.")
+            # The statistics are of the run that was stored
+            output.pop('stats', None)
+            return _withStats(output, runStats)
         algoResults = self._runAlgorithm(self.students, self.groups)
+        # Runs that stopped on a time limit depend on how fast they ran, not only on the problem
+        if not algoResults['timedOut']:
+            self.resultCache.put(key, algoResults, self.students)
         return algoResults
 
-    def _runAlgorithm(self, students, groups):
+    def createGroupsAsync(self, timeout=None):
+        """Starts createGroups in a worker process and returns right away, with an AsyncRun (see AsyncRun.py) to get the output from later or to cancel the run.
+        Stopping the run kills the worker along with its solver
+        :param timeout: seconds after which the run is stopped. Default: no limit
+        """
+        # Imported here, since AsyncRun uses the worker helpers of this module
+        from AsyncRun import AsyncRun
+        return AsyncRun(self, timeout)
+
+    def _resultSettings(self):
+        """The settings that can change the output of createGroups (see setResultCache)"""
+        return (self.engine, self.searchIterations, self.solver, self.presolveModel, self.breakSymmetry, self.decompose, self.warmStart, self.sparseMembership, self.columnarData, self.modelBudget, self.skipOverBudget)
+
+    def updateGroups(self, previous, addedStudents=None, removedStudents=None, addedGroups=None, removedGroups=None, stayReward=1, keepUnchanged=True):
+        """Puts students into groups again after the roster changed, moving as few of the students placed by previous as possible.
+        Students of groups that didn't change stay where they are. The others (new students, students whose group or info changed, students of groups that lost a student)
+        are placed again, with a reward for each one that stays in its group. If a goal group doesn't work that way, it is tried again with every student placed again
+        with that reward, before the next goal group is tried. The solver starts from the previous groups
+        :param previous: the output of an earlier createGroups or updateGroups call of this group creator
+        :param addedStudents: students added to the problem (students can also be changed in place)
+        :param removedStudents: students taken out of the problem
+        :param addedGroups: groups added to the problem (groups can also be changed in place)
+        :param removedGroups: groups taken out of the problem
+        :param stayReward: reward for each student placed again in the group it was in. It isn't counted in output['reward']
+        :param keepUnchanged: if False, no student is kept in place, all of them are placed again with stayReward
+        :return: same as createGroups, plus output['moved'] = number of students placed by previous that are now in another group
+        """
+        if removedStudents != None:
+            removed = set(id(student) for student in removedStudents)
+            self.students = [student for student in self.students if not id(student) in removed]
+        if removedGroups != None:
+            removed = set(id(group) for group in removedGroups)
+            self.groups = [group for group in self.groups if not id(group) in removed]
+        if addedStudents != None:
+            self.addStudents(addedStudents)
+        if addedGroups != None:
+            self.addEmptyGroups(addedGroups)
+        if self.students == None or self.groups == None or previous['groups'] == None:
+            return self.createGroups()
+        return self._runAlgorithm(self.students, self.groups, previous, stayReward, keepUnchanged)
+
+    def _runAlgorithm(self, students, groups, previous=None, stayReward=0, keepUnchanged=True):
         """Puts students into groups based on sets of goals given to the algorithm.
         :param students: a list of students that will be placed into groups
         :param groups: a list of possible groups that students can be placed into
         :param goalGroups: a list of goal lists. The algorithm attempts to solve based on the first list of goals. If a set of goals cannot be achieved (they must be set to required=True), then the algorithm moves on to the next goal group.
         :param determinateSolution: boolean. If True, a random solution will be chosen from the set of optimal solutions.
+        :param previous: output of an earlier run to stay close to (see updateGroups), or None
         :return: solInfo or None if all goal groups were too strict. solInfo['goalGroup'] = index of goal group used. solInfo['reward'] = total reward given. solInfo['groups'] = {'info': group info, 'students': list of student infos}
         """
 
         # Prepare to collect logs
         logs = []
+        runStats = Stats(self.collectStats)
 
         goalGroups = self.goalGroups
         if goalGroups is None:
@@ -79,110 +315,178 @@ class GroupCreator(object):
         studentInfos = students
         groupInfos = groups
 
-        # Make sure M is large enough
-        if (len(students) > Utils.M or len(groups) > Utils.M):
+        # Set up students, groups and the data box
+        with runStats.timed('dataBox'):
+            (students, groups, dataBox, changed) = self._updateDataBox(studentInfos, groupInfos)
+        sidToStudentInfo = dict((student.id, info) for (student, info) in zip(students, studentInfos))
+        gidToGroupInfo = dict((group.id, info) for (group, info) in zip(groups, [info for info in groupInfos if not _isEmptyGroup(info)]))
+
+        if previous == None:
+            return _withStats(self._solveGoalGroups(goalGroups, students, groups, dataBox, logs, runStats, sidToStudentInfo, gidToGroupInfo), runStats)
+
+        # Re-solving: every student is rewarded for staying in its group. Each goal group is first tried with the students of groups
+        # that didn't change kept where they are, then with every student placed again, before the next goal group is tried
+        (previousGroupOf, fixed) = _previousGroups(previous, students, studentInfos, groups, gidToGroupInfo, changed)
+        stayGoal = KeepGroupsGoal(previousGroupOf, required=False, partialReward=stayReward)
+        tries = []
+        labels = []
+        for i in range(len(goalGroups)):
+            if keepUnchanged and len(fixed) > 0:
+                tries.append(goalGroups[i] + [KeepGroupsGoal(fixed), stayGoal])
+                labels.append((i, "Goal group " + str(i) + " (keeping " + str(len(fixed)) + " of " + str(len(students)) + " students in their groups)"))
+            tries.append(goalGroups[i] + [stayGoal])
+            labels.append((i, "Goal group " + str(i)))
+        output = self._solveGoalGroups(tries, students, groups, dataBox, logs, runStats, sidToStudentInfo, gidToGroupInfo, labels)
+        return _withStats(_withoutStayReward(output, previous, stayReward, previousGroupOf, sidToStudentInfo), runStats)
+
+    def _solveGoalGroups(self, goalGroups, students, groups, dataBox, logs, runStats, sidToStudentInfo, gidToGroupInfo, labels=None):
+        """Solves goal groups in order until one works (see _runAlgorithm)
+        :param runStats: the Stats of the run, which gets the statistics of each goal group tried
+        :param labels: for each goal group, (index of the goal group it was made from, name used in the logs), or None if they are the goal groups of the creator
+        :return: the output dict returned by createGroups
+        """
+        # Goal groups whose required goals rule out student/group pairs get a model with only the allowed pairs
+        allowed = [self._allowedGroups(goals, dataBox) for goals in goalGroups]
+
+        # Make sure M is large enough (the search engine doesn't use it)
+        if self.engine != 'search' and any(Sparse.isTooLarge(students, groups, goalAllowed) for goalAllowed in allowed):
             raise ValueError('You cannot have ' + str(Utils.M) + ' or more students/groups.')
 
+        # Goal groups whose model would be too large are never built
+        overBudget = {}
+        if self.modelBudget != None and self.engine != 'search':
+            with runStats.timed('estimate'):
+                overBudget = self._overBudget(goalGroups, dataBox, allowed, labels)
 
-        # Set up groups
-        groups = []
-        gidToGroupInfo = {}
-        nextGID = 1
-        for group in groupInfos:
-            groupObj = Group(nextGID, group)
-            if groupObj.size != None and groupObj.size == 0:
-                # Skip groups with no room
-                continue
-            groups.append(groupObj)
-            gidToGroupInfo[groupObj.id] = group
-            nextGID += 1
-            
-        # Set up students
-        students = []
-        sidToStudentInfo = {}
-        nextSID = 1
-        for student in studentInfos:
-            studentObj = Student(nextSID, student, groups)
-            students.append(studentObj)
-            sidToStudentInfo[studentObj.id] = student
-            nextSID += 1
-        
-        # Set up data box
-        dataBox = DataBox(students, groups)
+        # Build the student/group part of the model once, each goal group that uses every pair extends a copy of it
+        baseModel = None
+        if any(allowed[i] == None and not i in overBudget for i in range(len(goalGroups))):
+            with runStats.timed('base'):
+                if self.engine == 'pulp':
+                    for group in groups:
+                        group.clearVariables()
+                    for student in students:
+                        student.addVariables(groups)
+                baseModel = self._buildBase(students, groups)
         
         # Run for each set of goals until 'Optimal' is found, or return None    
-        for i in range(len(goalGroups)):
-            goals = goalGroups[i]
-            problem = pulp.LpProblem("Group Membership Problem", pulp.LpMaximize)
-            
-            # Add student constraints
-            failedAddingConstraints = False
-            for student in students:
-                constraints = student.genConstraints()
-                if constraints == None:
-                    failedAddingConstraints = True
-                    break
-                for constraint in constraints:
-                    problem += constraint
-            
-            # Add group constraints
-            for group in groups:
-                constraints = group.genConstraints()
-                if constraints == None:
-                    failedAddingConstraints = True
-                    break
-                for constraint in constraints:
-                    problem += constraint
+        if self.parallelGoalGroups != None and self.parallelGoalGroups > 1:
+            results = self._raceGoalGroups(goalGroups, baseModel, dataBox, allowed, overBudget, labels)
+        else:
+            results = self._solveInOrder(goalGroups, baseModel, dataBox, allowed, overBudget, labels)
+        try:
+            return self._collectResults(results, logs, runStats, groups, sidToStudentInfo, gidToGroupInfo, labels)
+        finally:
+            # Stops workers that are still solving goal groups we no longer need
+            results.close()
 
-            # Add goal constraints
-            rewards = []
-            for goal in goals:
-                ret = goal.genConstraintsAndRewards(dataBox)
-                if ret == None:
-                    failedAddingConstraints = True
-                    break
-                (constraints, theseRewards) = ret
-                # Add constraints to problem
-                for constraint in constraints:
-                    problem += constraint
-                # Accumulate rewards 
-                rewards += theseRewards
-                    
-            if failedAddingConstraints:
-                logs.append("Goal group " + str(i) + " failed because constraints couldn't be interpreted. Trying next goal group...")
+    def _updateDataBox(self, studentInfos, groupInfos):
+        """Brings the data box kept between calls up to date: students and groups added, removed or changed since the last call are indexed again, the others are kept.
+        Students and groups are told apart by their info objects, so changing an info (e.g. student['age'] = 10) updates that student.
+        Ids are kept between calls; each student and group is given its position in this run's (maybe shuffled) order instead, which orders the model's columns
+        :return: (students, groups, dataBox, changed) with students and groups (see Student.py, Group.py) in the order of their infos (groups with no room are left out),
+        and changed = (sids, gids) of the students and groups that were known before and whose info changed
+        """
+        if self.dataBox == None or self.dataBox.isColumnar != self.columnarData:
+            self.dataBox = None
+            self.knownStudents = {}     # id(info) ==> (info, Student)
+            self.knownGroups = {}       # id(info) ==> (info, Group)
+            self.nextSID = 1
+            self.nextGID = 1
+
+        # Infos are copied into the students and groups, so changes can be found by comparing them
+        groups = []
+        changedGroups = []
+        knownGroups = {}
+        for (key, info) in _infoKeys([info for info in groupInfos if not _isEmptyGroup(info)]):
+            (knownInfo, group) = self.knownGroups.get(key, (None, None))
+            if group == None:
+                group = Group(self.nextGID, dict(info))
+                self.nextGID += 1
+            elif group.info != info:
+                changedGroups.append((group, dict(info)))
+            group.order = len(groups)
+            groups.append(group)
+            knownGroups[key] = (info, group)
+
+        students = []
+        changedStudents = []
+        knownStudents = {}
+        for (key, info) in _infoKeys(studentInfos):
+            (knownInfo, student) = self.knownStudents.get(key, (None, None))
+            if student == None:
+                student = Student(self.nextSID, dict(info), groups, createVariables=False)
+                self.nextSID += 1
+            elif student.info != info:
+                changedStudents.append((student, dict(info)))
+            student.order = len(students)
+            students.append(student)
+            knownStudents[key] = (info, student)
+
+        if self.dataBox == None:
+            if self.columnarData:
+                # numpy is only needed by the columnar data box
+                from ColumnarDataBox import ColumnarDataBox
+                self.dataBox = ColumnarDataBox(students, groups)
+            else:
+                self.dataBox = DataBox(students, groups)
+        else:
+            _updateEntries(self.knownGroups, groups, changedGroups, self.dataBox.addGroup, self.dataBox.removeGroup, self.dataBox.updateGroup)
+            _updateEntries(self.knownStudents, students, changedStudents, self.dataBox.addStudent, self.dataBox.removeStudent, self.dataBox.updateStudent)
+        self.knownGroups = knownGroups
+        self.knownStudents = knownStudents
+        changed = (set(student.id for (student, info) in changedStudents), set(group.id for (group, info) in changedGroups))
+        return (students, groups, self.dataBox, changed)
+
+    def _collectResults(self, results, logs, runStats, groups, sidToStudentInfo, gidToGroupInfo, labels=None):
+        """Goes through (goal group index, solve result) pairs in order until one is 'Optimal'
+        :param labels: see _solveGoalGroups
+        :return: the output dict returned by createGroups
+        """
+        anyTimedOut = False
+        for (i, ret) in results:
+            (index, name) = _goalGroupLabel(labels, i)
+            runStats.addGoalGroup(index, ret)
+            if self.events.listening('goalGroupFinished'):
+                self.events.emit('goalGroupFinished', _finishedDetails(index, ret))
+            if ret == None:
+                logs.append(name + " failed because constraints couldn't be interpreted. Trying next goal group...")
+                continue
+            (status, reward, assignment, timedOut, info) = ret
+            anyTimedOut = anyTimedOut or timedOut
+            if 'overBudget' in info:
+                logs.append("> " + name + " would go over the model budget (" + ', '.join(info['overBudget']) + "). Trying next goal group...")
                 continue
+            if 'parts' in info:
+                logs.append(name + " was split into " + str(info['parts']) + " independent parts.")
+            if info.get('modelCache'):
+                logs.append(name + " was solved from the model cache" + (" (" + str(info['modelCache']) + " of " + str(info['parts']) + " parts)." if 'parts' in info else "."))
+            if 'presolve' in info:
+                removed = info['presolve']
+                logs.append(name + ": presolve removed " + str(removed['removedVariables']) + " of " + str(removed['variables']) + " variables and " + str(removed['removedConstraints']) + " of " + str(removed['constraints']) + " constraints.")
 
-            
-            # Objective function
-            problem += sum(rewards), 'reward'
-            
-            # Attempt to solve
-            # print problem
-            problem.solve()
-            
-            solved = pulp.LpStatus[problem.status] == 'Optimal'
-            if solved:
-                logs.append("Goal group " + str(i) + " was successful.")
+            if _foundGroups(ret):
+                logs.append(name + " was successful.")
+                if timedOut and 'search' in info:
+                    logs.append(name + " was solved by local search (" + str(info['search']['moves']) + " moves), so its groups might not be optimal.")
+                elif timedOut:
+                    logs.append(name + " stopped on the time limit, so its groups might not be optimal.")
+                if info.get('warmStartUsed'):
+                    logs.append(name + " used its starting groups, which were better than what the solver found in time.")
                 output = {}
                 output['groups'] = [None for _ in range(len(groups))]
-                output['reward'] = pulp.value(problem.objective)
-                output['goalGroup'] = i
+                indexOfGroup = dict((groups[k].id, k) for k in range(len(groups)))
+                output['reward'] = reward
+                output['goalGroup'] = index
                 output['logs'] = logs
+                output['solver'] = self.solver.backend
+                output['timedOut'] = timedOut
                 #output = [{"students": [students], "group": groupinfo}, ...]
-                for variable in problem.variables():
-                    # print variable.name + ' = ' + str(variable.varValue)
-                    if variable.name == '__dummy':
-                        continue
-                    if variable.varValue == 0:
-                        continue
-                    ret = Utils.decodeVarName(variable.name)
-                    if ret == None:
-                        continue
-                    (sid,gid) = ret
+                for (sid,gid) in assignment:
                     student = sidToStudentInfo[sid]
                     group = gidToGroupInfo[gid]
                     
-                    index = gid - 1
+                    index = indexOfGroup[gid]
                     if output['groups'][index] == None:
                         output['groups'][index] = {}
                         output['groups'][index]['students'] = []
@@ -191,13 +495,17 @@ class GroupCreator(object):
                 # put in info for empty groups
                 for group in groups:
                     gid = group.id
-                    index = gid - 1
+                    index = indexOfGroup[gid]
                     if output['groups'][index] == None:
-                        output['groups'][index] = {'students':[],'info':group.info}
+                        output['groups'][index] = {'students':[],'info':gidToGroupInfo[gid]}
                 
                 return output
+            elif timedOut and 'search' in info:
+                logs.append("> " + name + ": local search didn't find groups that meet every required goal. Trying next goal group...")
+            elif timedOut:
+                logs.append("> " + name + " hit the time limit before groups were found. Trying next goal group...")
             else:
-                logs.append("> Goal group " + str(i) + " was too strict. Trying next goal group...")
+                logs.append("> " + name + " was too strict. Trying next goal group...")
         logs.append("All goal groups were too strict. No groups could be created")
 
         output = {}
@@ -205,4 +513,666 @@ class GroupCreator(object):
         output['Reward'] = None
         output['goalGroup'] = None
         output['logs'] = logs
+        output['solver'] = self.solver.backend
+        output['timedOut'] = anyTimedOut
+        return output
+
+    def _solveGoalGroup(self, goals, baseModel, dataBox, allowed=None):
+        """Solves one goal group with the chosen engine
+        :param allowed: {sid: gids} the groups each student may be placed in (see Sparse.py), or None if the goal group uses baseModel
+        :return: (status, reward, [(sid, gid), ...], timedOut, info) or None if constraints couldn't be interpreted. info holds details of the run, e.g. info['presolve']
+        """
+        if self.decompose:
+            parts = Decompose.split(dataBox, goals)
+            if parts != None:
+                ret = self._solveParts(goals, parts, dataBox, allowed)
+                if ret != None:
+                    return ret
+                # A part couldn't be interpreted on its own, so solve the whole problem
+        stats = Stats(self.collectStats)
+        if allowed != None:
+            with stats.timed('base'):
+                (students, groups, dataBox) = Decompose.buildPart(dataBox, dataBox.getStudents(), dataBox.getGroups(), self.engine == 'pulp', allowed)
+                baseModel = self._buildBase(students, groups, allowed)
+        if baseModel == None:
+            return None
+        return self._solveModel(goals, baseModel, dataBox, allowed != None, stats)
+
+    def _allowedGroups(self, goals, dataBox):
+        """The groups the required goals allow each student in (see Sparse.py), or None if the goal group gets the model with every pair"""
+        if not self.sparseMembership or self.engine == 'search':
+            return None
+        return Sparse.allowedGroups(dataBox, goals)
+
+    def _solveModel(self, goals, baseModel, dataBox, sparse=False, stats=NO_STATS):
+        """Solves one goal group on a base model with the chosen engine
+        :param sparse: True if baseModel only has variables for the pairs the required goals allow
+        :param stats: the Stats of the goal group, which end up in info['stats'] of the result
+        """
+        ret = self._solveEngine(goals, baseModel, dataBox, sparse, stats)
+        if ret != None and stats.enabled:
+            ret[4]['stats'] = stats.goalGroupDict()
+        return ret
+
+    def _solveEngine(self, goals, baseModel, dataBox, sparse, stats):
+        """Solves one goal group with the model cache, the greedy start and the chosen engine (see _solveModel)"""
+        cacheKey = None
+        if self.modelCache != None and self.engine != 'search' and self.solver.backend == 'cbc':
+            with stats.timed('modelCache'):
+                cacheKey = self.modelCache.key(dataBox, goals, (self.engine, sparse, self.breakSymmetry, self.presolveModel))
+                ret = self.modelCache.solve(cacheKey, self.solver, stats)
+            if ret != None:
+                return ret
+
+        start = None
+        if self.warmStart:
+            with stats.timed('greedyStart'):
+                start = self._greedyStart(goals, dataBox)
+
+        if self.engine == 'matrix':
+            ret = self._solveMatrix(goals, baseModel, dataBox, start, sparse, cacheKey, stats)
+        elif self.engine == 'search':
+            ret = self._solveSearch(goals, baseModel, dataBox, start, stats)
+        else:
+            # PuLP can't hand CBC a start that leaves out the helper variables, so the start is only used as a fallback
+            ret = self._solvePulp(goals, baseModel, dataBox, sparse, cacheKey, stats)
+        if ret == None or start == None:
+            return ret
+
+        # Fall back on the greedy groups if the solver ran out of time without beating them
+        (status, reward, assignment, timedOut, info) = ret
+        (groupOf, startReward) = start
+        if timedOut and (not _foundGroups(ret) or startReward > reward):
+            info['warmStartUsed'] = True
+            return (status, float(startReward), groupOf.items(), timedOut, info)
+        return ret
+
+    def _greedyStart(self, goals, dataBox):
+        """Builds starting groups with the greedy heuristic. When re-solving (see updateGroups), students start in the groups they were in
+        :return: ({sid: gid}, reward), or None if the heuristic didn't find groups that meet every required goal
+        """
+        previous = {}
+        for goal in goals:
+            if isinstance(goal, KeepGroupsGoal):
+                previous.update(goal.groupOf)
+        (groupOf, reward) = (None, None)
+        for start in ([previous, None] if len(previous) > 0 else [None]):
+            groupOf = Greedy.greedyAssignment(dataBox, goals, start)
+            reward = Greedy.evaluate(dataBox, goals, groupOf) if groupOf != None else None
+            if reward != None:
+                break
+        if reward == None:
+            return None
+
+        # The start has to follow the order symmetry breaking puts interchangeable groups in
+        if self.breakSymmetry:
+            for groupClass in Symmetry.interchangeableGroups(dataBox.getGroups(), goals):
+                groupOf = Symmetry.relabel(groupOf, dataBox.getStudents(), groupClass)
+        return (groupOf, reward)
+
+    def _solveParts(self, goals, parts, dataBox, allowed=None):
+        """Solves the independent parts of a goal group (see Decompose.py) and merges them into one result
+        :return: same as _solveGoalGroup, or None if a part couldn't be interpreted
+        """
+        numWorkers = self.decomposeWorkers
+        if numWorkers == None:
+            numWorkers = multiprocessing.cpu_count()
+        # The time limit is for the whole goal group, so parts share it
+        deadline = None
+        if self.solver.timeLimit != None:
+            deadline = time.time() + self.solver.timeLimit
+        # Worker processes (e.g. racing goal groups) can't start processes of their own
+        if numWorkers > 1 and not multiprocessing.current_process().daemon:
+            results = self._runInWorkers('_solvePart', [(goals, students, groups, dataBox, allowed, deadline) for (students, groups) in parts], numWorkers)
+        else:
+            results = (self._solvePart(goals, students, groups, dataBox, allowed, deadline) for (students, groups) in parts)
+
+        status = 'Optimal'
+        reward = 0
+        assignment = []
+        anyTimedOut = False
+        info = {'parts': len(parts)}
+        partStats = []
+        try:
+            for ret in results:
+                if ret == None:
+                    return None
+                (partStatus, partReward, partAssignment, timedOut, partInfo) = ret
+                anyTimedOut = anyTimedOut or timedOut
+                if 'stats' in partInfo:
+                    partStats.append(partInfo['stats'])
+                if not _foundGroups(ret):
+                    # The whole goal group fails with this part
+                    if self.collectStats:
+                        info['stats'] = mergeParts(partStats)
+                    return (partStatus, None, [], anyTimedOut, info)
+                if partStatus != 'Optimal':
+                    status = partStatus
+                if partReward != None:
+                    reward += partReward
+                assignment += partAssignment
+                if 'presolve' in partInfo:
+                    if not 'presolve' in info:
+                        info['presolve'] = dict((key, 0) for key in partInfo['presolve'])
+                    for key in partInfo['presolve']:
+                        info['presolve'][key] += partInfo['presolve'][key]
+                if 'search' in partInfo:
+                    info.setdefault('search', {'moves': 0})['moves'] += partInfo['search']['moves']
+                if partInfo.get('warmStartUsed'):
+                    info['warmStartUsed'] = True
+                if partInfo.get('modelCache'):
+                    info['modelCache'] = info.get('modelCache', 0) + 1
+        finally:
+            results.close()
+        if self.collectStats:
+            info['stats'] = mergeParts(partStats)
+        return (status, reward, assignment, anyTimedOut, info)
+
+    def _solvePart(self, goals, students, groups, dataBox, allowed=None, deadline=None):
+        """Builds and solves the model of one part of a goal group
+        :param deadline: time.time() by which the goal group has to be solved, or None if there's no time limit
+        """
+        stats = Stats(self.collectStats)
+        with stats.timed('base'):
+            (students, groups, partBox) = Decompose.buildPart(dataBox, students, groups, self.engine == 'pulp', allowed)
+            baseModel = self._buildBase(students, groups, allowed)
+        if baseModel == None:
+            return None
+        if deadline == None:
+            return self._solveModel(goals, baseModel, partBox, allowed != None, stats)
+
+        timeLeft = deadline - time.time()
+        if timeLeft <= 0:
+            # The parts before took all the time, so the greedy groups are all this part gets
+            start = self._greedyStart(goals, partBox) if self.warmStart else None
+            if start == None:
+                return ('Not Solved', None, [], True, {})
+            return ('Not Solved', start[1], start[0].items(), True, {'warmStartUsed': True})
+        # The part is solved with the time left of its goal group
+        solver = self.solver
+        self.solver = solver.withTimeLimit(timeLeft)
+        try:
+            return self._solveModel(goals, baseModel, partBox, allowed != None, stats)
+        finally:
+            self.solver = solver
+
+    def _runInWorkers(self, method, argsList, numWorkers):
+        """Runs getattr(self, method)(*args) for each args in argsList, at most numWorkers at once in worker processes
+        Yields results as they finish. Closing the generator kills workers that are still running.
+        """
+        queue = multiprocessing.Queue()
+        workers = {}
+        nextToStart = 0
+        try:
+            for _ in range(len(argsList)):
+                while nextToStart < len(argsList) and len(workers) < numWorkers:
+                    worker = multiprocessing.Process(target=_worker, args=(self, method, nextToStart, argsList[nextToStart], queue))
+                    worker.daemon = True
+                    worker.start()
+                    workers[nextToStart] = worker
+                    nextToStart += 1
+
+                (j, ret) = _nextResult(queue, workers, self.events)
+                workers.pop(j).join()
+                if isinstance(ret, Exception):
+                    raise ret
+                yield ret
+        finally:
+            for worker in workers.values():
+                _killWorker(worker)
+
+    def _solveInOrder(self, goalGroups, baseModel, dataBox, allowed, overBudget, labels=None):
+        """Solves goal groups one after another, yielding (i, result) (see _solveGoalGroup)
+        :param overBudget: {i: limits} of the goal groups that are skipped (see _overBudget)
+        :param labels: see _solveGoalGroups
+        """
+        for i in range(len(goalGroups)):
+            if i in overBudget:
+                yield (i, _overBudgetResult(overBudget[i]))
+                continue
+            self._goalGroupStarted(_goalGroupLabel(labels, i)[0], goalGroups[i])
+            yield (i, self._solveGoalGroup(goalGroups[i], baseModel, dataBox, allowed[i]))
+
+    def _goalGroupStarted(self, i, goals):
+        if self.events.listening('goalGroupStarted'):
+            self.events.emit('goalGroupStarted', {'goalGroup': i, 'goals': len(goals)})
+
+    def _raceGoalGroups(self, goalGroups, baseModel, dataBox, allowed, overBudget, labels=None):
+        """Solves up to self.parallelGoalGroups goal groups at once in worker processes
+        Yields (i, result) in goal group order. Goal groups after the first 'Optimal' one are never started, and closing the generator kills workers that are still running.
+        :param overBudget: {i: limits} of the goal groups that are skipped (see _overBudget)
+        :param labels: see _solveGoalGroups
+        """
+        queue = multiprocessing.Queue()
+        workers = {}
+        finished = dict((i, _overBudgetResult(overBudget[i])) for i in overBudget)
+        nextToStart = 0
+        firstOptimal = len(goalGroups)
+        try:
+            for i in range(len(goalGroups)):
+                while not i in finished:
+                    # Keep the pool full, but there's no need to try goal groups after one that worked
+                    while nextToStart < firstOptimal and len(workers) < self.parallelGoalGroups:
+                        if nextToStart in overBudget:
+                            nextToStart += 1
+                            continue
+                        self._goalGroupStarted(_goalGroupLabel(labels, nextToStart)[0], goalGroups[nextToStart])
+                        worker = multiprocessing.Process(target=_worker, args=(self, '_solveGoalGroup', nextToStart, (goalGroups[nextToStart], baseModel, dataBox, allowed[nextToStart]), queue))
+                        worker.daemon = True
+                        worker.start()
+                        workers[nextToStart] = worker
+                        nextToStart += 1
+
+                    (j, ret) = _nextResult(queue, workers, self.events)
+                    workers.pop(j).join()
+                    if isinstance(ret, Exception):
+                        raise ret
+                    finished[j] = ret
+                    if _foundGroups(ret):
+                        firstOptimal = min(firstOptimal, j)
+                        # Groups after j can't be the answer anymore
+                        for k in [k for k in workers if k > j]:
+                            _killWorker(workers.pop(k))
+                yield (i, finished.pop(i))
+        finally:
+            for worker in workers.values():
+                _killWorker(worker)
+
+    def _buildBase(self, students, groups, allowed=None):
+        """Builds the student/group part of the model with the chosen engine
+        :param allowed: {sid: gids} the only pairs that get membership variables, or None for every pair (PuLP students already hold their variables)
+        """
+        if self.engine == 'matrix':
+            return self._buildMatrixBase(students, groups, allowed)
+        if self.engine == 'search':
+            return SearchModel(students, groups)
+        return self._buildPulpBase(students, groups)
+
+    def _buildPulpBase(self, students, groups):
+        """Builds a PuLP problem holding only the student and group constraints
+        :return: the problem, or None if constraints couldn't be interpreted
+        """
+        problem = pulp.LpProblem("Group Membership Problem", pulp.LpMaximize)
+        
+        # Add student constraints
+        for student in students:
+            constraints = student.genConstraints()
+            if constraints == None:
+                return None
+            for constraint in constraints:
+                problem += constraint
+        
+        # Add group constraints
+        for group in groups:
+            constraints = group.genConstraints()
+            if constraints == None:
+                return None
+            for constraint in constraints:
+                problem += constraint
+
+        return problem
+
+    def _goalGenerated(self, goal):
+        if self.events.listening('goalConstraintsGenerated'):
+            self.events.emit('goalConstraintsGenerated', {'goal': goal})
+
+    def _solveStarted(self):
+        if self.events.listening('solveStarted'):
+            self.events.emit('solveStarted', {'engine': self.engine})
+
+    def _incumbentListener(self):
+        """A function of a reward that reports an incumbentFound event, or None if nobody listens"""
+        if not self.events.listening('incumbentFound'):
+            return None
+        return lambda reward: self.events.emit('incumbentFound', {'engine': self.engine, 'reward': reward})
+
+    def _solvePulp(self, goals, baseProblem, dataBox, sparse=False, cacheKey=None, stats=NO_STATS):
+        """Adds goal constraints to a copy of baseProblem and solves
+        :param sparse: True if baseProblem only has variables for allowed pairs, so goals that only rule out pairs are left out
+        :param cacheKey: key the problem is stored under in the model cache, or None
+        :param stats: the Stats of the goal group
+        :return: (status, reward, [(sid, gid), ...], timedOut, info) or None if constraints couldn't be interpreted
+        """
+        # Constraints are shared by reference, so copying is cheap
+        problem = baseProblem.copy()
+        problem.lastUnused = baseProblem.lastUnused
+
+        # Variables already in the problem, so each goal is only counted for the variables it adds
+        if stats.enabled:
+            seen = pulpVariables(problem.constraints.values())
+
+        # Add goal constraints
+        rewards = []
+        for goal in (Sparse.modelGoals(goals) if sparse else goals):
+            started = time.time()
+            with stats.timed('goals') as measured:
+                ret = goal.genConstraintsAndRewards(dataBox)
+                if ret == None:
+                    return None
+                (constraints, theseRewards) = ret
+                # Add constraints to problem
+                for constraint in constraints:
+                    problem += constraint
+                # Accumulate rewards 
+                rewards += theseRewards
+            if stats.enabled:
+                added = pulpVariables(constraints + theseRewards) - seen
+                seen.update(added)
+                stats.addGoal(goal, time.time() - started, len(added), len(constraints), measured['memoryGrowthMB'])
+            self._goalGenerated(goal)
+
+        # Order interchangeable groups
+        if self.breakSymmetry:
+            with stats.timed('symmetry'):
+                for groupClass in Symmetry.interchangeableGroups(dataBox.getGroups(), goals):
+                    for constraint in Symmetry.genConstraints(dataBox.getStudents(), groupClass):
+                        problem += constraint
+        
+        # Objective function
+        problem += sum(rewards), 'reward'
+
+        info = {}
+        if self.presolveModel:
+            with stats.timed('presolve'):
+                info['presolve'] = presolveProblem(problem)
+        if stats.enabled:
+            stats.setModelSize(len(pulpVariables(problem.constraints.values() + [problem.objective])), len(problem.constraints))
+        
+        # Attempt to solve
+        # print problem
+        self._solveStarted()
+        with stats.timed('solve'):
+            (status, timedOut, solverPeak) = self.solver.solvePulp(problem)
+        stats.setSolverMemory(solverPeak)
+        if cacheKey != None:
+            # Stored after solving: writing an MPS file adds PuLP's placeholder variable to an empty objective, which would change the solve
+            with stats.timed('modelCache'):
+                self.modelCache.storePulp(cacheKey, problem)
+        # CBC stopped on the time limit is 'Not Solved' in PuLP 1.6, but its best groups are still in the variables
+        if status != 'Optimal' and not (timedOut and self._pulpFoundGroups(problem, dataBox)):
+            return (status, None, [], timedOut, info)
+
+        with stats.timed('decode'):
+            return (status, self._pulpReward(problem), self._pulpAssignment(problem), timedOut, info)
+
+    def _pulpFoundGroups(self, problem, dataBox):
+        """True if a PuLP problem that wasn't solved to optimality holds groups: every student has exactly one membership variable at 1
+        (a solver stopped before it found any leaves fractional values or none at all)"""
+        placed = {}
+        for variable in problem.variables():
+            if variable.name == '__dummy':
+                continue
+            ret = Utils.decodeVarName(variable.name)
+            if ret == None:
+                continue
+            value = variable.varValue
+            if value == None or abs(value - round(value)) > 1e-6:
+                return False
+            if round(value) == 1:
+                placed[ret[0]] = placed.get(ret[0], 0) + 1
+        return len(placed) == len(dataBox.getStudents()) and all(count == 1 for count in placed.values())
+
+    def _pulpAssignment(self, problem):
+        """The (sid, gid) pairs of the membership variables that are 1 in a solved PuLP problem"""
+        assignment = []
+        for variable in problem.variables():
+            # print variable.name + ' = ' + str(variable.varValue)
+            if variable.name == '__dummy':
+                continue
+            if variable.varValue == 0:
+                continue
+            ret = Utils.decodeVarName(variable.name)
+            if ret == None:
+                continue
+            assignment.append(ret)
+        return assignment
+
+    def _pulpReward(self, problem):
+        """The objective value of a solved PuLP problem"""
+        # An objective with no variables left (e.g. every reward is 0) is solved with PuLP's placeholder variable, which gets no value
+        return problem.objective.constant + sum(coef * (variable.varValue or 0) for (variable, coef) in problem.objective.items())
+
+    def _buildMatrixBase(self, students, groups, allowed=None):
+        """Builds a MatrixModel holding only the student and group constraints"""
+        # numpy/scipy are only needed by this engine
+        from MatrixModel import MatrixModel
+
+        return MatrixModel(students, groups, allowed)
+
+    def _solveMatrix(self, goals, baseModel, dataBox, start=None, sparse=False, cacheKey=None, stats=NO_STATS):
+        """Adds goal rows to a copy of baseModel and solves it in bulk (see MatrixModel.py)
+        :param start: ({sid: gid}, reward) groups the solver starts from, or None
+        :param sparse: True if baseModel only has columns for allowed pairs, so goals that only rule out pairs are left out
+        :param cacheKey: key the model is stored under in the model cache, or None
+        :param stats: the Stats of the goal group
+        :return: (status, reward, [(sid, gid), ...], timedOut, info) or None if constraints couldn't be interpreted
+        """
+        model = baseModel.copy()
+        for goal in (Sparse.modelGoals(goals) if sparse else goals):
+            (started, numVars, numRows) = (time.time(), model.numVars, model.numRows)
+            with stats.timed('goals') as measured:
+                if goal.genMatrixConstraintsAndRewards(dataBox, model) == None:
+                    return None
+            stats.addGoal(goal, time.time() - started, model.numVars - numVars, model.numRows - numRows, measured['memoryGrowthMB'])
+            self._goalGenerated(goal)
+        if self.breakSymmetry:
+            with stats.timed('symmetry'):
+                for groupClass in Symmetry.interchangeableGroups(dataBox.getGroups(), goals):
+                    Symmetry.addMatrixRows(model, dataBox.getStudents(), groupClass)
+
+        info = {}
+        if self.presolveModel:
+            with stats.timed('presolve'):
+                info['presolve'] = model.presolve()
+        stats.setModelSize(model.numVars, model.numRows)
+        if cacheKey != None:
+            with stats.timed('modelCache'):
+                self.modelCache.storeMatrix(cacheKey, model)
+
+        if start != None:
+            start = start[0].items()
+        self._solveStarted()
+        with stats.timed('solve'):
+            (status, reward, values, timedOut, solverPeak) = self.solver.solveMatrix(model, start, self._incumbentListener())
+        stats.setSolverMemory(solverPeak)
+        if values is None:
+            return (status, None, [], timedOut, info)
+        with stats.timed('decode'):
+            return (status, reward, model.getAssignment(values), timedOut, info)
+
+    def _solveSearch(self, goals, baseModel, dataBox, start=None, stats=NO_STATS):
+        """Adds goal terms to a copy of baseModel and improves groups by local search (see LocalSearch.py)
+        :param start: ({sid: gid}, reward) groups the search starts from, or None
+        :param stats: the Stats of the goal group (the search has no variables or constraints to count)
+        :return: (status, reward, [(sid, gid), ...], timedOut, info) or None if constraints couldn't be interpreted.
+        status is only 'Optimal' if no groups can have more reward, otherwise timedOut is True (the search stopped on its budget)
+        """
+        model = baseModel.copy()
+        for goal in goals:
+            started = time.time()
+            with stats.timed('goals') as measured:
+                if goal.genSearchTerms(dataBox, model) == None:
+                    return None
+            stats.addGoal(goal, time.time() - started, None, None, measured['memoryGrowthMB'])
+            self._goalGenerated(goal)
+
+        (studentUnits, unitAllowed) = Greedy.units(dataBox, goals)
+        if start != None:
+            start = start[0]
+        random = Random(0) if self.determinateSolution else Random()
+        self._solveStarted()
+        with stats.timed('solve'):
+            ret = model.solve(studentUnits, unitAllowed, start, self.searchIterations, self.solver.timeLimit, random, self._incumbentListener())
+        if ret == None:
+            # Required pods or groups can't fit
+            return ('Infeasible', None, [], False, {})
+
+        (groupOf, violation, proven, moves) = ret
+        info = {'search': {'moves': moves}}
+        # Rewards are counted again the same way the model counts them
+        with stats.timed('decode'):
+            reward = Greedy.evaluate(dataBox, goals, groupOf) if violation == 0 else None
+        if reward == None:
+            return ('Not Solved', None, [], True, info)
+        # Greedy.evaluate sums the goals' rewards, which are ints if they were given as ints. The solvers' rewards are floats
+        return ('Optimal' if proven else 'Not Solved', float(reward), groupOf.items(), not proven, info)
+
+def _goalGroupLabel(labels, i):
+    """(index of the goal group, name used in the logs) of the i-th goal group tried (see _solveGoalGroups)"""
+    if labels == None:
+        return (i, "Goal group " + str(i))
+    return labels[i]
+
+def _finishedDetails(i, ret):
+    """Details of the goalGroupFinished event of goal group i (see Events.py)"""
+    if ret == None:
+        return {'goalGroup': i, 'status': None, 'reward': None, 'timedOut': False}
+    (status, reward, assignment, timedOut, info) = ret
+    return {'goalGroup': i, 'status': status, 'reward': reward if _foundGroups(ret) else None, 'timedOut': timedOut}
+
+def _overBudgetResult(limits):
+    """The result of a goal group skipped because its model would go over the budget (see GroupCreator._overBudget)"""
+    return ('Over Budget', None, [], False, {'overBudget': limits})
+
+def _estimateText(estimate):
+    """A model size estimate (see Estimate.py) as text"""
+    text = str(estimate['variables']) + ' variables and ' + str(estimate['constraints']) + ' constraints'
+    if estimate['memoryMB'] != None:
+        text += ' (' + str(int(round(estimate['memoryMB']))) + ' MB)'
+    return text
+
+def _withStats(output, runStats):
+    """Adds the statistics of the run to output, if they're on (see setStats)"""
+    if runStats.enabled:
+        output['stats'] = runStats.runDict()
+    return output
+
+def _foundGroups(ret):
+    """True if a goal group's solve result can be used. Groups found before the time limit are used even if they weren't proven optimal"""
+    if ret == None:
+        return False
+    (status, reward, assignment, timedOut, info) = ret
+    return status == 'Optimal' or (timedOut and len(assignment) > 0)
+
+def _isEmptyGroup(info):
+    """True if a group has no room (size 0), so it's left out of the problem"""
+    return 'size' in info and info['size'] == 0
+
+def _infoKeys(infos):
+    """(key, info) for each student or group info: the same info object gets the same key on every call (an info listed twice gets two keys)"""
+    seen = {}
+    keys = []
+    for info in infos:
+        key = id(info)
+        count = seen.get(key, 0)
+        seen[key] = count + 1
+        keys.append((key, count))
+    return zip(keys, infos)
+
+def _updateEntries(before, entries, changed, add, remove, update):
+    """Applies the changes since the last call to a data box
+    :param before: {key: (info, entry)} of the last call (see _infoKeys)
+    :param entries: the students (or groups) of this call, in order
+    :param changed: (entry, info) for each entry whose info changed
+    """
+    kept = set(id(entry) for entry in entries)
+    known = set(id(entry) for (info, entry) in before.values())
+    for (info, entry) in before.values():
+        if not id(entry) in kept:
+            remove(entry)
+    for (entry, info) in changed:
+        update(entry, info)
+    for entry in entries:
+        if not id(entry) in known:
+            add(entry)
+
+def _previousGroups(previous, students, studentInfos, groups, gidToGroupInfo, changed):
+    """Where the students were placed by an earlier run (see updateGroups)
+    :param changed: (sids, gids) of the students and groups whose info changed since then
+    :return: (previousGroupOf, fixed): {sid: gid} of the students placed by previous whose group is still there, and the part of it for students that don't need to move
+    """
+    gidOfInfo = dict((id(gidToGroupInfo[group.id]), group.id) for group in groups)
+    placed = {}
+    for group in previous['groups']:
+        for info in group['students']:
+            placed[id(info)] = gidOfInfo.get(id(group['info']))
+
+    # Groups that lost a student, and groups of students whose info changed, are placed again
+    (changedSids, changedGids) = changed
+    present = set(id(info) for info in studentInfos)
+    affected = set(changedGids)
+    affected.update(placed[key] for key in placed if not key in present)
+
+    previousGroupOf = {}
+    for (student, info) in zip(students, studentInfos):
+        gid = placed.get(id(info))
+        if gid != None:
+            previousGroupOf[student.id] = gid
+            if student.id in changedSids:
+                affected.add(gid)
+    fixed = dict((sid, gid) for (sid, gid) in previousGroupOf.items() if not sid in changedSids and not gid in affected)
+    return (previousGroupOf, fixed)
+
+def _withoutStayReward(output, previous, stayReward, rewarded, sidToStudentInfo):
+    """Takes the rewards for staying out of output['reward'] and counts the students that moved
+    :param rewarded: {sid: gid} of the students that got stayReward for staying in their group
+    """
+    if output['goalGroup'] == None:
         return output
+    before = {}
+    for group in previous['groups']:
+        for info in group['students']:
+            before[id(info)] = id(group['info'])
+    after = {}
+    for group in output['groups']:
+        for info in group['students']:
+            after[id(info)] = id(group['info'])
+
+    stayed = len([sid for sid in rewarded if before.get(id(sidToStudentInfo[sid])) == after[id(sidToStudentInfo[sid])]])
+    output['reward'] -= stayed * stayReward
+    output['moved'] = len([key for key in before if key in after and before[key] != after[key]])
+    output['logs'].append(str(output['moved']) + " students were moved to another group.")
+    return output
+
+def _worker(creator, method, i, args, queue):
+    """Runs in a worker process: calls creator.method(*args) and puts (i, result) on the queue, after the events of the run (see Events.forward)"""
+    # Own process group, so killing the worker also kills its solver subprocess
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+    creator.events.forward(queue)
+    try:
+        ret = getattr(creator, method)(*args)
+    except Exception as err:
+        ret = err
+    # The queue pickles in a background thread, where a failure would leave the parent waiting forever
+    try:
+        pickle.dumps(ret, pickle.HIGHEST_PROTOCOL)
+    except Exception as err:
+        ret = TypeError("the result couldn't be sent back from the worker: " + str(err))
+    queue.put((i, ret))
+
+def _nextResult(queue, workers, events):
+    """Waits for the next (i, result) a worker puts on the queue, reporting the events workers send back on the way
+    :param workers: {i: worker process} of the workers still running. Raises a RuntimeError if one of them died without giving its result (e.g. it was killed for using too much memory)
+    :param events: the Events of the group creator
+    """
+    while True:
+        try:
+            (i, ret) = queue.get(timeout=POLL)
+            if i == None:
+                events.emit(*ret)
+                continue
+            return (i, ret)
+        except Queue.Empty:
+            for i in sorted(workers):
+                if not workers[i].is_alive() and workers[i].exitcode != 0:
+                    raise RuntimeError('a worker process died (exit code ' + str(workers[i].exitcode) + ')')
+
+def _killWorker(worker):
+    """Kills a goal group worker along with any solver it started"""
+    try:
+        os.killpg(worker.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        # No process groups on this platform (or the worker hasn't made its own yet)
+        worker.terminate()
+    worker.join()
@@ -2,16 +2,53 @@ import pulp
 
 # LINEAR OPTIMIZATION HELPERS
 # All return (c,v) LPConstraint[] c and LPVariable v (constraints required to maintain state of variable)
+# Big-M values are taken from the bounds of each expression. M is only used when an expression has no bound
 # M should be a large number (>= max value of variable)
 
 M = 19999.0
 
+# Constraints that only exist to set a helper variable are named <variable name> + DEFINES + k, so presolve can tell them apart (see Presolve.py)
+DEFINES = '_def'
+
+def _bounds(expression, upBound=None):
+    """Returns (lower, upper) bounds of a linear expression from the bounds of its variables (None if unbounded)
+    :param upBound: a known upper bound of the expression (e.g. the size of a group), used if it is tighter
+    """
+    if isinstance(expression, pulp.LpElement):
+        expression = pulp.LpAffineExpression(expression)
+    if not isinstance(expression, pulp.LpAffineExpression):
+        # A constant (e.g. the sum of an empty list)
+        return (expression, expression)
+
+    lower = expression.constant
+    upper = expression.constant
+    for (var, coef) in expression.items():
+        if coef > 0:
+            (varLower, varUpper) = (var.lowBound, var.upBound)
+        else:
+            (varLower, varUpper) = (var.upBound, var.lowBound)
+        lower = None if lower == None or varLower == None else lower + coef * varLower
+        upper = None if upper == None or varUpper == None else upper + coef * varUpper
+
+    if upBound != None and (upper == None or upBound < upper):
+        upper = upBound
+    return (lower, upper)
+
+def _defining(constraints, variable):
+    """Names constraints that only set the value of variable
+    :return: constraints
+    """
+    for k in range(len(constraints)):
+        constraints[k].name = variable.name + DEFINES + str(k)
+    return constraints
+
 # From http://cs.stackexchange.com/questions/71091/express-a-complex-if-statement-to-linear-programming?rq=1
 global nextVarID
 nextVarID = 1
 
-def _boolFromLowerBound(variable, lowBound, name=None):
+def _boolFromLowerBound(variable, lowBound, name=None, upBound=None):
     """Creates a variable: v is 1 if variable >= lowBound
+    :param upBound: a known upper bound of variable (e.g. the size of a group)
     :return: (c,v) where c is a list of constraints required to maintain the state of the variable, and v is the variable of interest
     """
     constraints = []
@@ -22,16 +59,23 @@ def _boolFromLowerBound(variable, lowBound, name=None):
         nextVarID += 1
     
     # variable 1 if lowBound <= variable holds
-    boolVar = pulp.LpVariable(name, lowBound=0, cat='Integer')
+    boolVar = pulp.LpVariable(name, cat='Binary')
+
+    (lower, upper) = _bounds(variable, upBound)
+    if lower == None:
+        lower = lowBound - M
+    if upper == None:
+        upper = lowBound - 1 + M
 
-    constraints.append(boolVar * M <= variable - lowBound + M)
-    constraints.append(boolVar * M >= variable - lowBound + 1)
-    constraints.append(boolVar <= 1)
+    # v = 1 => variable >= lowBound, v = 0 => variable <= lowBound - 1
+    constraints.append(variable >= lower + (lowBound - lower) * boolVar)
+    constraints.append(variable <= lowBound - 1 + (upper - lowBound + 1) * boolVar)
 
-    return (constraints, boolVar)
+    return (_defining(constraints, boolVar), boolVar)
 
-def _boolFromUpperBound(variable, upperBound, name=None):
-    """Creates a variable: v is 1 if variable <= lowBound
+def _boolFromUpperBound(variable, upperBound, name=None, upBound=None):
+    """Creates a variable: v is 1 if variable <= upperBound
+    :param upBound: a known upper bound of variable (e.g. the size of a group)
     :return: (c,v) where c is a list of constraints required to maintain the state of the variable, and v is the variable of interest
     """
     constraints = []
@@ -42,13 +86,19 @@ def _boolFromUpperBound(variable, upperBound, name=None):
         nextVarID += 1
 
     # variable 1 if upperBound >= variable holds
-    boolVar = pulp.LpVariable(name, lowBound=0, cat='Integer')
+    boolVar = pulp.LpVariable(name, cat='Binary')
+
+    (lower, upper) = _bounds(variable, upBound)
+    if lower == None:
+        lower = upperBound + 1 - M
+    if upper == None:
+        upper = upperBound + M
 
-    constraints.append(boolVar * M <= upperBound + M - variable)
-    constraints.append(boolVar * M >= upperBound - variable + 1)
-    constraints.append(boolVar <= 1)
+    # v = 1 => variable <= upperBound, v = 0 => variable >= upperBound + 1
+    constraints.append(variable <= upper - (upper - upperBound) * boolVar)
+    constraints.append(variable >= upperBound + 1 - (upperBound + 1 - lower) * boolVar)
 
-    return (constraints, boolVar)
+    return (_defining(constraints, boolVar), boolVar)
 
 def _boolAnd(varA, varB, name=None):
     """Creates a variable: v is 1 if varA == varB == 1
@@ -62,12 +112,12 @@ def _boolAnd(varA, varB, name=None):
         nextVarID += 1
 
     # variable 1 if varA == 1 and varB == 1
-    boolVar = pulp.LpVariable(name, lowBound=0, cat='Integer')
+    boolVar = pulp.LpVariable(name, cat='Binary')
 
     constraints.append(0 <= varA + varB - 2 * boolVar)
     constraints.append(varA + varB - 2 * boolVar <= 1)
 
-    return (constraints, boolVar)
+    return (_defining(constraints, boolVar), boolVar)
 
 def _boolOr(varA, varB, name=None):
     """Creates a variable: v is 1 if varA == 1or varB == 1
@@ -81,11 +131,11 @@ def _boolOr(varA, varB, name=None):
         nextVarID += 1
 
     # variable 1 if varA == 1 and varB == 1
-    boolVar = pulp.LpVariable(name, lowBound=0, cat='Integer')
+    boolVar = pulp.LpVariable(name, cat='Binary')
     constraints.append(boolVar <= varA + varB)
     constraints.append(boolVar * 2 >= varA + varB)
 
-    return (constraints, boolVar)
+    return (_defining(constraints, boolVar), boolVar)
 
 
 
@@ -113,4 +163,4 @@ def _createRewardVar(boolean, reward, name=None):
     rewardVar = pulp.LpVariable(name, lowBound=0, cat='Integer')
 
     constraints = [rewardVar == reward * boolean]
-    return (constraints, rewardVar)
\ No newline at end of file
+    return (_defining(constraints, rewardVar), rewardVar)
\ No newline at end of file
@@ -0,0 +1,582 @@
+import copy
+import math
+import time
+import Greedy
+
+# LOCAL SEARCH
+# For rosters too large for the MIP, groups are improved move by move (simulated annealing) instead of being solved exactly.
+# Each goal adds terms (see genSearchTerms in Goal.py) that keep their counts up to date as students move, so a move only costs as much as the terms watching the moved students.
+# Students that required pods keep together move as one unit, and units only move into groups the required GroupFilterGoals and MustMatchGoals allow, so those are never broken.
+# Everything else that is required (group minsize, MinSimilarGoals, MaxSimilarGoals, ...) is counted as a violation, which outweighs any reward.
+
+class SearchModel(object):
+    """A group membership problem solved by local search
+    :param students: a list of students (see Student.py)
+    :param groups: a list of groups (see Group.py)
+    """
+    def __init__(self, students, groups):
+        self.students = students
+        self.groups = groups
+        self.studentIndex = dict((students[i].id, i) for i in range(len(students)))
+        self.groupIndex = dict((groups[j].id, j) for j in range(len(groups)))
+
+        self.capacity = [len(students) if group.size == None else group.size for group in groups]
+        self.minsize = [group.minsize or 0 for group in groups]
+
+        self.terms = []
+        # Terms to update when student i moves
+        self.watchers = [[] for _ in students]
+
+    def copy(self):
+        """Returns a copy without the goal terms (lookups are shared)"""
+        other = copy.copy(self)
+        other.terms = []
+        other.watchers = [[] for _ in self.students]
+        return other
+
+    def _addTerm(self, term):
+        self.terms.append(term)
+        for i in term.watched():
+            self.watchers[i].append(term)
+
+    ### Terms (one per goal, see Goal.genSearchTerms)
+
+    def addStudentTerm(self, allowed, total, required, partialReward, netReward):
+        """Adds a term counting students that are placed in one of their groups (GroupFilterGoal, MustMatchGoal)
+        :param allowed: {sid: gids} of the students the goal looks at
+        :param total: number of students that must be placed in their groups for the net reward
+        """
+        allowed = dict((self.studentIndex[sid], set(self.groupIndex[gid] for gid in gids)) for (sid, gids) in allowed.items())
+        self._addTerm(_StudentTerm(allowed, total, required, partialReward, netReward))
+
+    def addMinSimilarTerm(self, clicks, cutoffs, numGroups, required, partialReward, netReward):
+        """Adds a term counting groups that are empty or have at least cutoff students of one click (MinSimilarGoal)
+        :param clicks: lists of students that are similar
+        :param cutoffs: {gid: minimum similar students} of the groups that are checked
+        :param numGroups: number of groups that must be satisfied for the net reward
+        """
+        self._addTerm(_MinSimilarTerm(self._clickOf(clicks), self._byGroupIndex(cutoffs), numGroups, len(self.students), required, partialReward, netReward))
+
+    def addMaxSimilarTerm(self, clicks, cutoffs, required, partialReward, netReward):
+        """Adds a term counting groups where no click has more than cutoff students (MaxSimilarGoal)
+        :param clicks: lists of students that are similar
+        :param cutoffs: {gid: maximum similar students} of the groups that are checked
+        """
+        self._addTerm(_MaxSimilarTerm(self._clickOf(clicks), self._byGroupIndex(cutoffs), required, partialReward, netReward))
+
+    def addPodTerm(self, pods, required, partialReward, netReward):
+        """Adds a term counting pods whose students are all in one group (PodGoal)
+        :param pods: lists of students
+        """
+        self._addTerm(_PodTerm([[self.studentIndex[student.id] for student in pod] for pod in pods], required, partialReward, netReward))
+
+    def _clickOf(self, clicks):
+        """student index ==> index of its click"""
+        clickOf = {}
+        for k in range(len(clicks)):
+            for student in clicks[k]:
+                clickOf[self.studentIndex[student.id]] = k
+        return clickOf
+
+    def _byGroupIndex(self, byGid):
+        return dict((self.groupIndex[gid], value) for (gid, value) in byGid.items())
+
+    ### Search
+
+    def solve(self, studentUnits, unitAllowed, start=None, iterations=None, timeLimit=None, random=None, onIncumbent=None):
+        """Searches for the assignment with the most reward among those that break nothing required
+        :param studentUnits: lists of sids that always move together (see Greedy.units)
+        :param unitAllowed: for each unit, the set of gids it may be placed in (None means any group)
+        :param start: {sid: gid} to start from (must keep units together in allowed groups), or None to place units greedily
+        :param iterations: number of moves to try. Default: 100 per unit
+        :param timeLimit: seconds after which the search stops
+        :param random: a random.Random used to pick moves
+        :param onIncumbent: function called with the reward of each assignment found that breaks nothing required and has more reward than any before, or None
+        :return: ({sid: gid}, violation, proven, moves) for the best assignment found, where violation is 0 if nothing required is broken and proven is True if no assignment can have more reward.
+        None if the units can't be placed
+        """
+        if start == None:
+            unitGids = Greedy.placeUnits(self.groups, studentUnits, unitAllowed)
+            if unitGids == None:
+                return None
+        else:
+            unitGids = [start[unit[0]] for unit in studentUnits]
+        search = _Search(self, studentUnits, unitAllowed, unitGids, random)
+        return search.run(iterations, timeLimit, onIncumbent)
+
+class _Search(object):
+    """State of one simulated annealing run"""
+    def __init__(self, model, studentUnits, unitAllowed, unitGids, random):
+        self.model = model
+        self.random = random
+        self.units = [[model.studentIndex[sid] for sid in unit] for unit in studentUnits]
+        # Groups each unit may be placed in (None means any group)
+        self.allowedList = [None if gids == None else sorted(model.groupIndex[gid] for gid in gids) for gids in unitAllowed]
+        self.allowedSet = [None if gids == None else set(gids) for gids in self.allowedList]
+
+        numGroups = len(model.groups)
+        self.unitGroup = [model.groupIndex[gid] for gid in unitGids]
+        self.unitOf = [0] * len(model.students)
+        self.groupOf = [0] * len(model.students)
+        self.members = [0] * numGroups
+        # Units in each group, and the position of each unit in its group's list
+        self.groupUnits = [[] for _ in range(numGroups)]
+        self.unitPos = [0] * len(self.units)
+        for u in range(len(self.units)):
+            for i in self.units[u]:
+                self.unitOf[i] = u
+                self.groupOf[i] = self.unitGroup[u]
+            self.members[self.unitGroup[u]] += len(self.units[u])
+            self.unitPos[u] = len(self.groupUnits[self.unitGroup[u]])
+            self.groupUnits[self.unitGroup[u]].append(u)
+
+        (self.reward, self.violation) = self.recount()
+
+        self.maxReward = sum(term.maxReward() for term in model.terms)
+        # Removing one violation is worth more than any change in reward
+        self.weight = 1 + sum(term.rewardBound() for term in model.terms)
+
+    def recount(self):
+        """(reward, violation) of the current groups counted from scratch, resetting every term (moves keep the same totals up to date, see benchmarks/CheckSearch.py)"""
+        model = self.model
+        reward = 0
+        violation = sum(max(0, model.minsize[j] - self.members[j]) for j in range(len(model.groups)))
+        for term in model.terms:
+            term.reset(self.groupOf)
+            (termReward, termViolation) = term.value()
+            reward += termReward
+            violation += termViolation
+        return (reward, violation)
+
+    def run(self, iterations, timeLimit, onIncumbent=None):
+        start = time.time()
+        if iterations == None:
+            iterations = 100 * len(self.units)
+        if len(self.units) == 0:
+            iterations = 0
+        best = (self.violation, -self.reward)
+        bestUnitGroup = self.unitGroup[:]
+        if onIncumbent != None and best[0] == 0:
+            onIncumbent(-best[1])
+
+        temperature = self._startTemperature() if iterations > 0 else 1.0
+        finalTemperature = min(temperature, 0.01)
+        moves = 0
+        while moves < iterations and not self._proven(best):
+            if timeLimit != None and moves % 100 == 0 and time.time() - start >= timeLimit:
+                break
+            moves += 1
+            progress = float(moves) / iterations
+            if timeLimit != None:
+                progress = max(progress, (time.time() - start) / timeLimit)
+            current = temperature * (finalTemperature / temperature) ** progress
+
+            move = self._randomMove()
+            if move == None:
+                continue
+            undo = self._undo(move)
+            (dReward, dViolation) = self._apply(move)
+            delta = dReward - self.weight * dViolation
+            if delta >= 0 or self.random.random() < math.exp(delta / current):
+                if (self.violation, -self.reward) < best:
+                    if onIncumbent != None and self.violation == 0:
+                        onIncumbent(self.reward)
+                    best = (self.violation, -self.reward)
+                    bestUnitGroup = self.unitGroup[:]
+            else:
+                self._apply(undo)
+
+        groupOf = {}
+        for u in range(len(self.units)):
+            gid = self.model.groups[bestUnitGroup[u]].id
+            for i in self.units[u]:
+                groupOf[self.model.students[i].id] = gid
+        return (groupOf, best[0], self._proven(best), moves)
+
+    def _proven(self, best):
+        """True if best breaks nothing and has as much reward as any assignment can"""
+        return best[0] == 0 and -best[1] >= self.maxReward - 1e-9
+
+    def _startTemperature(self):
+        """Average change in score of some random moves, so that early on most moves are taken"""
+        changes = []
+        for _ in range(100):
+            move = self._randomMove()
+            if move == None:
+                continue
+            undo = self._undo(move)
+            (dReward, dViolation) = self._apply(move)
+            self._apply(undo)
+            change = abs(dReward - self.weight * dViolation)
+            if change > 0:
+                changes.append(change)
+        if len(changes) == 0:
+            return 1.0
+        return sum(changes) / len(changes)
+
+    def _randomMove(self):
+        """Picks a move (a list of (unit, group to move it to)) that relocates one unit or swaps two. None if the picked move isn't possible
+        Some moves are suggested by the terms (e.g. moving a student to the group of the rest of its pod), the others are random
+        """
+        random = self.random
+        if len(self.model.terms) > 0 and random.random() < 0.3:
+            suggestion = random.choice(self.model.terms).suggest(random, self.groupOf)
+            if suggestion == None:
+                return None
+            (i, b) = suggestion
+            return self._moveTo(self.unitOf[i], b, False)
+
+        u = random.randrange(len(self.units))
+        options = self.allowedList[u]
+        b = random.randrange(len(self.members)) if options == None else random.choice(options)
+        return self._moveTo(u, b, random.random() < 0.5)
+
+    def _moveTo(self, u, b, swap):
+        """A move that puts unit u into group b, swapping it with one of b's units if swap is True or b is full"""
+        a = self.unitGroup[u]
+        if b == a or (self.allowedSet[u] != None and not b in self.allowedSet[u]):
+            return None
+        if not swap and self.members[b] + len(self.units[u]) <= self.model.capacity[b]:
+            return [(u, b)]
+        if len(self.groupUnits[b]) == 0:
+            return None
+        w = self.random.choice(self.groupUnits[b])
+        if len(self.units[u]) != len(self.units[w]) or (self.allowedSet[w] != None and not a in self.allowedSet[w]):
+            return None
+        return [(u, b), (w, a)]
+
+    def _undo(self, move):
+        """The move that takes back move (call before making it)"""
+        return [(u, self.unitGroup[u]) for (u, b) in reversed(move)]
+
+    def _apply(self, move):
+        """Makes a move
+        :return: (change in reward, change in violation)
+        """
+        dReward = 0
+        dViolation = 0
+        for (u, b) in move:
+            (reward, violation) = self._moveUnit(u, b)
+            dReward += reward
+            dViolation += violation
+        return (dReward, dViolation)
+
+    def _moveUnit(self, u, b):
+        """Moves unit u into group b
+        :return: (change in reward, change in violation)
+        """
+        a = self.unitGroup[u]
+        size = len(self.units[u])
+        minsize = self.model.minsize
+        members = self.members
+
+        dViolation = -max(0, minsize[a] - members[a]) - max(0, minsize[b] - members[b])
+        members[a] -= size
+        members[b] += size
+        dViolation += max(0, minsize[a] - members[a]) + max(0, minsize[b] - members[b])
+
+        dReward = 0
+        for i in self.units[u]:
+            for term in self.model.watchers[i]:
+                (reward, violation) = term.value()
+                term.move(i, a, b)
+                (newReward, newViolation) = term.value()
+                dReward += newReward - reward
+                dViolation += newViolation - violation
+            self.groupOf[i] = b
+        self.unitGroup[u] = b
+
+        # Take u out of a's list (the last unit fills its place) and add it to b's
+        last = self.groupUnits[a].pop()
+        if last != u:
+            self.groupUnits[a][self.unitPos[u]] = last
+            self.unitPos[last] = self.unitPos[u]
+        self.unitPos[u] = len(self.groupUnits[b])
+        self.groupUnits[b].append(u)
+
+        self.reward += dReward
+        self.violation += dViolation
+        return (dReward, dViolation)
+
+class _Term(object):
+    """Part of the score that keeps its own counts up to date as students move (students and groups are given by index)"""
+    def __init__(self, required, partialReward, netReward):
+        self.required = required
+        self.partialReward = partialReward
+        self.netReward = netReward
+
+    def watched(self):
+        """Students whose moves change this term"""
+        return []
+
+    def reset(self, groupOf):
+        """Counts everything from scratch for the assignment groupOf (a list: student index ==> group index)"""
+        pass
+
+    def move(self, i, a, b):
+        """Student i moves from group a to group b"""
+        pass
+
+    def value(self):
+        """(reward, violation) of the current assignment"""
+        return (0, 0)
+
+    def suggest(self, random, groupOf):
+        """A move that might make this term better: (student index, group index), or None"""
+        return None
+
+    def maxReward(self):
+        """Most reward any assignment can get from this term"""
+        return 0
+
+    def rewardBound(self):
+        """Largest possible change in this term's reward"""
+        return 0
+
+    def _rewardBounds(self, numParts, netReachable):
+        """(maxReward, rewardBound) for a partial reward on each of numParts parts and a net reward"""
+        maxReward = max(0, self.partialReward) * numParts + (max(0, self.netReward) if netReachable else 0)
+        return (maxReward, abs(self.partialReward) * numParts + abs(self.netReward))
+
+class _StudentTerm(_Term):
+    def __init__(self, allowed, total, required, partialReward, netReward):
+        _Term.__init__(self, required, partialReward, netReward)
+        self.allowed = allowed
+        self.total = total
+        self.numSat = 0
+        self.studentList = list(allowed.keys())
+        self.allowedLists = dict((i, sorted(allowed[i])) for i in allowed)
+
+    def watched(self):
+        return self.allowed.keys()
+
+    def reset(self, groupOf):
+        self.numSat = len([i for i in self.allowed if groupOf[i] in self.allowed[i]])
+
+    def move(self, i, a, b):
+        self.numSat += (b in self.allowed[i]) - (a in self.allowed[i])
+
+    def suggest(self, random, groupOf):
+        # Move a student into one of its groups
+        if len(self.studentList) == 0:
+            return None
+        i = random.choice(self.studentList)
+        if groupOf[i] in self.allowed[i] or len(self.allowedLists[i]) == 0:
+            return None
+        return (i, random.choice(self.allowedLists[i]))
+
+    def value(self):
+        reward = self.numSat * self.partialReward
+        if self.numSat >= self.total:
+            reward += self.netReward
+        violation = len(self.allowed) - self.numSat if self.required else 0
+        return (reward, violation)
+
+    def maxReward(self):
+        return self._rewardBounds(len(self.allowed), len(self.allowed) >= self.total)[0]
+
+    def rewardBound(self):
+        return self._rewardBounds(len(self.allowed), True)[1]
+
+class _MinSimilarTerm(_Term):
+    def __init__(self, clickOf, cutoffs, numGroups, numStudents, required, partialReward, netReward):
+        _Term.__init__(self, required, partialReward, netReward)
+        self.clickOf = clickOf
+        self.cutoffs = cutoffs
+        self.numGroups = numGroups
+        self.numStudents = numStudents
+        self.numSat = 0
+        self.clickStudents = list(clickOf.keys())
+        self.clickMembers = {}
+        for (i, k) in clickOf.items():
+            self.clickMembers.setdefault(k, []).append(i)
+
+    def watched(self):
+        # Emptiness of the checked groups depends on every student
+        if len(self.cutoffs) == 0:
+            return []
+        return range(self.numStudents)
+
+    def reset(self, groupOf):
+        self.size = dict((j, 0) for j in self.cutoffs)
+        # click ==> {group: number of its students in the group}
+        self.counts = {}
+        for i in range(len(groupOf)):
+            j = groupOf[i]
+            if j in self.size:
+                self.size[j] += 1
+                k = self.clickOf.get(i)
+                if k != None:
+                    counts = self.counts.setdefault(k, {})
+                    counts[j] = counts.get(j, 0) + 1
+        # group ==> number of clicks with at least cutoff students in it
+        self.meeting = dict((j, 0) for j in self.cutoffs)
+        for counts in self.counts.values():
+            for (j, count) in counts.items():
+                if count >= self.cutoffs[j]:
+                    self.meeting[j] += 1
+        self.numSat = len([j for j in self.cutoffs if self._isSat(j)])
+
+    def _isSat(self, j):
+        return self.size[j] == 0 or self.meeting[j] > 0
+
+    def move(self, i, a, b):
+        k = self.clickOf.get(i)
+        for (j, step) in [(a, -1), (b, 1)]:
+            if not j in self.cutoffs:
+                continue
+            before = self._isSat(j)
+            self.size[j] += step
+            if k != None:
+                counts = self.counts.setdefault(k, {})
+                old = counts.get(j, 0)
+                counts[j] = old + step
+                self.meeting[j] += (old + step >= self.cutoffs[j]) - (old >= self.cutoffs[j])
+            self.numSat += self._isSat(j) - before
+
+    def suggest(self, random, groupOf):
+        # Move a student to the group of a similar student
+        if len(self.cutoffs) == 0 or len(self.clickStudents) == 0:
+            return None
+        i = random.choice(self.clickStudents)
+        b = groupOf[random.choice(self.clickMembers[self.clickOf[i]])]
+        if not b in self.cutoffs:
+            return None
+        return (i, b)
+
+    def value(self):
+        reward = self.numSat * self.partialReward
+        # Like the model, groups without a restriction count against the goal
+        if self.numSat >= self.numGroups:
+            reward += self.netReward
+        violation = self.numGroups - self.numSat if self.required else 0
+        return (reward, violation)
+
+    def maxReward(self):
+        return self._rewardBounds(len(self.cutoffs), len(self.cutoffs) >= self.numGroups)[0]
+
+    def rewardBound(self):
+        return self._rewardBounds(len(self.cutoffs), True)[1]
+
+class _MaxSimilarTerm(_Term):
+    def __init__(self, clickOf, cutoffs, required, partialReward, netReward):
+        _Term.__init__(self, required, partialReward, netReward)
+        self.clickOf = clickOf
+        self.cutoffs = cutoffs
+        self.clickStudents = list(clickOf.keys())
+        self.cutoffList = sorted(cutoffs)
+
+    def watched(self):
+        if len(self.cutoffs) == 0:
+            return []
+        return self.clickOf.keys()
+
+    def reset(self, groupOf):
+        self.counts = {}
+        for (i, k) in self.clickOf.items():
+            j = groupOf[i]
+            if j in self.cutoffs:
+                counts = self.counts.setdefault(k, {})
+                counts[j] = counts.get(j, 0) + 1
+        # group ==> number of students over the cutoff, summed over clicks
+        self.excess = dict((j, 0) for j in self.cutoffs)
+        for counts in self.counts.values():
+            for (j, count) in counts.items():
+                self.excess[j] += max(0, count - self.cutoffs[j])
+        self.totalExcess = sum(self.excess.values())
+        self.numSat = len([j for j in self.cutoffs if self.excess[j] == 0])
+
+    def move(self, i, a, b):
+        counts = self.counts.setdefault(self.clickOf[i], {})
+        for (j, step) in [(a, -1), (b, 1)]:
+            if not j in self.cutoffs:
+                continue
+            old = counts.get(j, 0)
+            counts[j] = old + step
+            change = max(0, old + step - self.cutoffs[j]) - max(0, old - self.cutoffs[j])
+            if change != 0:
+                wasSat = self.excess[j] == 0
+                self.excess[j] += change
+                self.totalExcess += change
+                self.numSat += (self.excess[j] == 0) - wasSat
+
+    def suggest(self, random, groupOf):
+        # Move a student out of a group that has too many students like it
+        if len(self.cutoffList) == 0 or len(self.clickStudents) == 0:
+            return None
+        i = random.choice(self.clickStudents)
+        j = groupOf[i]
+        if not j in self.cutoffs or self.counts[self.clickOf[i]][j] <= self.cutoffs[j]:
+            return None
+        return (i, random.choice(self.cutoffList))
+
+    def value(self):
+        reward = self.numSat * self.partialReward
+        if self.totalExcess == 0:
+            reward += self.netReward
+        violation = self.totalExcess if self.required else 0
+        return (reward, violation)
+
+    def maxReward(self):
+        return self._rewardBounds(len(self.cutoffs), True)[0]
+
+    def rewardBound(self):
+        return self._rewardBounds(len(self.cutoffs), True)[1]
+
+class _PodTerm(_Term):
+    def __init__(self, pods, required, partialReward, netReward):
+        _Term.__init__(self, required, partialReward, netReward)
+        self.pods = pods
+        # student index ==> pods it is in
+        self.podsOf = {}
+        for p in range(len(pods)):
+            for i in pods[p]:
+                self.podsOf.setdefault(i, []).append(p)
+        self.numSat = 0
+
+    def watched(self):
+        return self.podsOf.keys()
+
+    def reset(self, groupOf):
+        self.counts = []
+        self.numSat = 0
+        for pod in self.pods:
+            counts = {}
+            for i in pod:
+                counts[groupOf[i]] = counts.get(groupOf[i], 0) + 1
+            self.counts.append(counts)
+            # Empty pods are together
+            if len(counts) <= 1:
+                self.numSat += 1
+
+    def move(self, i, a, b):
+        for p in self.podsOf[i]:
+            counts = self.counts[p]
+            size = len(self.pods[p])
+            before = counts[a] == size
+            counts[a] -= 1
+            counts[b] = counts.get(b, 0) + 1
+            self.numSat += (counts[b] == size) - before
+
+    def suggest(self, random, groupOf):
+        # Move a student to the group of another student of its pod
+        if len(self.pods) == 0:
+            return None
+        pod = self.pods[random.randrange(len(self.pods))]
+        if len(pod) < 2:
+            return None
+        (i, other) = random.sample(pod, 2)
+        return (i, groupOf[other])
+
+    def value(self):
+        reward = self.numSat * self.partialReward
+        if self.numSat == len(self.pods):
+            reward += self.netReward
+        violation = len(self.pods) - self.numSat if self.required else 0
+        return (reward, violation)
+
+    def maxReward(self):
+        return self._rewardBounds(len(self.pods), True)[0]
+
+    def rewardBound(self):
+        return self._rewardBounds(len(self.pods), True)[1]
@@ -0,0 +1,434 @@
+import copy
+from array import array
+
+import numpy
+import scipy.sparse
+
+INF = float('inf')
+
+def _upperBound(cols, upBound):
+    """Upper bound of a sum of binary columns"""
+    if upBound != None and upBound < len(cols):
+        return upBound
+    return len(cols)
+
+class MatrixModel(object):
+    """A group membership problem stored as sparse coefficient arrays instead of one PuLP object per variable/constraint.
+    Columns [0, numMembers) are the membership variables (one per student/group pair, student by student), indicator variables are appended after them.
+    Every row is a range: rowLower <= A x <= rowUpper
+    :param students: a list of students (see Student.py)
+    :param groups: a list of groups (see Group.py)
+    :param allowed: {sid: gids} the groups each student may be placed in (see Sparse.py), or None if every pair is allowed.
+    Only allowed pairs get membership columns, the others all share one column fixed at 0
+    """
+    def __init__(self, students, groups, allowed=None):
+        self.students = students
+        self.groups = groups
+        self.numStudents = len(students)
+        self.numGroups = len(groups)
+
+        self.studentIndex = dict((students[i].id, i) for i in range(len(students)))
+        self.groupIndex = dict((groups[j].id, j) for j in range(len(groups)))
+
+        # Student and group index of each membership column
+        if allowed == None:
+            self.memberStudent = numpy.repeat(numpy.arange(self.numStudents), self.numGroups)
+            self.memberGroup = numpy.tile(numpy.arange(self.numGroups), self.numStudents)
+            self.memberCol = None
+        else:
+            pairs = [(i, j) for i in range(self.numStudents) for j in sorted(self.groupIndex[gid] for gid in allowed[students[i].id] if gid in self.groupIndex)]
+            self.memberStudent = numpy.array([i for (i, j) in pairs], dtype=int)
+            self.memberGroup = numpy.array([j for (i, j) in pairs], dtype=int)
+            # (sid, gid) ==> membership column
+            self.memberCol = dict(((students[pairs[k][0]].id, groups[pairs[k][1]].id), k) for k in range(len(pairs)))
+        self.numMembers = len(self.memberStudent)
+        self.zeroCol = None
+
+        # Columns (all integer)
+        self.numVars = self.numMembers
+        self.colLower = array('d', [0.0]) * self.numVars
+        self.colUpper = array('d', [1.0]) * self.numVars
+        self.objective = array('d', [0.0]) * self.numVars
+
+        # Rows in coordinate format
+        self.numRows = 0
+        self.rowInd = array('i')
+        self.colInd = array('i')
+        self.coefs = array('d')
+        self.rowLower = array('d')
+        self.rowUpper = array('d')
+        # Column each row defines (rows made by the indicator helpers), or -1
+        self.rowDefines = array('i')
+
+        self.notInUse = {}
+        self._addBaseConstraints()
+
+    def copy(self):
+        """Returns a copy that can be extended without changing this model (arrays are copied, lookups are shared)"""
+        other = copy.copy(self)
+        for attr in ['colLower', 'colUpper', 'objective', 'rowInd', 'colInd', 'coefs', 'rowLower', 'rowUpper', 'rowDefines']:
+            setattr(other, attr, getattr(self, attr)[:])
+        return other
+
+    def getVar(self, sid, gid):
+        """Get the column of the membership variable for student sid in group gid (the column fixed at 0 if the student can't be placed in that group)"""
+        if self.memberCol == None:
+            return self.studentIndex[sid] * self.numGroups + self.groupIndex[gid]
+        return self.memberCol.get((sid, gid), self.zeroCol)
+
+    def getNotInUseVar(self, gid):
+        """Get the column of the variable that is 1 only if group gid is empty"""
+        return self.notInUse[gid]
+
+    def _addBaseConstraints(self):
+        """Adds the student and group constraints (see Student.genConstraints and Group.genConstraints) in bulk"""
+        numStudents = self.numStudents
+        numGroups = self.numGroups
+        numMembers = self.numMembers
+        memberCols = numpy.arange(numMembers)
+
+        # Forbidden pairs all point at one column that can only be 0
+        if self.memberCol != None:
+            self.zeroCol = self.addBoolVar()
+            self.colUpper[self.zeroCol] = 0.0
+
+        # Each student must be in exactly one group
+        self._addRows(self.memberStudent, memberCols, numpy.ones(numMembers), numpy.ones(numStudents), numpy.ones(numStudents))
+
+        # Constrain size of groups
+        sized = [j for j in range(numGroups) if self.groups[j].size != None or (self.groups[j].minsize != None and self.groups[j].minsize != 0)]
+        if len(sized) > 0:
+            sizedRow = numpy.repeat(-1, numGroups)
+            sizedRow[sized] = numpy.arange(len(sized))
+            inSized = sizedRow[self.memberGroup] >= 0
+            lower = [self.groups[j].minsize or 0 for j in sized]
+            upper = [INF if self.groups[j].size == None else self.groups[j].size for j in sized]
+            self._addRows(sizedRow[self.memberGroup[inSized]], memberCols[inSized], numpy.ones(int(inSized.sum())), lower, upper)
+
+        # Add "not in use" variables: v is 1 if sum(memberships) <= 0 (see boolFromUpperBound)
+        notInUseCols = numpy.arange(self.numVars, self.numVars + numGroups)
+        self._addCols(numGroups)
+        membersOf = numpy.bincount(self.memberGroup, minlength=numGroups)
+        upper = numpy.array([_upperBound(range(membersOf[j]), self.groups[j].size) for j in range(numGroups)], dtype=float)
+        cols = numpy.concatenate([memberCols, notInUseCols])
+        rows = numpy.concatenate([self.memberGroup, numpy.arange(numGroups)])
+        # v = 1 => sum <= 0
+        self._addRows(rows, cols, numpy.concatenate([numpy.ones(numMembers), upper]), numpy.repeat(-INF, numGroups), upper, notInUseCols)
+        # v = 0 => sum >= 1
+        self._addRows(rows, cols, numpy.ones(len(cols)), numpy.ones(numGroups), numpy.repeat(INF, numGroups), notInUseCols)
+        for j in range(numGroups):
+            self.notInUse[self.groups[j].id] = int(notInUseCols[j])
+
+    def _addCols(self, count):
+        """Appends count binary columns"""
+        self.colLower.extend(array('d', [0.0]) * count)
+        self.colUpper.extend(array('d', [1.0]) * count)
+        self.objective.extend(array('d', [0.0]) * count)
+        self.numVars += count
+
+    def _addRows(self, rows, cols, vals, lower, upper, defines=None):
+        """Appends a block of rows. rows are numbered from 0 within the block
+        :param defines: the column each row defines (None if the rows don't define indicators)
+        """
+        self.rowInd.extend((numpy.asarray(rows) + self.numRows).tolist())
+        self.colInd.extend(numpy.asarray(cols).tolist())
+        self.coefs.extend(numpy.asarray(vals, dtype=float).tolist())
+        self.rowLower.extend(numpy.asarray(lower, dtype=float).tolist())
+        self.rowUpper.extend(numpy.asarray(upper, dtype=float).tolist())
+        if defines is None:
+            self.rowDefines.extend(array('i', [-1]) * len(lower))
+        else:
+            self.rowDefines.extend(numpy.asarray(defines).tolist())
+        self.numRows += len(lower)
+
+    def addRow(self, cols, coefs, lower, upper, defines=-1):
+        """Adds the row lower <= sum(coefs[i] * cols[i]) <= upper
+        :param defines: the indicator column this row sets the value of, if any
+        """
+        self.rowInd.extend([self.numRows] * len(cols))
+        self.colInd.extend(cols)
+        self.coefs.extend(coefs)
+        self.rowLower.append(lower)
+        self.rowUpper.append(upper)
+        self.rowDefines.append(defines)
+        self.numRows += 1
+
+    def addBoolVar(self):
+        """Adds a binary column and returns its index"""
+        self._addCols(1)
+        return self.numVars - 1
+
+    ### Indicator helpers (same semantics as LPHelpers, but sums are given as lists of binary columns, so 0 <= sum(cols) <= len(cols))
+
+    def boolFromLowerBound(self, cols, lowBound, upBound=None):
+        """Creates a column v: v is 1 if sum(cols) >= lowBound
+        :param upBound: a known upper bound of sum(cols) (e.g. the size of a group)
+        """
+        upper = _upperBound(cols, upBound)
+        v = self.addBoolVar()
+        cols = list(cols) + [v]
+        ones = [1.0] * (len(cols) - 1)
+        # v = 1 => sum >= lowBound, v = 0 => sum <= lowBound - 1
+        self.addRow(cols, ones + [-lowBound], 0, INF, v)
+        self.addRow(cols, ones + [lowBound - 1 - upper], -INF, lowBound - 1, v)
+        return v
+
+    def boolFromUpperBound(self, cols, upperBound, upBound=None):
+        """Creates a column v: v is 1 if sum(cols) <= upperBound
+        :param upBound: a known upper bound of sum(cols) (e.g. the size of a group)
+        """
+        upper = _upperBound(cols, upBound)
+        v = self.addBoolVar()
+        cols = list(cols) + [v]
+        ones = [1.0] * (len(cols) - 1)
+        # v = 1 => sum <= upperBound, v = 0 => sum >= upperBound + 1
+        self.addRow(cols, ones + [upper - upperBound], -INF, upper, v)
+        self.addRow(cols, ones + [upperBound + 1], upperBound + 1, INF, v)
+        return v
+
+    def boolOr(self, varA, varB):
+        """Creates a column v: v is 1 if varA == 1 or varB == 1"""
+        v = self.addBoolVar()
+        self.addRow([varA, varB, v], [1.0, 1.0, -1.0], 0, INF, v)
+        self.addRow([varA, varB, v], [1.0, 1.0, -2.0], -INF, 0, v)
+        return v
+
+    def requireTrue(self, col):
+        """Requires that column col == 1"""
+        self.colLower[col] = 1.0
+
+    def addReward(self, col, reward):
+        """Adds reward to the objective for column col"""
+        self.objective[col] += reward
+
+    ### Presolve (same reductions as Presolve.py)
+
+    def presolve(self):
+        """Drops rows that always hold, duplicate rows, and indicator columns that no other row or the objective uses (with the rows defining them).
+        Membership columns (and the column fixed at 0) are never dropped, so getVar and getAssignment keep working
+        :return: {'variables': n, 'constraints': n, 'removedVariables': n, 'removedConstraints': n} (counts before presolve)
+        """
+        numVars = self.numVars
+        numRows = self.numRows
+        A = self.toCSR()
+        A.sort_indices()
+        colLower = numpy.frombuffer(self.colLower, dtype=float)
+        colUpper = numpy.frombuffer(self.colUpper, dtype=float)
+        objective = numpy.frombuffer(self.objective, dtype=float)
+        rowDefines = numpy.frombuffer(self.rowDefines, dtype=numpy.intc)
+
+        # Rows that hold for every value of their columns
+        positive = A.maximum(0)
+        negative = A.minimum(0)
+        minActivity = positive.dot(colLower) + negative.dot(colUpper)
+        maxActivity = positive.dot(colUpper) + negative.dot(colLower)
+        keepRow = ~((minActivity >= numpy.frombuffer(self.rowLower, dtype=float)) & (maxActivity <= numpy.frombuffer(self.rowUpper, dtype=float)))
+
+        # Duplicate rows
+        seen = set()
+        for i in numpy.nonzero(keepRow)[0]:
+            (start, end) = (A.indptr[i], A.indptr[i + 1])
+            key = (rowDefines[i], self.rowLower[i], self.rowUpper[i], A.indices[start:end].tobytes(), A.data[start:end].tobytes())
+            if key in seen:
+                keepRow[i] = False
+            else:
+                seen.add(key)
+
+        # Indicators nothing depends on: uses counts rows other than a column's own definition
+        coo = A.tocoo()
+        counted = keepRow[coo.row] & (rowDefines[coo.row] != coo.col)
+        uses = numpy.bincount(coo.col[counted], minlength=numVars)
+        free = (objective == 0) & (colLower == 0)
+        definedBy = {}
+        for i in numpy.nonzero(keepRow & (rowDefines >= 0))[0]:
+            definedBy.setdefault(int(rowDefines[i]), []).append(i)
+        unused = [col for col in definedBy if uses[col] == 0 and free[col]]
+        while len(unused) > 0:
+            col = unused.pop()
+            for i in definedBy.pop(col):
+                keepRow[i] = False
+                for other in A.indices[A.indptr[i]:A.indptr[i + 1]]:
+                    if other == col:
+                        continue
+                    uses[other] -= 1
+                    if uses[other] == 0 and free[other] and other in definedBy:
+                        unused.append(int(other))
+
+        # Keep membership columns, columns in a remaining row, and columns with a reward
+        keepCol = numpy.zeros(numVars, dtype=bool)
+        keepCol[:self.numMembers] = True
+        if self.zeroCol != None:
+            keepCol[self.zeroCol] = True
+        keepCol[coo.col[keepRow[coo.row]]] = True
+        keepCol[objective != 0] = True
+        self._compact(keepRow, keepCol)
+
+        return {
+            'variables': numVars,
+            'constraints': numRows,
+            'removedVariables': numVars - self.numVars,
+            'removedConstraints': numRows - self.numRows
+        }
+
+    def _compact(self, keepRow, keepCol):
+        """Removes the rows and columns that aren't kept and renumbers the rest"""
+        newCol = numpy.cumsum(keepCol) - 1
+        newRow = numpy.cumsum(keepRow) - 1
+        rowInd = numpy.frombuffer(self.rowInd, dtype=numpy.intc)
+        colInd = numpy.frombuffer(self.colInd, dtype=numpy.intc)
+        keepEntry = keepRow[rowInd]
+        rowDefines = numpy.frombuffer(self.rowDefines, dtype=numpy.intc)[keepRow]
+        rowDefines = numpy.where((rowDefines >= 0) & keepCol[rowDefines], newCol[rowDefines], -1)
+
+        self.rowInd = array('i', newRow[rowInd[keepEntry]].tolist())
+        self.colInd = array('i', newCol[colInd[keepEntry]].tolist())
+        self.coefs = array('d', numpy.frombuffer(self.coefs, dtype=float)[keepEntry].tolist())
+        self.rowLower = array('d', numpy.frombuffer(self.rowLower, dtype=float)[keepRow].tolist())
+        self.rowUpper = array('d', numpy.frombuffer(self.rowUpper, dtype=float)[keepRow].tolist())
+        self.rowDefines = array('i', rowDefines.tolist())
+        self.numRows = int(keepRow.sum())
+
+        for attr in ['colLower', 'colUpper', 'objective']:
+            setattr(self, attr, array('d', numpy.frombuffer(getattr(self, attr), dtype=float)[keepCol].tolist()))
+        self.numVars = int(keepCol.sum())
+
+        # The lookup is shared with the model this was copied from
+        self.notInUse = dict((gid, int(newCol[col])) for (gid, col) in self.notInUse.items() if keepCol[col])
+
+    ### Export
+
+    def toCSR(self):
+        """Returns the constraint matrix A as a scipy.sparse.csr_matrix"""
+        return scipy.sparse.csr_matrix(
+            (numpy.frombuffer(self.coefs, dtype=float), (numpy.frombuffer(self.rowInd, dtype=numpy.intc), numpy.frombuffer(self.colInd, dtype=numpy.intc))),
+            shape=(self.numRows, self.numVars))
+
+    def writeMPS(self, filename):
+        """Writes the model to an MPS file (columns are named C0000000, ..., rows R0000000, ...)"""
+        A = self.toCSR().tocsc()
+        indptr = A.indptr
+        indices = A.indices
+        data = A.data
+
+        lines = ['NAME          MODEL', 'ROWS', ' N  OBJ']
+        for i in range(self.numRows):
+            lo = self.rowLower[i]
+            hi = self.rowUpper[i]
+            if lo == hi:
+                sense = 'E'
+            elif lo == -INF:
+                sense = 'L'
+            else:
+                sense = 'G'
+            lines.append(' %s  R%07d' % (sense, i))
+
+        lines.append('COLUMNS')
+        lines.append("    MARK      'MARKER'                 'INTORG'")
+        for j in range(self.numVars):
+            name = 'C%07d' % j
+            for k in range(indptr[j], indptr[j + 1]):
+                lines.append('    %s  R%07d  % .12e' % (name, indices[k], data[k]))
+            # A column in no row is still declared, so its bounds can be read
+            if self.objective[j] != 0 or indptr[j] == indptr[j + 1]:
+                lines.append('    %s  OBJ       % .12e' % (name, self.objective[j]))
+        lines.append("    MARK      'MARKER'                 'INTEND'")
+
+        lines.append('RHS')
+        ranges = []
+        for i in range(self.numRows):
+            lo = self.rowLower[i]
+            hi = self.rowUpper[i]
+            rhs = hi if lo == -INF else lo
+            if rhs != 0:
+                lines.append('    RHS       R%07d  % .12e' % (i, rhs))
+            if lo != hi and lo != -INF and hi != INF:
+                ranges.append('    RNG       R%07d  % .12e' % (i, hi - lo))
+        if len(ranges) > 0:
+            lines.append('RANGES')
+            lines += ranges
+
+        lines.append('BOUNDS')
+        for j in range(self.numVars):
+            if self.colLower[j] != 0:
+                lines.append(' LO BND       C%07d  % .12e' % (j, self.colLower[j]))
+            lines.append(' UP BND       C%07d  % .12e' % (j, self.colUpper[j]))
+        lines.append('ENDATA')
+
+        with open(filename, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def startValues(self, assignment):
+        """Column values for the given memberships: indicator columns get the value their defining rows allow (they only depend on earlier columns)
+        :param assignment: a list of (sid, gid) memberships
+        :return: array of column values
+        """
+        values = numpy.zeros(self.numVars)
+        for (sid, gid) in assignment:
+            values[self.getVar(sid, gid)] = 1
+
+        A = self.toCSR()
+        indptr = A.indptr
+        indices = A.indices
+        data = A.data
+        rowDefines = numpy.frombuffer(self.rowDefines, dtype=numpy.intc)
+        definingRows = numpy.nonzero(rowDefines >= 0)[0]
+        definingRows = definingRows[numpy.argsort(rowDefines[definingRows], kind='mergesort')]
+
+        k = 0
+        while k < len(definingRows):
+            col = rowDefines[definingRows[k]]
+            rows = []
+            while k < len(definingRows) and rowDefines[definingRows[k]] == col:
+                rows.append(definingRows[k])
+                k += 1
+            for value in [self.colLower[col], self.colUpper[col]]:
+                values[col] = value
+                if all(self.rowLower[i] - 1e-9 <= numpy.dot(data[indptr[i]:indptr[i + 1]], values[indices[indptr[i]:indptr[i + 1]]]) <= self.rowUpper[i] + 1e-9 for i in rows):
+                    break
+        return values
+
+    def writeStart(self, filename, assignment):
+        """Writes a CBC MIP start file for the given memberships (see startValues)"""
+        values = self.startValues(assignment)
+        lines = ['Feasible - objective value ' + str(self.getReward(values))]
+        for j in range(self.numVars):
+            lines.append('%d C%07d %d' % (j, j, round(values[j])))
+        with open(filename, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def readCBCSolution(self, filename):
+        """Reads a CBC solution file written for a model from writeMPS
+        :return: (first line of the file, array of column values)
+        """
+        values = numpy.zeros(self.numVars)
+        with open(filename) as f:
+            firstLine = f.readline().strip()
+            for line in f:
+                parts = line.split()
+                if len(parts) == 0:
+                    break
+                if parts[0] == '**':
+                    parts = parts[1:]
+                if parts[1][0] == 'C':
+                    values[int(parts[1][1:])] = float(parts[2])
+        return (firstLine, values)
+
+    def getReward(self, values):
+        """Objective value of the given column values"""
+        return float(numpy.dot(numpy.frombuffer(self.objective, dtype=float), values))
+
+    def getAssignment(self, values):
+        """Decodes solved column values into a list of (sid, gid) memberships"""
+        assignment = []
+        memberships = numpy.nonzero(values[:self.numMembers] > 0.5)[0]
+        for col in memberships:
+            assignment.append((self.students[self.memberStudent[col]].id, self.groups[self.memberGroup[col]].id))
+        return assignment
+
+    def describeColumns(self):
+        """Describes the columns of the MPS file from writeMPS, so its solution can be read without this model (see ModelCache.py)
+        :return: (members, objective) where members is [(column name, sid, gid)] and objective is [(column name, reward)] of the columns with a reward
+        """
+        members = [('C%07d' % col, self.students[self.memberStudent[col]].id, self.groups[self.memberGroup[col]].id) for col in range(self.numMembers)]
+        objective = [('C%07d' % col, self.objective[col]) for col in range(self.numVars) if self.objective[col] != 0]
+        return (members, objective)
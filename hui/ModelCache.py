@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import tempfile
+import Utils
+from Stats import NO_STATS
+
+# MODEL CACHE
+# Building a model (mostly generating the goals' constraints) is repeated every time the same problem is run.
+# With a cache directory, each model handed to CBC is also written there as an MPS file, next to a JSON file that maps its columns back to students and groups.
+# Models are keyed by a hash of everything they're built from: the students and groups (with their ids and the order of the run), the goals and the settings
+# that change the model. A later run of the same problem solves the stored file directly. The order orders the columns, so runs that shuffle them rarely hit.
+
+# Changes when the stored files or the key change
+FORMAT = 2
+
+def _canonical(obj):
+    """A string that is the same for objects built the same way (dicts and sets in any order, objects by their class and attributes)"""
+    if isinstance(obj, dict):
+        return '{' + ','.join(sorted(_canonical(k) + ':' + _canonical(obj[k]) for k in obj)) + '}'
+    if isinstance(obj, (set, frozenset)):
+        return 'set(' + ','.join(sorted(_canonical(item) for item in obj)) + ')'
+    if isinstance(obj, (list, tuple)):
+        return '[' + ','.join(_canonical(item) for item in obj) + ']'
+    if hasattr(obj, '__dict__'):
+        return type(obj).__name__ + _canonical(obj.__dict__)
+    return repr(obj)
+
+def _writeAtomically(path, write):
+    """Calls write(tmpPath) and moves the file to path, so other processes never read a partly written file"""
+    (fd, tmpPath) = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    os.close(fd)
+    try:
+        write(tmpPath)
+        os.rename(tmpPath, path)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+
+class ModelCache(object):
+    """A directory of solved models, keyed by a hash of the problem they were built from
+    :param directory: where models are stored (created if it doesn't exist)
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, dataBox, goals, settings):
+        """Hash of the model built from the students and groups of dataBox, the goals, and settings (anything else that changes the model)"""
+        content = [FORMAT, settings,
+            [(student.id, student.order, student.info) for student in dataBox.getStudents()],
+            [(group.id, group.order, group.size, group.minsize, group.info) for group in dataBox.getGroups()],
+            goals]
+        return hashlib.sha1(_canonical(content)).hexdigest()
+
+    def _paths(self, key):
+        """(MPS file, column map file) of a key"""
+        return (os.path.join(self.directory, key + '.mps'), os.path.join(self.directory, key + '.json'))
+
+    def solve(self, key, solver, stats=NO_STATS):
+        """Solves the model stored under key with the solver settings (see Solver.solveMPS)
+        :param stats: the Stats of the goal group, which get the solver's peak memory
+        :return: (status, reward, [(sid, gid), ...], timedOut, info) like GroupCreator._solveModel, or None if no model is stored under key
+        """
+        (mpsFile, mapFile) = self._paths(key)
+        # The map is written last, so the model is complete if it's there
+        if not os.path.exists(mapFile):
+            return None
+        with open(mapFile) as f:
+            columns = json.load(f)
+
+        info = {'modelCache': True}
+        (status, values, timedOut, solverPeak) = solver.solveMPS(mpsFile)
+        stats.setSolverMemory(solverPeak)
+        if values == None:
+            return (status, None, [], timedOut, info)
+        assignment = [(sid, gid) for (name, sid, gid) in columns['members'] if values.get(name, 0) > 0.5]
+        reward = columns['constant'] + sum(coef * values.get(name, 0) for (name, coef) in columns['objective'])
+        return (status, reward, assignment, timedOut, info)
+
+    def _store(self, key, writeMPS, describeColumns):
+        """Writes the MPS file with writeMPS(path), then the map of its columns from describeColumns() = (members, objective, constant)"""
+        (mpsFile, mapFile) = self._paths(key)
+        _writeAtomically(mpsFile, writeMPS)
+        (members, objective, constant) = describeColumns()
+        def writeMap(path):
+            with open(path, 'w') as f:
+                json.dump({'members': members, 'objective': objective, 'constant': constant}, f)
+        _writeAtomically(mapFile, writeMap)
+
+    def storePulp(self, key, problem):
+        """Stores a PuLP problem that is about to be solved under key"""
+        # Columns are renamed like PuLP does for CBC, which can't read every name PuLP allows
+        names = {}
+        def writeMPS(path):
+            names.update(problem.writeMPS(path, rename=1)[1])
+        def describeColumns():
+            members = []
+            for variable in problem.variables():
+                if variable.name == '__dummy':
+                    continue
+                ret = Utils.decodeVarName(variable.name)
+                if ret != None and variable.name in names:
+                    members.append((names[variable.name],) + tuple(ret))
+            objective = [(names[variable.name], coef) for (variable, coef) in problem.objective.items() if variable.name in names]
+            return (members, objective, problem.objective.constant)
+        self._store(key, writeMPS, describeColumns)
+
+    def storeMatrix(self, key, model):
+        """Stores a MatrixModel that is about to be solved under key"""
+        (members, objective) = model.describeColumns()
+        self._store(key, model.writeMPS, lambda: (members, objective, 0))
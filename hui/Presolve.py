@@ -0,0 +1,166 @@
+import pulp
+from LPHelpers import DEFINES
+
+# MODEL PRESOLVE
+# Shrinks a PuLP problem before it is handed to the solver without changing its solutions:
+# - helper variables fixed by their own definition (e.g. reward variables with a reward of 0) are substituted out
+# - constraints that hold for every value of their variables are dropped
+# - duplicate constraints are dropped
+# - helper variables (see LPHelpers.py) that no other constraint or the objective uses are dropped along with the constraints defining them
+# Constraints of the base problem are shared by reference between goal groups, so they are replaced, never modified
+
+def presolveProblem(problem):
+    """Presolves problem in place
+    :return: {'variables': n, 'constraints': n, 'removedVariables': n, 'removedConstraints': n} (counts before presolve)
+    """
+    numVars = len(problem.variables())
+    numConstraints = len(problem.constraints)
+
+    fixed = _substituteFixed(problem)
+    _dropDuplicates(problem)
+    _dropUnusedHelpers(problem)
+
+    # PuLP remembers every variable it has seen, forget the ones that are gone
+    problem._variables = []
+    problem._variable_ids = {}
+    remainingVars = len(problem.variables())
+
+    return {
+        'variables': numVars,
+        'constraints': numConstraints,
+        'removedVariables': numVars - remainingVars,
+        'removedConstraints': numConstraints - len(problem.constraints)
+    }
+
+def _definedVar(constraintName):
+    """Name of the helper variable a constraint defines, or None"""
+    if constraintName == None or not DEFINES in constraintName:
+        return None
+    return constraintName[:constraintName.rindex(DEFINES)]
+
+def _reduce(expression, fixed):
+    """Substitutes fixed variables into expression and drops zero coefficients
+    :return: (terms, constant, changed) where terms is a list of (variable, coefficient)
+    """
+    terms = []
+    constant = expression.constant
+    changed = False
+    for (var, coef) in expression.items():
+        if var.name in fixed:
+            constant += coef * fixed[var.name]
+            changed = True
+        elif coef == 0:
+            changed = True
+        else:
+            terms.append((var, coef))
+    return (terms, constant, changed)
+
+def _activity(terms, constant):
+    """(lower, upper) bounds of sum(terms) + constant from the bounds of the variables"""
+    lower = constant
+    upper = constant
+    for (var, coef) in terms:
+        varLower = float('-inf') if var.lowBound == None else var.lowBound
+        varUpper = float('inf') if var.upBound == None else var.upBound
+        if coef > 0:
+            lower += coef * varLower
+            upper += coef * varUpper
+        else:
+            lower += coef * varUpper
+            upper += coef * varLower
+    return (lower, upper)
+
+def _alwaysHolds(terms, constant, sense):
+    """True if (sum(terms) + constant) sense 0 holds for every value of the variables"""
+    (lower, upper) = _activity(terms, constant)
+    if sense == pulp.LpConstraintGE:
+        return lower >= 0
+    if sense == pulp.LpConstraintLE:
+        return upper <= 0
+    return lower == 0 and upper == 0
+
+def _canFix(var, value):
+    """True if var may take value"""
+    if var.lowBound != None and value < var.lowBound:
+        return False
+    if var.upBound != None and value > var.upBound:
+        return False
+    return var.cat == pulp.LpContinuous or value == int(value)
+
+def _substituteFixed(problem):
+    """Fixes helper variables that their definition pins to one value, substitutes them out and drops constraints that always hold
+    :return: {variable name: value} of the fixed variables
+    """
+    constraints = problem.constraints
+    fixed = {}
+    changed = True
+    while changed:
+        changed = False
+        for name in list(constraints.keys()):
+            constraint = constraints[name]
+            (terms, constant, reduced) = _reduce(constraint, fixed)
+
+            # e.g. reward == 0 * v
+            if len(terms) == 1 and constraint.sense == pulp.LpConstraintEQ and terms[0][0].name == _definedVar(name):
+                (var, coef) = terms[0]
+                value = -constant / float(coef)
+                if _canFix(var, value):
+                    fixed[var.name] = value
+                    del constraints[name]
+                    changed = True
+                    continue
+
+            if _alwaysHolds(terms, constant, constraint.sense):
+                del constraints[name]
+            elif reduced:
+                constraints[name] = pulp.LpConstraint(pulp.LpAffineExpression(terms, constant), constraint.sense, name)
+
+    if len(fixed) > 0 and problem.objective is not None:
+        (terms, constant, reduced) = _reduce(problem.objective, fixed)
+        objective = pulp.LpAffineExpression(terms, constant)
+        objective.name = problem.objective.name
+        problem.objective = objective
+    return fixed
+
+def _dropDuplicates(problem):
+    """Drops constraints identical to an earlier one"""
+    constraints = problem.constraints
+    seen = set()
+    for name in list(constraints.keys()):
+        constraint = constraints[name]
+        key = (_definedVar(name), constraint.sense, constraint.constant, frozenset((var.name, coef) for (var, coef) in constraint.items()))
+        if key in seen:
+            del constraints[name]
+        else:
+            seen.add(key)
+
+def _dropUnusedHelpers(problem):
+    """Drops helper variables that only appear in their own definition, then any helpers that were only used by those, and so on"""
+    constraints = problem.constraints
+
+    # helper variable name ==> names of the constraints defining it
+    definedBy = {}
+    # variable name ==> number of uses outside its own definition
+    uses = {}
+    for (name, constraint) in constraints.items():
+        defined = _definedVar(name)
+        if defined != None:
+            definedBy.setdefault(defined, []).append(name)
+        for (var, coef) in constraint.items():
+            if var.name != defined:
+                uses[var.name] = uses.get(var.name, 0) + 1
+    if problem.objective is not None:
+        for (var, coef) in problem.objective.items():
+            uses[var.name] = uses.get(var.name, 0) + 1
+
+    unused = [name for name in definedBy if uses.get(name, 0) == 0]
+    while len(unused) > 0:
+        defined = unused.pop()
+        for name in definedBy.pop(defined):
+            for (var, coef) in constraints[name].items():
+                if var.name == defined:
+                    continue
+                uses[var.name] -= 1
+                if uses[var.name] == 0 and var.name in definedBy:
+                    unused.append(var.name)
+            del constraints[name]
@@ -0,0 +1,109 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+from ModelCache import _canonical, _writeAtomically
+
+# RESULT CACHE
+# With determinateSolution, createGroups gives the same output every time it's called with the same students, groups, goal groups and settings.
+# A result cache keeps the outputs of recent runs in memory, keyed by a hash of everything they're computed from. When it's full, the least recently used output is dropped.
+# With a directory, outputs are also stored there as JSON files, so they outlive the process and can be shared by several processes.
+# Outputs are kept as positions of students and groups, so a hit gives back the infos of the call that asked for it.
+
+# Changes when the stored files or the key change
+FORMAT = 1
+
+def _encode(output, studentInfos):
+    """output with its groups as lists of student positions in studentInfos (an info listed twice gets both of its positions)"""
+    positions = {}
+    for k in range(len(studentInfos)):
+        positions.setdefault(id(studentInfos[k]), []).append(k)
+    entry = dict((name, output[name]) for name in output if name != 'groups')
+    entry['logs'] = list(output['logs'])
+    entry['groups'] = None
+    if output['groups'] != None:
+        entry['groups'] = [[positions[id(info)].pop(0) for info in group['students']] for group in output['groups']]
+    return entry
+
+def _decode(entry, studentInfos, groupInfos):
+    """A new output from an encoded one (see _encode), with the infos given"""
+    output = dict((str(name), entry[name]) for name in entry if name != 'groups')
+    output['logs'] = list(entry['logs'])
+    output['groups'] = None
+    if entry['groups'] != None:
+        # Output groups are the groups with room, in order (see GroupCreator._collectResults)
+        groupInfos = [info for info in groupInfos if not ('size' in info and info['size'] == 0)]
+        output['groups'] = [{'students': [studentInfos[k] for k in entry['groups'][index]], 'info': groupInfos[index]} for index in range(len(groupInfos))]
+    return output
+
+class ResultCache(object):
+    """Outputs of earlier createGroups calls, keyed by a hash of the students, groups, goal groups and settings they were computed from.
+    One cache can be shared by several group creators (and, through its directory, by several processes)
+    :param maxSize: number of outputs kept in memory. Default: 128
+    :param directory: where outputs are also stored (created if it doesn't exist). Default: None (memory only)
+    """
+    def __init__(self, maxSize=128, directory=None):
+        if maxSize < 1:
+            raise ValueError('maxSize must be at least 1')
+        self.maxSize = maxSize
+        self.directory = directory
+        if directory != None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # key ==> encoded output, least recently used first
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, studentInfos, groupInfos, goalGroups, settings):
+        """Hash of the output computed from the infos, the goal groups, and settings (anything else that changes the output)"""
+        content = [FORMAT, settings, studentInfos, groupInfos, goalGroups]
+        return hashlib.sha1(_canonical(content)).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def _remember(self, key, entry):
+        """Keeps entry in memory as the most recently used one"""
+        self.entries.pop(key, None)
+        self.entries[key] = entry
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def get(self, key, studentInfos, groupInfos):
+        """The output stored under key, with the infos given, or None if there's none"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry == None and self.directory != None and os.path.exists(self._path(key)):
+                with open(self._path(key)) as f:
+                    entry = json.load(f)
+            if entry == None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, entry)
+        return _decode(entry, studentInfos, groupInfos)
+
+    def put(self, key, output, studentInfos):
+        """Stores the output computed from studentInfos under key"""
+        entry = _encode(output, studentInfos)
+        with self.lock:
+            self._remember(key, entry)
+        if self.directory != None:
+            def write(path):
+                with open(path, 'w') as f:
+                    json.dump(entry, f)
+            _writeAtomically(self._path(key), write)
+
+    def stats(self):
+        """{'hits': number of outputs found, 'misses': number of outputs not found, 'size': number of outputs in memory}"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+    def clear(self):
+        """Forgets every output in memory (stored files are kept) and resets the counters"""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,253 @@
+import copy
+import errno
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import pulp
+from Stats import peakMemory, maxrssMB
+
+# Solvers that can be chosen with Solver(backend=...)
+BACKENDS = ['cbc', 'glpk']
+
+# CBC's first solution line ==> PuLP status string
+CBC_STATUS = {
+    'Optimal': 'Optimal',
+    'Infeasible': 'Infeasible',
+    'Integer': 'Infeasible',
+    'Unbounded': 'Unbounded',
+    'Stopped': 'Not Solved'
+}
+
+# Objective value on the first line of a CBC solution file (the reward, since the model is maximized)
+CBC_OBJECTIVE = re.compile(r'objective value (\S+)')
+
+# CBC log line of a new best solution (CBC minimizes, so the value is minus the reward)
+CBC_INCUMBENT = re.compile(r'Cbc00(?:04|12)I Integer solution of (\S+) found')
+
+class Solver(object):
+    """Settings for the MIP solver that is run on every goal group
+    :param backend: 'cbc' (default) or 'glpk'
+    :param timeLimit: seconds allowed per goal group. If the limit is hit, the best groups found so far are used. Default: no limit
+    :param gap: relative MIP gap at which the solver may stop. Default: solver default
+    :param threads: number of threads the solver may use (ignored by glpk). Default: solver default
+    :param presolve: True/False turns the solver's presolve on/off. Default: solver default
+    :param msg: if True, the solver prints its log. Default: PuLP's default
+    """
+    def __init__(self, backend='cbc', timeLimit=None, gap=None, threads=None, presolve=None, msg=None):
+        if not backend in BACKENDS:
+            raise ValueError('backend must be one of: ' + ', '.join(BACKENDS))
+        if timeLimit != None and timeLimit <= 0:
+            raise ValueError('timeLimit must be positive')
+        if threads != None and threads < 1:
+            raise ValueError('threads must be at least 1')
+
+        self.backend = backend
+        self.timeLimit = timeLimit
+        self.gap = gap
+        self.threads = threads
+        self.presolve = presolve
+        self.msg = msg
+
+    def withTimeLimit(self, timeLimit):
+        """A copy of these settings with another time limit (e.g. the time left for a part of a goal group)"""
+        solver = copy.copy(self)
+        solver.timeLimit = timeLimit
+        return solver
+
+    def _isDefault(self):
+        """True if nothing was changed from PuLP's default solver"""
+        return self.backend == 'cbc' and self.timeLimit == None and self.gap == None and self.threads == None and self.presolve == None and self.msg == None
+
+    def _cbcOptions(self):
+        """CBC command line options for these settings, as 'name value' strings"""
+        options = []
+        if self.timeLimit != None:
+            options += ['timeMode elapsed', 'sec ' + str(self.timeLimit)]
+        if self.gap != None:
+            options.append('ratio ' + str(self.gap))
+        if self.threads != None:
+            options.append('threads ' + str(self.threads))
+        if self.presolve != None:
+            options.append('presolve ' + ('on' if self.presolve else 'off'))
+        return options
+
+    def _pulpSolver(self):
+        """Creates the PuLP solver object for these settings (None means PuLP's default)"""
+        if self._isDefault():
+            return None
+
+        msg = bool(self.msg)
+        if self.backend == 'cbc':
+            return pulp.PULP_CBC_CMD(msg=msg, options=self._cbcOptions())
+
+        if self.backend == 'glpk':
+            options = []
+            if self.timeLimit != None:
+                options += ['--tmlim', str(int(math.ceil(self.timeLimit)))]
+            if self.gap != None:
+                options += ['--mipgap', str(self.gap)]
+            if self.presolve != None:
+                options.append('--presol' if self.presolve else '--nopresol')
+            return pulp.GLPK_CMD(msg=msg, options=options)
+
+    def _hitTimeLimit(self, status, start):
+        """True if a solve that started at start and didn't prove optimality ran out of time.
+        PuLP reports a solver that stopped early as 'Not Solved', which with a time limit means time ran out (CBC counts its own time, so it can stop just before the limit by the clock)"""
+        if self.timeLimit == None or status == 'Optimal':
+            return False
+        return status == 'Not Solved' or time.time() - start >= self.timeLimit
+
+    def solvePulp(self, problem):
+        """Solves a PuLP problem in place
+        :return: (status, timedOut, peakMemoryMB) where status is a PuLP status string and peakMemoryMB is that of the solver subprocess, or None if it isn't known
+        """
+        start = time.time()
+        before = peakMemory(children=True)
+        problem.solve(self._pulpSolver())
+        status = pulp.LpStatus[problem.status]
+        # PuLP waits for the solver itself, so only the largest of all subprocesses waited for can be read.
+        # It is this solver's peak if it went up during the solve, otherwise an earlier subprocess used more and this one's isn't known
+        after = peakMemory(children=True)
+        solverPeak = after if after != None and after > before else None
+
+        # PuLP >= 2 reports 'Optimal' for the best solution found before the time limit, sol_status tells them apart
+        solStatus = getattr(problem, 'sol_status', None)
+        timedOut = (solStatus != None and solStatus == pulp.LpSolutionIntegerFeasible) or self._hitTimeLimit(status, start)
+        return (status, timedOut, solverPeak)
+
+    def solveMatrix(self, model, start=None, onIncumbent=None):
+        """Maximizes the objective of a MatrixModel
+        :param start: a list of (sid, gid) memberships the solver starts from
+        :param onIncumbent: function called with the reward of each better solution CBC finds, or None
+        :return: (status, reward, values, timedOut, peakMemoryMB) where status is a PuLP status string, values is an array of column values (None if no groups were found)
+        and peakMemoryMB is that of the CBC process (None if the platform doesn't tell)
+        """
+        if self.backend == 'cbc':
+            return self._solveMatrixCBC(model, start, onIncumbent)
+        raise ValueError('The matrix engine only supports the cbc backend')
+
+    def _runCBC(self, mpsFile, solFile, startArgs=[], onIncumbent=None):
+        """Runs PuLP's CBC binary on an MPS file, maximizing, and has it write the solution to solFile
+        :param onIncumbent: function called with the reward of each better solution CBC logs, or None
+        :return: the peak memory (MB) of the CBC process, or None if the platform doesn't tell
+        """
+        cbc = pulp.PULP_CBC_CMD()
+        if not cbc.available():
+            raise pulp.PulpSolverError('CBC is not available at ' + str(cbc.path))
+
+        args = [cbc.path, mpsFile, 'max'] + ' '.join(self._cbcOptions()).split() + startArgs + ['branch', 'printingOptions', 'all', 'solution', solFile]
+        if onIncumbent != None:
+            (ret, peak) = self._watchCBC(args, onIncumbent)
+        else:
+            pipe = None if self.msg else open(os.devnull, 'w')
+            try:
+                (ret, peak) = _waitForExit(subprocess.Popen(args, stdout=pipe, stderr=pipe))
+            finally:
+                if pipe != None:
+                    pipe.close()
+        if ret != 0 or not os.path.exists(solFile):
+            raise pulp.PulpSolverError('Error while executing ' + cbc.path)
+        return peak
+
+    def _watchCBC(self, args, onIncumbent):
+        """Runs CBC, reading its log as it goes to report new best solutions (the log is still printed with msg)
+        :return: (CBC's exit code, its peak memory), see _waitForExit
+        """
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        for line in iter(process.stdout.readline, ''):
+            if self.msg:
+                sys.stdout.write(line)
+            match = CBC_INCUMBENT.search(line)
+            if match:
+                onIncumbent(-float(match.group(1)))
+        process.stdout.close()
+        return _waitForExit(process)
+
+    def _cbcStatus(self, firstLine):
+        """(status, timedOut, foundGroups) from the first line of a CBC solution file"""
+        status = CBC_STATUS.get(firstLine.split()[0], 'Undefined')
+        timedOut = firstLine.startswith('Stopped on time')
+        foundGroups = status == 'Optimal' or (timedOut and not 'no integer solution' in firstLine)
+        return (status, timedOut, foundGroups)
+
+    def _solveMatrixCBC(self, model, start=None, onIncumbent=None):
+        """Writes the model to an MPS file and runs PuLP's CBC binary on it"""
+        tmpDir = tempfile.mkdtemp(prefix='hui-')
+        try:
+            mpsFile = os.path.join(tmpDir, 'model.mps')
+            solFile = os.path.join(tmpDir, 'model.sol')
+            model.writeMPS(mpsFile)
+            startArgs = []
+            if start != None:
+                startFile = os.path.join(tmpDir, 'model.start')
+                model.writeStart(startFile, start)
+                startArgs = ['mips', startFile]
+            peak = self._runCBC(mpsFile, solFile, startArgs, onIncumbent)
+            (firstLine, values) = model.readCBCSolution(solFile)
+        finally:
+            shutil.rmtree(tmpDir, ignore_errors=True)
+
+        (status, timedOut, foundGroups) = self._cbcStatus(firstLine)
+        if not foundGroups:
+            return (status, None, None, timedOut, peak)
+        if (abs(values - values.round()) > 1e-6).any():
+            # When the start is already as good as the LP bound, CBC stops at once but writes out the LP solution instead of the start.
+            # The start is only used if its reward is the objective value CBC reports
+            values = model.startValues(start) if start != None else None
+            match = CBC_OBJECTIVE.search(firstLine)
+            objective = float(match.group(1)) if match != None else None
+            if values is None or objective == None or abs(model.getReward(values) - objective) > 1e-6 * max(1, abs(objective)):
+                raise pulp.PulpSolverError('CBC wrote a solution that isn\'t integer: ' + firstLine.strip())
+        return (status, model.getReward(values), values, timedOut, peak)
+
+    def solveMPS(self, mpsFile):
+        """Maximizes a model stored in an MPS file with CBC (see ModelCache.py)
+        :return: (status, values, timedOut, peakMemoryMB) where status is a PuLP status string, values is {column name: value} (None if no groups were found)
+        and peakMemoryMB is that of the CBC process (None if the platform doesn't tell)
+        """
+        if self.backend != 'cbc':
+            raise ValueError('Stored models are only solved with the cbc backend')
+
+        tmpDir = tempfile.mkdtemp(prefix='hui-')
+        try:
+            solFile = os.path.join(tmpDir, 'model.sol')
+            peak = self._runCBC(mpsFile, solFile)
+            values = {}
+            with open(solFile) as f:
+                firstLine = f.readline().strip()
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 0:
+                        break
+                    if parts[0] == '**':
+                        parts = parts[1:]
+                    values[parts[1]] = float(parts[2])
+        finally:
+            shutil.rmtree(tmpDir, ignore_errors=True)
+
+        (status, timedOut, foundGroups) = self._cbcStatus(firstLine)
+        if not foundGroups:
+            return (status, None, timedOut, peak)
+        return (status, values, timedOut, peak)
+
+def _waitForExit(process):
+    """Waits for a subprocess started with subprocess.Popen
+    :return: (exit code, the peak memory (MB) of that subprocess alone, or None if the platform doesn't tell)
+    """
+    if not hasattr(os, 'wait4'):
+        return (process.wait(), None)
+    while True:
+        try:
+            (pid, status, usage) = os.wait4(process.pid, 0)
+            break
+        except OSError as err:
+            if err.errno != errno.EINTR:
+                raise
+    # Reaped here, so Popen must be told how it exited
+    process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return (process.returncode, maxrssMB(usage.ru_maxrss))
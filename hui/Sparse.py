@@ -0,0 +1,50 @@
+import Utils
+
+# SPARSE MEMBERSHIP
+# Required GroupFilterGoals and MustMatchGoals rule out most student/group pairs in many problems (e.g. students only go into groups of their own section).
+# Instead of making a membership variable for every pair and then forcing the forbidden ones to 0 with indicator constraints,
+# the model only gets variables for the allowed pairs, and goals that only rule out pairs add nothing else to the model.
+
+def allowedGroups(dataBox, goals):
+    """Works out the groups the required goals of a goal group allow each student in
+    :param dataBox: the DataBox holding the problem
+    :param goals: the goals of one goal group
+    :return: {sid: set of gids} for every student, or None if no student/group pair is ruled out
+    """
+    students = dataBox.getStudents()
+    allGids = set(group.id for group in dataBox.getGroups())
+
+    allowed = dict((student.id, allGids) for student in students)
+    narrowed = False
+    for goal in goals:
+        (goalAllowed, goalTogether) = goal.requirements(dataBox)
+        for sid in goalAllowed:
+            allowed[sid] = allowed[sid] & goalAllowed[sid]
+            narrowed = narrowed or len(allowed[sid]) < len(allGids)
+    if not narrowed:
+        return None
+
+    # A student that can't go anywhere makes the problem infeasible, which the full model reports
+    for sid in allowed:
+        if len(allowed[sid]) == 0:
+            return None
+    return allowed
+
+def modelGoals(goals):
+    """The goals that still need constraints in a model that only has variables for allowed pairs"""
+    return [goal for goal in goals if not goal.enforcedByAllowedGroups()]
+
+def isTooLarge(students, groups, allowed):
+    """True if a student may go in more than Utils.M groups or a group may take more than Utils.M students
+    :param allowed: {sid: gids} as returned by allowedGroups, or None if every pair is allowed
+    """
+    if allowed == None:
+        return len(students) > Utils.M or len(groups) > Utils.M
+
+    studentsPerGroup = dict((group.id, 0) for group in groups)
+    for sid in allowed:
+        if len(allowed[sid]) > Utils.M:
+            return True
+        for gid in allowed[sid]:
+            studentsPerGroup[gid] += 1
+    return len(studentsPerGroup) > 0 and max(studentsPerGroup.values()) > Utils.M
@@ -0,0 +1,162 @@
+import sys
+import time
+from contextlib import contextmanager
+import pulp
+try:
+    import resource
+except ImportError:
+    # Not on Windows, where peak memory isn't reported
+    resource = None
+
+# RUN STATISTICS
+# Where the time of a run goes: each phase (indexing the data box, building the student/group part of the model, generating each goal's constraints,
+# presolve, the solver, reading the groups back) is timed. The process's peak memory only ever goes up, so each phase records both the peak at its end
+# (a high-water mark, which later phases repeat unless they use more) and how much the peak grew while it ran, which tells the phases that used the memory apart.
+# Each goal also records how many variables and constraints it added to the model, and how much it grew the peak memory. Statistics of a goal group are plain dicts,
+# so they can be sent back from worker processes with its result (see GroupCreator._solveGoalGroup).
+
+def peakMemory(children=False):
+    """The most memory the process has used so far, in MB, or None if the platform doesn't tell
+    :param children: if True, the most memory any of the subprocesses it waited for (e.g. CBC) used instead
+    """
+    if resource == None:
+        return None
+    return maxrssMB(resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss)
+
+def maxrssMB(maxrss):
+    """ru_maxrss of a resource usage in MB"""
+    # Linux counts kilobytes, macOS bytes
+    if sys.platform == 'darwin':
+        return maxrss / (1024.0 * 1024.0)
+    return maxrss / 1024.0
+
+def _growth(before, after):
+    """How much the peak memory grew from before to after (MB), or None if the platform doesn't tell"""
+    if before == None or after == None:
+        return None
+    return after - before
+
+def pulpVariables(expressions):
+    """The variables in PuLP constraints and expressions (as a set of ids, like PuLP tells them apart)"""
+    ids = set()
+    for expression in expressions:
+        if isinstance(expression, pulp.LpVariable):
+            ids.add(id(expression))
+        elif isinstance(expression, pulp.LpAffineExpression):
+            ids.update(id(variable) for variable in expression.keys())
+    return ids
+
+class Stats(object):
+    """Statistics of a run or of one goal group. Without enabled, nothing is recorded and every method does nothing
+    :param enabled: if False, no statistics are kept
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.time = {}      # phase ==> seconds
+        self.memory = {}    # phase ==> peak memory (MB) of the process at the end of the phase
+        self.memoryGrowth = {}  # phase ==> MB the peak memory grew during the phase
+        self.start = time.time()
+        self.startMemory = peakMemory() if enabled else None
+
+        # Of a goal group
+        self.goals = []         # {'goal', 'time', 'memoryGrowthMB', 'variables', 'constraints'} for each goal, in order
+        self.modelSize = (None, None)   # (variables, constraints) of the model handed to the solver
+        self.solverMemory = None        # peak memory (MB) of the solver subprocess, if it's known
+
+        # Of a run
+        self.goalGroups = []    # statistics of each goal group tried, in order
+
+    @contextmanager
+    def timed(self, phase):
+        """Adds the time spent in the with block to phase, and how much the peak memory grew in it.
+        Yields a dict whose 'memoryGrowthMB' is set to the growth of this block alone when it ends (e.g. for addGoal)
+        """
+        measured = {'memoryGrowthMB': None}
+        if not self.enabled:
+            yield measured
+            return
+        start = time.time()
+        before = peakMemory()
+        try:
+            yield measured
+        finally:
+            self.time[phase] = self.time.get(phase, 0) + time.time() - start
+            self.memory[phase] = peakMemory()
+            growth = _growth(before, self.memory[phase])
+            measured['memoryGrowthMB'] = growth
+            if growth != None:
+                self.memoryGrowth[phase] = self.memoryGrowth.get(phase, 0) + growth
+
+    def addGoal(self, goal, seconds, variables, constraints, memoryGrowth=None):
+        """Records the model size a goal added (variables and constraints are None if the engine doesn't count them)
+        :param memoryGrowth: MB the peak memory grew while the goal was generated (see timed), or None
+        """
+        if self.enabled:
+            self.goals.append({'goal': type(goal).__name__, 'time': seconds, 'memoryGrowthMB': memoryGrowth, 'variables': variables, 'constraints': constraints})
+
+    def setModelSize(self, variables, constraints):
+        """Records the size of the model handed to the solver"""
+        if self.enabled:
+            self.modelSize = (variables, constraints)
+
+    def setSolverMemory(self, peak):
+        """Records the peak memory (MB) of the solver subprocess of the goal group, or None if it isn't known"""
+        if self.enabled:
+            self.solverMemory = peak
+
+    def addGoalGroup(self, i, ret):
+        """Records how goal group i went (ret is its result, see GroupCreator._solveGoalGroup)"""
+        if not self.enabled:
+            return
+        goalGroup = {'goalGroup': i, 'status': None, 'timedOut': False}
+        if ret != None:
+            (status, reward, assignment, timedOut, info) = ret
+            goalGroup.update(info.get('stats') or {})
+            goalGroup['status'] = status
+            goalGroup['timedOut'] = timedOut
+        self.goalGroups.append(goalGroup)
+
+    def goalGroupDict(self):
+        """The statistics of a goal group as a dict, or None if they aren't enabled"""
+        if not self.enabled:
+            return None
+        return {'time': self.time, 'peakMemoryMB': self.memory, 'memoryGrowthMB': self.memoryGrowth, 'solverPeakMemoryMB': self.solverMemory, 'goals': self.goals, 'variables': self.modelSize[0], 'constraints': self.modelSize[1]}
+
+    def runDict(self):
+        """The statistics of a run as a dict (its total time is counted up to now), or None if they aren't enabled"""
+        if not self.enabled:
+            return None
+        self.time['total'] = time.time() - self.start
+        self.memory['total'] = peakMemory()
+        growth = _growth(self.startMemory, self.memory['total'])
+        if growth != None:
+            self.memoryGrowth['total'] = growth
+        return {'time': self.time, 'peakMemoryMB': self.memory, 'memoryGrowthMB': self.memoryGrowth, 'goalGroups': self.goalGroups}
+
+# Stats that record nothing, for code run without statistics
+NO_STATS = Stats(False)
+
+def mergeParts(parts):
+    """Statistics of a goal group from those of its independent parts (see Decompose.py): times, model sizes and the goals' figures are added up,
+    peak memory is the largest, and so is memory growth (parts solved in worker processes each grow their own peak)"""
+    out = {'time': {}, 'peakMemoryMB': {}, 'memoryGrowthMB': {}, 'solverPeakMemoryMB': None, 'goals': [], 'variables': None, 'constraints': None}
+    for part in parts:
+        for (phase, seconds) in part['time'].items():
+            out['time'][phase] = out['time'].get(phase, 0) + seconds
+        for (phase, peak) in part['peakMemoryMB'].items():
+            out['peakMemoryMB'][phase] = max(out['peakMemoryMB'].get(phase), peak)
+        for (phase, growth) in part['memoryGrowthMB'].items():
+            out['memoryGrowthMB'][phase] = max(out['memoryGrowthMB'].get(phase), growth)
+        out['solverPeakMemoryMB'] = max(out['solverPeakMemoryMB'], part['solverPeakMemoryMB'])
+        for (k, goal) in enumerate(part['goals']):
+            if k == len(out['goals']):
+                out['goals'].append(dict(goal))
+                continue
+            for key in ('time', 'variables', 'constraints'):
+                if goal[key] != None:
+                    out['goals'][k][key] = (out['goals'][k][key] or 0) + goal[key]
+            out['goals'][k]['memoryGrowthMB'] = max(out['goals'][k]['memoryGrowthMB'], goal['memoryGrowthMB'])
+        for key in ('variables', 'constraints'):
+            if part[key] != None:
+                out[key] = (out[key] or 0) + part[key]
+    return out
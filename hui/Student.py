@@ -5,24 +5,34 @@ class Student:
     """A representation of a single student
     :param id: a unique identifier for use in the algrotihm
     :param info: a python object holding student information
-    :param groups: a list of all groups (see Group.py) that are being considered by the algorithm
+    :param groups: a list of the groups (see Group.py) this student may be placed in. Only these get LP variables
+    :param createVariables: if false, no LP variables are created (the matrix engine keeps its own columns)
+    :param order: position of the student in this run, which orders the model's columns (see Utils.encodeVarName)
     """
-    def __init__(self, id, info, groups):
+    def __init__(self, id, info, groups, createVariables=True, order=0):
         self.id = id
         self.info = info
+        self.order = order
     
         self.allVariables = []
         self.groupIDToVariable = {}
         
+        if createVariables:
+            self.addVariables(groups)
+
+    def addVariables(self, groups):
+        """Creates an LP variable for each group this student may be placed in (replacing variables of an earlier model)"""
+        self.allVariables = []
+        self.groupIDToVariable = {}
         for group in groups:
-            var = pulp.LpVariable(Utils.encodeVarName(id, group.id), lowBound=0, cat='Integer')
+            var = pulp.LpVariable(Utils.encodeVarName(self.id, group.id, (self.order, group.order)), cat='Binary')
             self.allVariables.append(var)
             self.groupIDToVariable[group.id] = var
             group.addVar(var)
         
     def getVar(self, gid):
-        """Get the LP variable associated with group with id: gid"""
-        var = self.groupIDToVariable[gid]
+        """Get the LP variable associated with group with id: gid (0 if the student can't be placed in that group)"""
+        var = self.groupIDToVariable.get(gid, 0)
         return var
     
     def genConstraints(self):
@@ -0,0 +1,81 @@
+# SYMMETRY BREAKING
+# Groups with the same size, minsize and values for every property the goals look at are interchangeable:
+# swapping the students of two such groups gives another solution that's just as good, so the solver would otherwise explore every permutation.
+# Within a class of interchangeable groups g1, g2, ..., gk, groups are ordered by their first student (in the order students are given):
+# - the i-th student can only be in g1, ..., gi
+# - the i-th student can only be in gj if an earlier student is in g(j-1) (added for the first k students, where it's cheap)
+# Empty groups end up last. Any solution can be relabeled to follow these rules, so no solution is lost.
+
+def interchangeableGroups(groups, goals):
+    """Splits groups into classes of interchangeable groups
+    :param groups: a list of groups (see Group.py)
+    :param goals: the goals of one goal group
+    :return: a list of classes (lists of groups, in the given order) that have at least 2 groups each, or [] if a goal doesn't say which group properties it looks at
+    """
+    properties = set()
+    for goal in goals:
+        goalProperties = goal.groupProperties()
+        if goalProperties == None:
+            return []
+        properties.update(goalProperties)
+    properties = sorted(properties)
+
+    classes = {}
+    order = []
+    for group in groups:
+        key = (group.size, group.minsize) + tuple((prop in group.info, group.info.get(prop)) for prop in properties)
+        if not key in classes:
+            classes[key] = []
+            order.append(key)
+        classes[key].append(group)
+    return [classes[key] for key in order if len(classes[key]) > 1]
+
+def genConstraints(students, groupClass):
+    """Generates the symmetry breaking constraints for one class of interchangeable groups
+    :param students: a list of all students (see Student.py)
+    :param groupClass: a list of interchangeable groups
+    :return: list of constraints
+    """
+    constraints = []
+    for (i, j) in _forbidden(students, groupClass):
+        constraints.append(students[i].getVar(groupClass[j].id) <= 0)
+    for (i, j) in _ordered(students, groupClass):
+        earlier = [students[t].getVar(groupClass[j - 1].id) for t in range(i)]
+        constraints.append(students[i].getVar(groupClass[j].id) <= sum(earlier))
+    return constraints
+
+def addMatrixRows(model, students, groupClass):
+    """Same as genConstraints, but adds the rows to a MatrixModel"""
+    for (i, j) in _forbidden(students, groupClass):
+        model.colUpper[model.getVar(students[i].id, groupClass[j].id)] = 0.0
+    for (i, j) in _ordered(students, groupClass):
+        earlier = [model.getVar(students[t].id, groupClass[j - 1].id) for t in range(i)]
+        model.addRow([model.getVar(students[i].id, groupClass[j].id)] + earlier, [1.0] + [-1.0] * len(earlier), -float('inf'), 0)
+
+def _forbidden(students, groupClass):
+    """(student index, class index) pairs where the student can't be in the group"""
+    for i in range(min(len(students), len(groupClass))):
+        for j in range(i + 1, len(groupClass)):
+            yield (i, j)
+
+def _ordered(students, groupClass):
+    """(student index, class index) pairs where the student can only be in the group if an earlier student is in the group before it"""
+    for i in range(1, min(len(students), len(groupClass))):
+        for j in range(1, i + 1):
+            yield (i, j)
+
+def relabel(groupOf, students, groupClass):
+    """Renames the groups of one class in an assignment so that it follows the rules above (e.g. to use it as a starting solution)
+    :param groupOf: {sid: gid} for every student
+    :return: the relabeled {sid: gid}
+    """
+    gids = [group.id for group in groupClass]
+    inClass = set(gids)
+    used = []
+    for student in students:
+        gid = groupOf[student.id]
+        if gid in inClass and not gid in used:
+            used.append(gid)
+    # The class group holding the earliest student becomes g1, and so on
+    mapping = dict(zip(used, gids))
+    return dict((sid, mapping.get(gid, gid)) for (sid, gid) in groupOf.items())
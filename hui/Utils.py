@@ -11,15 +11,17 @@ WILDCARD = '*'
 ## Encode/decode variable names 
 # sid and gid are stored in variable names then are decoded after pulp solves the problem
 NAME_PREPEND = 'membership_'
-def encodeVarName(sid, gid):
-    """Takes an sid and gid and creates an LP variable name"""
-    return NAME_PREPEND + str(sid) + '_' + str(gid)
+def encodeVarName(sid, gid, order=(0, 0)):
+    """Takes an sid and gid and creates an LP variable name.
+    PuLP orders its columns by variable name, so the (student, group) order comes first: the columns follow it instead of the ids
+    """
+    return NAME_PREPEND + '%07d%07d' % order + '_' + str(sid) + '_' + str(gid)
 
 def decodeVarName(varName):
     """Given an LP variable name, extracts the sid and gid"""
     try:
         parts = varName.split('_')
-        return (int(parts[1]), int(parts[2]))
+        return (int(parts[2]), int(parts[3]))
     except IndexError:
         return None
 
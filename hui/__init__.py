@@ -1,5 +1,7 @@
 from GroupCreator import GroupCreator
 from Filter import Filter
+from Solver import Solver
+from ResultCache import ResultCache
 
 from Filter import IsIn
 from Filter import NotIn
@@ -8,6 +10,7 @@ from Filter import GT
 from Filter import GTE
 from Filter import LT
 from Filter import LTE
+from Filter import Between
 
 from Utils import WILDCARD
 
@@ -18,6 +21,9 @@ from Goal import MaxSimilarGoal
 from Goal import MustMatchGoal
 from Goal import PodGoal
 
+# Solving many problems at once
+from Batch import createGroupsBatch
+
 # Only for testing
 from DataBox import DataBox
 from Student import Student